@@ -0,0 +1,265 @@
+"""
+Cross-session analytics: one indexed row of scalar metrics per session.
+
+`save_results` records each finished session's `compute_all` scalars here,
+so per-teacher and per-cohort trends are a single indexed SQLite query
+rather than a scan over every `metrics.json`. Teacher and cohort are tagged
+separately (at upload time) and survive later metric updates such as reruns.
+
+Sessions processed before this store existed can be imported with:
+
+    python -m backend.analytics backfill
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from backend.config import CFG
+
+log = logging.getLogger(__name__)
+
+# Public metric name (also its column in session_metrics) -> SQL type; the ohcr_* counts are flattened from `ohcr_counts`.
+METRICS = {
+    "class_duration_sec": "REAL",
+    "teacher_talk_pct": "REAL",
+    "student_talk_pct": "REAL",
+    "avg_teacher_turn": "REAL",
+    "avg_student_turn": "REAL",
+    "kcs_score": "REAL",
+    "challenge_resolve_rate": "REAL",
+    "resolution_density_per_min": "REAL",
+    "beneficial_duration_pct": "REAL",
+    "teacher_question_count": "INTEGER",
+    "student_question_count": "INTEGER",
+    "interaction_count": "INTEGER",
+    "ohcr_o": "INTEGER",
+    "ohcr_h": "INTEGER",
+    "ohcr_c": "INTEGER",
+    "ohcr_r": "INTEGER",
+    "ohcr_none": "INTEGER",
+}
+_OHCR_COLUMNS = {"O": "ohcr_o", "H": "ohcr_h", "C": "ohcr_c", "R": "ohcr_r", "None": "ohcr_none"}
+# Bucket start for each trend granularity (weeks start on Monday).
+BUCKETS = {
+    "day": "date(created, 'unixepoch')",
+    "week": "date(created, 'unixepoch', 'weekday 0', '-6 days')",
+    "month": "strftime('%Y-%m-01', created, 'unixepoch')",
+}
+GROUPS = ("teacher_id", "cohort")
+
+
+def metric_row(metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a `compute_all` result into analytics columns."""
+    row = {name: metrics.get(name) for name in METRICS if name not in _OHCR_COLUMNS.values()}
+    counts = metrics.get("ohcr_counts") or {}
+    for label, column in _OHCR_COLUMNS.items():
+        row[column] = counts.get(label, 0)
+    return row
+
+
+class AnalyticsStore:
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as c:
+            c.execute("PRAGMA journal_mode=WAL")
+            self._ensure_schema(c)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _ensure_schema(conn: sqlite3.Connection) -> None:
+        columns = ",\n".join(f"  {name} {sql_type}" for name, sql_type in METRICS.items())
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS session_metrics (
+              session_id TEXT PRIMARY KEY,
+              teacher_id TEXT,
+              cohort TEXT,
+              created REAL NOT NULL,
+              updated REAL,
+              has_metrics INTEGER NOT NULL DEFAULT 0,
+            {columns}
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS session_metrics_teacher ON session_metrics (teacher_id, created)")
+        conn.execute("CREATE INDEX IF NOT EXISTS session_metrics_cohort ON session_metrics (cohort, created)")
+
+    def tag_session(self, sid: str, teacher_id: Optional[str] = None, cohort: Optional[str] = None,
+                    created: Optional[float] = None) -> None:
+        """Attach teacher/cohort to a session; may run before its metrics exist."""
+        if teacher_id is None and cohort is None:
+            return
+        now = time.time()
+        with self._connect() as c:
+            c.execute(
+                """
+                INSERT INTO session_metrics (session_id, teacher_id, cohort, created, updated) VALUES (?,?,?,?,?)
+                ON CONFLICT(session_id) DO UPDATE SET
+                  teacher_id=COALESCE(excluded.teacher_id, teacher_id),
+                  cohort=COALESCE(excluded.cohort, cohort),
+                  updated=excluded.updated
+                """,
+                (sid, teacher_id, cohort, created or now, now),
+            )
+
+    def record_metrics(self, sid: str, metrics: Dict[str, Any], created: Optional[float] = None) -> None:
+        """Insert or refresh a session's metrics, keeping any existing tags and creation time."""
+        row = metric_row(metrics)
+        names = list(row)
+        now = time.time()
+        with self._connect() as c:
+            c.execute(
+                f"""
+                INSERT INTO session_metrics (session_id, created, updated, has_metrics, {", ".join(names)})
+                VALUES (?,?,?,1,{",".join("?" * len(names))})
+                ON CONFLICT(session_id) DO UPDATE SET
+                  updated=excluded.updated, has_metrics=1,
+                  {", ".join(f"{n}=excluded.{n}" for n in names)}
+                """,
+                (sid, created or now, now, *(row[n] for n in names)),
+            )
+
+    def get(self, sid: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as c:
+            row = c.execute("SELECT * FROM session_metrics WHERE session_id=?", (sid,)).fetchone()
+        return dict(row) if row else None
+
+    def trend(self, group: str, value: str, metrics: List[str], bucket: str = "week",
+              since: Optional[float] = None, until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Per-bucket session count and mean/min/max of `metrics` for one teacher or cohort."""
+        if group not in GROUPS:
+            raise ValueError(f"group must be one of {', '.join(GROUPS)}")
+        if bucket not in BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+        unknown = set(metrics) - set(METRICS)
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(sorted(unknown))}")
+        aggregates = ", ".join(f"AVG({m}) AS {m}_avg, MIN({m}) AS {m}_min, MAX({m}) AS {m}_max" for m in metrics)
+        sql = f"""
+            SELECT {BUCKETS[bucket]} AS bucket, COUNT(*) AS sessions{", " + aggregates if aggregates else ""}
+            FROM session_metrics
+            WHERE {group} = ? AND has_metrics = 1 AND created >= ? AND created < ?
+            GROUP BY bucket ORDER BY bucket
+        """
+        with self._connect() as c:
+            rows = c.execute(sql, (value, since or 0.0, until or float("inf"))).fetchall()
+        out = []
+        for row in rows:
+            entry = {"bucket": row["bucket"], "sessions": row["sessions"]}
+            for m in metrics:
+                avg = row[f"{m}_avg"]
+                entry[m] = {"avg": round(avg, 4) if avg is not None else None,
+                            "min": row[f"{m}_min"], "max": row[f"{m}_max"]}
+            out.append(entry)
+        return out
+
+    def groups(self, group: str, metrics: List[str]) -> List[Dict[str, Any]]:
+        """Every teacher (or cohort) with its session count, date range and metric means."""
+        if group not in GROUPS:
+            raise ValueError(f"group must be one of {', '.join(GROUPS)}")
+        unknown = set(metrics) - set(METRICS)
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(sorted(unknown))}")
+        means = "".join(f", AVG({m}) AS {m}" for m in metrics)
+        sql = f"""
+            SELECT {group} AS name, COUNT(*) AS sessions, MIN(created) AS first, MAX(created) AS last{means}
+            FROM session_metrics
+            WHERE {group} IS NOT NULL AND has_metrics = 1
+            GROUP BY {group} ORDER BY {group}
+        """
+        with self._connect() as c:
+            rows = c.execute(sql).fetchall()
+        return [
+            {"name": r["name"], "sessions": r["sessions"], "first": r["first"], "last": r["last"],
+             **{m: round(r[m], 4) if r[m] is not None else None for m in metrics}}
+            for r in rows
+        ]
+
+
+_STORE: Optional[AnalyticsStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_analytics_store() -> Optional[AnalyticsStore]:
+    """Shared store, or None when analytics are disabled (`ANALYTICS_DB` empty or results not stored)."""
+    global _STORE
+    if not CFG.analytics_db:
+        return None
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = AnalyticsStore(CFG.analytics_db)
+        return _STORE
+
+
+def record_session(sid: str, metrics: Dict[str, Any]) -> None:
+    # Analytics are derived data: a failure here must not fail the request that produced the session.
+    store = get_analytics_store()
+    if store is None:
+        return
+    try:
+        store.record_metrics(sid, metrics)
+    except sqlite3.Error:
+        log.exception("Could not record analytics for session %s", sid)
+
+
+def tag_session(sid: str, teacher_id: Optional[str], cohort: Optional[str]) -> None:
+    store = get_analytics_store()
+    if store is None:
+        return
+    try:
+        store.tag_session(sid, teacher_id or None, cohort or None)
+    except sqlite3.Error:
+        log.exception("Could not tag analytics for session %s", sid)
+
+
+def backfill(results_dir: str, store: AnalyticsStore) -> int:
+    """Import every `<sid>/metrics.json` under `results_dir`, dated by the file's mtime."""
+    from backend import storage
+
+    count = 0
+    for sid in sorted(os.listdir(results_dir)):
+        if not storage.valid_sid(sid):
+            continue
+        metrics = storage.read_json(sid, "metrics.json")
+        if not isinstance(metrics, dict):
+            continue
+        created = storage.mtime(sid, "metrics.json")
+        store.record_metrics(sid, metrics, created=created)
+        count += 1
+    return count
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Maintain the cross-session analytics store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backfill", help="Import metrics.json of every stored session.")
+    tag = sub.add_parser("tag", help="Set the teacher and/or cohort of a stored session.")
+    tag.add_argument("session_id")
+    tag.add_argument("--teacher-id")
+    tag.add_argument("--cohort")
+    args = parser.parse_args()
+
+    store = get_analytics_store()
+    if store is None:
+        print("Analytics are disabled (set ANALYTICS_DB and STORE_RESULTS=true).", file=sys.stderr)
+        return 2
+    if args.command == "backfill":
+        print(f"Imported {backfill(CFG.results_dir, store)} session(s) into {CFG.analytics_db}")
+    else:
+        store.tag_session(args.session_id, args.teacher_id, args.cohort)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
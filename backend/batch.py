@@ -0,0 +1,186 @@
+"""
+Offline batch runner for whole folders of recordings.
+
+    python -m backend.batch recordings/ --workers 4
+    python -m backend.batch recordings/ --manifest term1.json   # re-run to resume
+
+Every file is processed by the same pipeline stages as `/process`, in a pool
+of worker processes, so while one file is being transcribed others are being
+diarized or labelled. Each finished stage is checkpointed next to the session
+results and the manifest records per-file progress; re-running the command
+with the same manifest skips finished files and resumes partial ones from
+their last completed stage.
+"""
+import argparse
+import concurrent.futures as cf
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+from backend.config import CFG
+from backend import storage
+
+AUDIO_EXTS = {".wav", ".mp3", ".m4a", ".mp4", ".webm", ".ogg", ".flac"}
+MANIFEST_NAME = "batch_manifest.json"
+
+
+def discover(source: str) -> List[str]:
+    """Audio files in a directory (recursively), or the paths listed one per line in a text file."""
+    if os.path.isdir(source):
+        found = []
+        for root, _dirs, files in os.walk(source):
+            for name in files:
+                if os.path.splitext(name)[1].lower() in AUDIO_EXTS:
+                    found.append(os.path.abspath(os.path.join(root, name)))
+        return sorted(found)
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return [os.path.abspath(os.path.join(base, line)) for line in lines]
+
+
+def load_manifest(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {"version": 1, "files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(path: str, manifest: Dict) -> None:
+    # Write-then-rename so an interrupted batch never leaves a truncated manifest behind.
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _checkpoint_name(stage: str) -> str:
+    return f"checkpoint_{stage}.json"
+
+
+def completed_stages(sid: str) -> List[str]:
+    from backend.pipeline import STAGES
+
+    return [name for name in STAGES if storage.exists(sid, _checkpoint_name(name))]
+
+
+def process_file(audio_path: str, sid: str) -> Dict:
+    """Run (or resume) the pipeline for one file inside a worker process."""
+    from backend.pipeline import STAGES, run_pipeline, save_results
+
+    t0 = time.perf_counter()
+    steps: Dict = {}
+    for name in STAGES:
+        checkpoint = storage.read_json(sid, _checkpoint_name(name))
+        if checkpoint is not None:
+            steps.update(checkpoint)
+    resumed = [name for name in STAGES if name in steps]
+    steps = run_pipeline(
+        audio_path, os.path.basename(audio_path), steps=steps,
+        # Checkpoints are deleted once the session is saved, so they skip the shared blob store.
+        on_stage=lambda name, output: storage.write_json(sid, _checkpoint_name(name), output, compress=False),
+    )
+    save_results(sid, steps)
+    for name in STAGES:
+        storage.delete(sid, _checkpoint_name(name))
+    return {
+        "session_id": sid,
+        "resumed_stages": resumed,
+        "duration_ms": int((time.perf_counter() - t0) * 1000),
+        "stage_ms": {name: steps[name].get("duration_ms", 0) for name in STAGES if name not in resumed},
+    }
+
+
+def run_batch(files: List[str], manifest_path: str, workers: int, retry_failed: bool = False,
+              teacher_id: Optional[str] = None, cohort: Optional[str] = None) -> Dict:
+    from backend import analytics
+
+    manifest = load_manifest(manifest_path)
+    entries = manifest.setdefault("files", {})
+    for path in files:
+        entries.setdefault(path, {"session_id": uuid.uuid4().hex[:8], "status": "pending"})
+    save_manifest(manifest_path, manifest)
+
+    wanted = set(files)
+    todo = [p for p, e in entries.items()
+            if e["status"] != "done" and (retry_failed or e["status"] != "failed") and p in wanted]
+    # Only sessions about to be processed are tagged; finished ones keep the tags they were run with.
+    for path in todo:
+        analytics.tag_session(entries[path]["session_id"], teacher_id, cohort)
+    print(f"{len(files)} file(s): {len(files) - len(todo)} already done or skipped, {len(todo)} to process", flush=True)
+    if not todo:
+        return manifest
+
+    ctx = mp.get_context("spawn")  # torch and fork do not mix well
+    with cf.ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = {pool.submit(process_file, path, entries[path]["session_id"]): path for path in todo}
+        for path in todo:
+            entries[path]["status"] = "running"
+        save_manifest(manifest_path, manifest)
+        try:
+            for fut in cf.as_completed(futures):
+                path = futures[fut]
+                entry = entries[path]
+                try:
+                    result = fut.result()
+                except Exception as err:
+                    entry.update({
+                        "status": "failed",
+                        "error": f"{type(err).__name__}: {err}",
+                        "completed_stages": completed_stages(entry["session_id"]),
+                    })
+                    print(f"FAILED {path}: {entry['error']}", flush=True)
+                else:
+                    entry.update({"status": "done", "error": None, "completed_stages": None, **result})
+                    print(f"done   {path} -> {result['session_id']} ({result['duration_ms']} ms)", flush=True)
+                save_manifest(manifest_path, manifest)
+        except KeyboardInterrupt:
+            for fut in futures:
+                fut.cancel()
+            raise
+        finally:
+            for path in todo:
+                entry = entries[path]
+                if entry["status"] == "running":
+                    entry["status"] = "pending"
+                    entry["completed_stages"] = completed_stages(entry["session_id"])
+            save_manifest(manifest_path, manifest)
+    return manifest
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Process a folder (or list file) of recordings offline.")
+    parser.add_argument("source", help="Directory of audio files, or a text file with one path per line.")
+    parser.add_argument("--workers", type=int, default=max(1, CFG.worker_processes))
+    parser.add_argument("--manifest", help=f"Progress manifest (default: RESULTS_DIR/{MANIFEST_NAME}).")
+    parser.add_argument("--retry-failed", action="store_true", help="Also retry files that failed before.")
+    parser.add_argument("--teacher-id", help="Tag every session with this teacher for /analytics trends.")
+    parser.add_argument("--cohort", help="Tag every session with this cohort for /analytics trends.")
+    args = parser.parse_args()
+
+    if not CFG.store_results:
+        print("STORE_RESULTS=false: batch results would be discarded; enable it to run a batch.", file=sys.stderr)
+        return 2
+    files = discover(args.source)
+    if not files:
+        print(f"No audio files found in {args.source}", file=sys.stderr)
+        return 1
+    manifest_path = args.manifest or os.path.join(CFG.results_dir, MANIFEST_NAME)
+    manifest = run_batch(files, manifest_path, args.workers, retry_failed=args.retry_failed,
+                         teacher_id=args.teacher_id, cohort=args.cohort)
+    statuses = [manifest["files"][p]["status"] for p in files]
+    print(f"done={statuses.count('done')} failed={statuses.count('failed')} pending={statuses.count('pending')} "
+          f"manifest={manifest_path}")
+    return 0 if all(s == "done" for s in statuses) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Cross-file stage pipelining for `POST /process/batch`.
+
+Each pipeline stage gets its own small thread pool. A file is handed to the
+next stage's pool the moment its current stage finishes, so while file N+1 is
+being transcribed (remote, I/O bound), file N is being diarized (local CPU)
+and file N-1 is being labelled by the LLM. With enough files in flight,
+batch throughput approaches that of the slowest stage rather than the sum of
+all stages.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from backend.config import CFG
+from backend.pipeline import AUDIO_STAGES, STAGES, build_response, load_results, run_stage, save_results
+
+# Network-bound stages get two threads, CPU-bound waveform, diarization and metrics one.
+DEFAULT_STAGE_WORKERS = {"transcription": 2, "waveform": 1, "diarization": 1, "labeling": 2, "metrics": 1,
+                         "tier_prompts": 2}
+_MAX_BATCHES = 100
+
+
+def parse_stage_workers(value: str) -> Dict[str, int]:
+    workers = dict(DEFAULT_STAGE_WORKERS)
+    for item in filter(None, (v.strip() for v in (value or "").split(","))):
+        name, _, count = item.partition("=")
+        if name.strip() in workers:
+            workers[name.strip()] = max(1, int(count))
+    return workers
+
+
+class BatchItem:
+    def __init__(self, index: int, filename: str, audio_path: str):
+        self.index = index
+        self.filename = filename
+        self.audio_path = audio_path
+        self.session_id = uuid.uuid4().hex[:8]
+        self.status = "queued"
+        self.stage: Optional[str] = None
+        self.completed_stages: List[str] = []
+        self.stage_ms: Dict[str, int] = {}
+        self.error: Optional[str] = None
+        self.steps: Dict = {}
+
+    def summary(self) -> Dict:
+        return {
+            "index": self.index,
+            "filename": self.filename,
+            "session_id": self.session_id,
+            "status": self.status,
+            "stage": self.stage,
+            "completed_stages": list(self.completed_stages),
+            "stage_ms": dict(self.stage_ms),
+            "error": self.error,
+        }
+
+
+class Batch:
+    def __init__(self, items: List[BatchItem]):
+        self.id = uuid.uuid4().hex[:8]
+        self.items = items
+        self.created = time.time()
+        self.finished: Optional[float] = None
+
+    def summary(self) -> Dict:
+        counts: Dict[str, int] = {}
+        for item in self.items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+        done = all(item.status in ("completed", "failed") for item in self.items)
+        return {
+            "batch_id": self.id,
+            "status": "completed" if done else "running",
+            "file_count": len(self.items),
+            "counts": counts,
+            "elapsed_s": round((self.finished or time.time()) - self.created, 3),
+            "files": [item.summary() for item in self.items],
+        }
+
+
+class StagePipeline:
+    def __init__(self, workers: Dict[str, int]):
+        self.pools = {name: ThreadPoolExecutor(max_workers=workers[name], thread_name_prefix=f"batch-{name}")
+                      for name in STAGES}
+        self.batches: "OrderedDict[str, Batch]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, batch: Batch) -> None:
+        with self._lock:
+            self.batches[batch.id] = batch
+            while len(self.batches) > _MAX_BATCHES:
+                self.batches.popitem(last=False)
+        for item in batch.items:
+            self._advance(batch, item, 0)
+
+    def get(self, batch_id: str) -> Optional[Batch]:
+        with self._lock:
+            return self.batches.get(batch_id)
+
+    def _advance(self, batch: Batch, item: BatchItem, stage_idx: int) -> None:
+        if stage_idx >= len(STAGES):
+            self._finish(batch, item)
+            return
+        self.pools[STAGES[stage_idx]].submit(self._run, batch, item, stage_idx)
+
+    def _run(self, batch: Batch, item: BatchItem, stage_idx: int) -> None:
+        name = STAGES[stage_idx]
+        item.status = "running"
+        item.stage = name
+        t0 = time.perf_counter()
+        try:
+            output = run_stage(name, item.steps, item.audio_path, item.filename)
+        except Exception as err:
+            item.status = "failed"
+            item.error = f"{name}: {type(err).__name__}: {err}"
+            self._cleanup(item)
+            self._maybe_close(batch)
+            return
+        item.steps.update(output)
+        item.completed_stages.append(name)
+        item.stage_ms[name] = int((time.perf_counter() - t0) * 1000)
+        if name in AUDIO_STAGES and not AUDIO_STAGES.difference(item.completed_stages):
+            self._cleanup(item)  # no later stage reads the audio
+        item.status = "queued"
+        item.stage = None
+        self._advance(batch, item, stage_idx + 1)
+
+    def _finish(self, batch: Batch, item: BatchItem) -> None:
+        try:
+            save_results(item.session_id, item.steps)
+        except Exception as err:
+            item.status = "failed"
+            item.error = f"save_results: {type(err).__name__}: {err}"
+        else:
+            item.status = "completed"
+            if CFG.store_results:
+                item.steps = {}  # served from disk from now on
+        self._cleanup(item)
+        self._maybe_close(batch)
+
+    @staticmethod
+    def _cleanup(item: BatchItem) -> None:
+        if item.audio_path and os.path.exists(item.audio_path):
+            try:
+                os.unlink(item.audio_path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _maybe_close(batch: Batch) -> None:
+        if all(i.status in ("completed", "failed") for i in batch.items):
+            batch.finished = time.time()
+
+    def result(self, batch: Batch, index: int) -> Optional[Dict]:
+        item = batch.items[index]
+        if item.status != "completed":
+            return None
+        steps = item.steps or load_results(item.session_id)
+        return build_response(item.session_id, steps) if steps else None
+
+
+_PIPELINE: Optional[StagePipeline] = None
+_PIPELINE_LOCK = threading.Lock()
+
+
+def get_stage_pipeline() -> StagePipeline:
+    # One shared set of stage pools, so concurrent batches compete for the same capacity.
+    global _PIPELINE
+    with _PIPELINE_LOCK:
+        if _PIPELINE is None:
+            _PIPELINE = StagePipeline(parse_stage_workers(CFG.batch_stage_workers))
+        return _PIPELINE
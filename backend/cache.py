@@ -1,7 +1,115 @@
-import sqlite3, json, time, hashlib, os
-from typing import Any, Dict, Tuple, Optional
+"""
+LLM response cache with pluggable storage backends.
 
-class SQLiteCache:
+Callers hash a request payload and go through `get_or_set`; the backend only
+stores (key -> value, meta). Which backend a component uses comes from config:
+
+  - sqlite:  one SQLite file (`CACHE_DB`), the original layout;
+  - sharded: SQLite files under `CACHE_DIR`, picked by key prefix, so
+             concurrent workers contend on different files;
+  - fs:      one JSON file per key under `CACHE_DIR` (content-addressed by the
+             payload hash), suited to large values such as tier outputs;
+  - memory:  in-process LRU, for tests and benchmarks.
+
+`CACHE_BACKEND` sets the default and `CACHE_COMPONENT_BACKENDS` (e.g.
+`tier_prompts=fs`) overrides it per component. Existing entries can be copied
+into another backend with:
+
+    python -m backend.cache migrate --to sharded [--from-db backend/results/cache.sqlite]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from backend.config import CFG
+from backend.telemetry import CACHE_REQUESTS
+
+BACKENDS = ("sqlite", "sharded", "fs", "memory")
+Entry = Tuple[Any, Dict]
+# (key, value, meta, created) as yielded by `iter_items`.
+Item = Tuple[str, Any, Dict, float]
+
+
+class CacheBackend(ABC):
+    disabled = False
+
+    @staticmethod
+    def _hash(payload: Dict[str, Any]) -> str:
+        s = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+    # ---- storage primitives (implemented by every backend) ----
+    @abstractmethod
+    def get_many(self, keys: List[str]) -> Dict[str, Entry]:
+        """Stored (value, meta) for each key present."""
+
+    @abstractmethod
+    def set_many(self, items: Iterable[Tuple[str, Any, Dict]]) -> None:
+        """Store (key, value, meta) triples, replacing existing entries."""
+
+    @abstractmethod
+    def iter_items(self) -> Iterator[Item]:
+        """Every stored entry as (key, value, meta, created)."""
+
+    def get(self, key: str) -> Optional[Entry]:
+        return self.get_many([key]).get(key)
+
+    def set(self, key: str, value: Any, meta: Optional[Dict] = None) -> None:
+        self.set_many([(key, value, meta or {})])
+
+    # ---- payload-level API used by the LLM callers ----
+    def lookup_many(self, payloads: List[Dict[str, Any]]) -> List[Optional[Entry]]:
+        """
+        One bulk read for several payloads; None where `get_or_set` would have to compute.
+        Only hits are counted here: the misses are counted when they go through `get_or_set`.
+        """
+        if self.disabled or not payloads:
+            return [None] * len(payloads)
+        keys = [self._hash(p) for p in payloads]
+        found = self.get_many(list(dict.fromkeys(keys)))
+        out: List[Optional[Entry]] = []
+        for payload, key in zip(payloads, keys):
+            entry = found.get(key)
+            if entry is not None and entry[1].get("source") != "fallback":
+                CACHE_REQUESTS.inc(namespace=str(payload.get("v", "unknown")), result="hit")
+                out.append(entry)
+            else:
+                out.append(None)
+        return out
+
+    def get_or_set(self, payload: Dict[str, Any], fn) -> Tuple[dict, dict]:
+        namespace = str(payload.get("v", "unknown"))
+        if self.disabled:
+            CACHE_REQUESTS.inc(namespace=namespace, result="disabled")
+            return fn()
+        key = self._hash(payload)
+        entry = self.get(key)
+        # Fallbacks from older versions were cached; retry those instead of replaying the failure.
+        if entry is not None and entry[1].get("source") != "fallback":
+            CACHE_REQUESTS.inc(namespace=namespace, result="hit")
+            return entry
+        CACHE_REQUESTS.inc(namespace=namespace, result="miss")
+        val, meta = fn()
+        if (meta or {}).get("source") == "fallback":
+            return val, meta
+        self.set(key, val, meta)
+        return val, meta
+
+
+def _decode(value: Optional[str], meta: Optional[str]) -> Entry:
+    return json.loads(value), (json.loads(meta) if meta else {})
+
+
+class SQLiteCache(CacheBackend):
     def __init__(self, path: Optional[str]):
         self.path = path
         self.disabled = not path
@@ -12,11 +120,6 @@ class SQLiteCache:
         with sqlite3.connect(self.path) as c:
             self._ensure_schema(c)
 
-    @staticmethod
-    def _hash(payload: Dict[str, Any]) -> str:
-        s = json.dumps(payload, ensure_ascii=False, sort_keys=True)
-        return hashlib.sha256(s.encode("utf-8")).hexdigest()
-
     @staticmethod
     def _ensure_schema(conn: sqlite3.Connection) -> None:
         conn.execute(
@@ -30,17 +133,250 @@ class SQLiteCache:
             """
         )
 
-    def get_or_set(self, payload: Dict[str, Any], fn) -> Tuple[dict, dict]:
-        if self.disabled:
-            return fn()
-        key = self._hash(payload)
-        with sqlite3.connect(self.path) as c:
-            self._ensure_schema(c)
-            row = c.execute("SELECT v, meta FROM cache WHERE k=?", (key,)).fetchone()
-            if row:
-                return json.loads(row[0]), (json.loads(row[1]) if row[1] else {})
-            val, meta = fn()
-            c.execute("INSERT OR REPLACE INTO cache VALUES (?,?,?,?)",
-                      (key, json.dumps(val, ensure_ascii=False), time.time(), json.dumps(meta)))
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        self._ensure_schema(conn)
+        return conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, Entry]:
+        found: Dict[str, Entry] = {}
+        with self._connect() as c:
+            # Stay well under SQLite's bound-parameter limit.
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = c.execute(
+                    f"SELECT k, v, meta FROM cache WHERE k IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for k, v, meta in rows:
+                    found[k] = _decode(v, meta)
+        return found
+
+    def set_many(self, items: Iterable[Tuple[str, Any, Dict]]) -> None:
+        now = time.time()
+        rows = [(k, json.dumps(v, ensure_ascii=False), now, json.dumps(meta or {})) for k, v, meta in items]
+        if not rows:
+            return
+        with self._connect() as c:
+            c.executemany("INSERT OR REPLACE INTO cache VALUES (?,?,?,?)", rows)
             c.commit()
-            return val, meta
+
+    def iter_items(self) -> Iterator[Item]:
+        with self._connect() as c:
+            for k, v, created, meta in c.execute("SELECT k, v, created, meta FROM cache ORDER BY created"):
+                value, meta = _decode(v, meta)
+                yield k, value, meta, created or 0.0
+
+
+class ShardedSQLiteCache(CacheBackend):
+    """SQLite files `shard-XX.sqlite` under `directory`, chosen by the key's hex prefix."""
+
+    def __init__(self, directory: str, shards: int = 16):
+        self.directory = directory
+        self.shards = [
+            SQLiteCache(os.path.join(directory, f"shard-{i:02x}.sqlite")) for i in range(max(1, shards))
+        ]
+        for shard in self.shards:
+            with sqlite3.connect(shard.path) as c:
+                c.execute("PRAGMA journal_mode=WAL")
+
+    def _shard_index(self, key: str) -> int:
+        return int(key[:4], 16) % len(self.shards)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Entry]:
+        groups: Dict[int, List[str]] = {}
+        for key in keys:
+            groups.setdefault(self._shard_index(key), []).append(key)
+        found: Dict[str, Entry] = {}
+        for idx, shard_keys in groups.items():
+            found.update(self.shards[idx].get_many(shard_keys))
+        return found
+
+    def set_many(self, items: Iterable[Tuple[str, Any, Dict]]) -> None:
+        groups: Dict[int, List[Tuple[str, Any, Dict]]] = {}
+        for item in items:
+            groups.setdefault(self._shard_index(item[0]), []).append(item)
+        for idx, shard_items in groups.items():
+            self.shards[idx].set_many(shard_items)
+
+    def iter_items(self) -> Iterator[Item]:
+        for shard in self.shards:
+            yield from shard.iter_items()
+
+
+class FileCache(CacheBackend):
+    """One JSON file per key at `<directory>/<key[:2]>/<key>.json`, written atomically."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _read(self, path: str) -> Optional[Dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_many(self, keys: List[str]) -> Dict[str, Entry]:
+        found: Dict[str, Entry] = {}
+        for key in keys:
+            doc = self._read(self._path(key))
+            if isinstance(doc, dict) and "v" in doc:
+                found[key] = (doc["v"], doc.get("meta") or {})
+        return found
+
+    def set_many(self, items: Iterable[Tuple[str, Any, Dict]]) -> None:
+        now = time.time()
+        for key, value, meta in items:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"v": value, "meta": meta or {}, "created": now}, f, ensure_ascii=False)
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+
+    def iter_items(self) -> Iterator[Item]:
+        for prefix in sorted(os.listdir(self.directory)):
+            sub = os.path.join(self.directory, prefix)
+            if not os.path.isdir(sub):
+                continue
+            for name in sorted(os.listdir(sub)):
+                if not name.endswith(".json"):
+                    continue
+                doc = self._read(os.path.join(sub, name))
+                if isinstance(doc, dict) and "v" in doc:
+                    yield name[:-5], doc["v"], doc.get("meta") or {}, doc.get("created") or 0.0
+
+
+class MemoryCache(CacheBackend):
+    """Process-local LRU; entries are copied in and out so callers cannot mutate cached values."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max(1, max_entries)
+        self._items: "OrderedDict[str, Tuple[str, Dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> Dict[str, Entry]:
+        found: Dict[str, Entry] = {}
+        with self._lock:
+            for key in keys:
+                item = self._items.get(key)
+                if item is not None:
+                    self._items.move_to_end(key)
+                    found[key] = (json.loads(item[0]), dict(item[1]))
+        return found
+
+    def set_many(self, items: Iterable[Tuple[str, Any, Dict]]) -> None:
+        now = time.time()
+        with self._lock:
+            for key, value, meta in items:
+                self._items[key] = (json.dumps(value, ensure_ascii=False), dict(meta or {}), now)
+                self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def iter_items(self) -> Iterator[Item]:
+        with self._lock:
+            items = list(self._items.items())
+        for key, (value, meta, created) in items:
+            yield key, json.loads(value), dict(meta), created
+
+
+def make_cache(backend: str) -> CacheBackend:
+    if backend == "memory":
+        return MemoryCache(CFG.cache_memory_entries)
+    # The on-disk stores follow CACHE_DB's on/off switch (off when results are not stored).
+    if not CFG.cache_db:
+        return SQLiteCache(None)
+    if backend == "sharded":
+        return ShardedSQLiteCache(os.path.join(CFG.cache_dir, "sqlite"), CFG.cache_shards)
+    if backend == "fs":
+        return FileCache(os.path.join(CFG.cache_dir, "fs"))
+    if backend == "sqlite":
+        return SQLiteCache(CFG.cache_db)
+    raise ValueError(f"Unknown cache backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+
+
+def _component_backends() -> Dict[str, str]:
+    out = {}
+    for part in CFG.cache_component_backends.split(","):
+        if "=" in part:
+            name, backend = (p.strip() for p in part.split("=", 1))
+            out[name] = backend
+    return out
+
+
+def _check_backends() -> None:
+    """Reject an unknown backend name when the module loads rather than on a component's first lookup."""
+    configured = [("CACHE_BACKEND", CFG.cache_backend)]
+    configured += [("CACHE_COMPONENT_BACKENDS", backend) for backend in _component_backends().values()]
+    for variable, backend in configured:
+        if backend not in BACKENDS:
+            raise ValueError(f"{variable}: unknown cache backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+
+
+_check_backends()
+
+_INSTANCES: Dict[str, CacheBackend] = {}
+_INSTANCES_LOCK = threading.Lock()
+
+
+def backend_for(component: Optional[str] = None) -> str:
+    return _component_backends().get(component or "", CFG.cache_backend)
+
+
+def get_cache(component: Optional[str] = None) -> CacheBackend:
+    """Shared cache instance for `component` (`label_one`, `coach`, `tier_prompts`)."""
+    backend = backend_for(component)
+    with _INSTANCES_LOCK:
+        if backend not in _INSTANCES:
+            _INSTANCES[backend] = make_cache(backend)
+        return _INSTANCES[backend]
+
+
+def migrate(source: CacheBackend, dest: CacheBackend, batch: int = 500) -> int:
+    count = 0
+    pending: List[Tuple[str, Any, Dict]] = []
+    for key, value, meta, _ in source.iter_items():
+        pending.append((key, value, meta))
+        if len(pending) >= batch:
+            dest.set_many(pending)
+            count += len(pending)
+            pending = []
+    dest.set_many(pending)
+    return count + len(pending)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Maintain the LLM response cache.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cmd = sub.add_parser("migrate", help="Copy every entry of a single-file SQLite cache into another backend.")
+    cmd.add_argument("--from-db", default=CFG.cache_db)
+    cmd.add_argument("--to", required=True, choices=[b for b in BACKENDS if b != "memory"])
+    args = parser.parse_args()
+
+    if not args.from_db or not os.path.exists(args.from_db):
+        print("No SQLite cache to migrate from (set CACHE_DB or pass --from-db).", file=sys.stderr)
+        return 2
+    dest = make_cache(args.to)
+    if dest.disabled:
+        print("Caching is disabled (CACHE_DB unset and STORE_RESULTS=false).", file=sys.stderr)
+        return 2
+    if args.to == "sqlite" and os.path.realpath(args.from_db) == os.path.realpath(CFG.cache_db):
+        print(f"--from-db and CACHE_DB are the same file ({args.from_db}); point CACHE_DB at the new cache.",
+              file=sys.stderr)
+        return 2
+    print(f"Copied {migrate(SQLiteCache(args.from_db), dest)} cache entries into the {args.to} backend")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,22 +3,82 @@ from dataclasses import dataclass
 from typing import Optional
 
 CACHE_DB_DEFAULT = "backend/results/cache.sqlite"
+JOBS_DB_DEFAULT = "backend/results/jobs.sqlite"
+LOCAL_CLASSIFIER_DEFAULT = "backend/results/ohcr_classifier.joblib"
 
 @dataclass
 class Config:
     openai_api_key: str = os.environ.get("OPENAI_API_KEY", "")
     transcriber: str = os.environ.get("TRANSCRIBER", "openai")
+    # OpenAI calls: live | record (also save fixtures) | replay (serve fixtures offline, latency scaled)
+    openai_mode: str = os.environ.get("OPENAI_MODE", "live").strip().lower()
+    openai_fixtures_dir: str = os.environ.get("OPENAI_FIXTURES_DIR", "backend/results/openai_fixtures")
+    openai_replay_latency_scale: float = float(os.environ.get("OPENAI_REPLAY_LATENCY_SCALE", 1.0))
     llm_model: str = os.environ.get("LLM_MODEL", "gpt-4o-mini")
+    # Comma-separated models accepted as per-request overrides (empty = any)
+    llm_allowed_models: str = os.environ.get("LLM_ALLOWED_MODELS", "")
+    # Default coach/tier analysis depth: fast | standard | full
+    analysis_depth: str = os.environ.get("ANALYSIS_DEPTH", "full").strip().lower()
+    # Local OHCR classifier consulted before label_one (empty disables) and the probability it must reach
+    local_classifier_path: str = os.environ.get("LOCAL_CLASSIFIER", LOCAL_CLASSIFIER_DEFAULT).strip()
+    local_classifier_threshold: float = float(os.environ.get("LOCAL_CLASSIFIER_THRESHOLD", 0.85))
+    # Text normalizer for label_one cache keys: loose (case/punctuation-insensitive) | whitespace
+    label_key_normalizer: str = os.environ.get("LABEL_KEY_NORMALIZER", "loose").strip().lower()
+    # Default end-to-end budget for /process in seconds; LLM stages degrade to fit it (0 = unbounded)
+    request_budget_sec: float = float(os.environ.get("REQUEST_BUDGET_SEC", 0))
     use_llm: bool = os.environ.get("USE_LLM", "true").lower() == "true"
     conf_threshold: float = float(os.environ.get("CONF_THRESHOLD", 0.5))
     diarizer: str = os.environ.get("DIARIZER", "simple")
     max_speakers: int = int(os.environ.get("MAX_SPEAKERS", 2))
     results_dir: str = os.environ.get("RESULTS_DIR", "backend/results")
     cache_db: Optional[str] = os.environ.get("CACHE_DB")
+    # Cache backend: sqlite | sharded | fs | memory, optionally per component ("tier_prompts=fs")
+    cache_backend: str = os.environ.get("CACHE_BACKEND", "sqlite").strip().lower()
+    cache_component_backends: str = os.environ.get("CACHE_COMPONENT_BACKENDS", "")
+    cache_dir: str = os.environ.get("CACHE_DIR", "backend/results/cache")
+    cache_shards: int = int(os.environ.get("CACHE_SHARDS", 16))
+    cache_memory_entries: int = int(os.environ.get("CACHE_MEMORY_ENTRIES", 10000))
     store_results: bool = os.environ.get("STORE_RESULTS", "true").lower() == "true"
+    # Stored artifacts: compression (gzip | zstd | none) and background writer threads
+    results_codec: str = os.environ.get("RESULTS_CODEC", "gzip").strip().lower()
+    storage_writers: int = int(os.environ.get("STORAGE_WRITERS", 2))
+    # Waveform peaks stored per session: finest resolution (min/max pairs per second) and sample bits (8 | 16)
+    waveform_peaks_per_sec: float = float(os.environ.get("WAVEFORM_PEAKS_PER_SEC", 100))
+    waveform_bits: int = int(os.environ.get("WAVEFORM_BITS", 8))
+    jobs_db: str = os.environ.get("JOBS_DB", JOBS_DB_DEFAULT)
+    analytics_db: Optional[str] = os.environ.get("ANALYTICS_DB")
+    uploads_dir: str = os.environ.get("UPLOADS_DIR", "backend/results/uploads")
+    max_upload_mb: float = float(os.environ.get("MAX_UPLOAD_MB", 500))
+    job_lease_sec: float = float(os.environ.get("JOB_LEASE_SEC", 300))
+    job_max_attempts: int = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+    worker_processes: int = int(os.environ.get("WORKER_PROCESSES", 2))
+    worker_poll_sec: float = float(os.environ.get("WORKER_POLL_SEC", 1.0))
+    # Threads per stage for /process/batch, e.g. "transcription=2,diarization=1"
+    batch_stage_workers: str = os.environ.get("BATCH_STAGE_WORKERS", "")
+    batch_max_files: int = int(os.environ.get("BATCH_MAX_FILES", 50))
+    profiling_enabled: bool = os.environ.get("PROFILING", "false").lower() == "true"
+    profile_token: str = os.environ.get("PROFILE_TOKEN", "")
+    profile_mode: str = os.environ.get("PROFILE_MODE", "sample")
+    profile_interval_ms: float = float(os.environ.get("PROFILE_INTERVAL_MS", 5.0))
+    # Live (WebSocket) mode: analysed window, analysis cadence and audio ring-buffer size
+    live_window_sec: float = float(os.environ.get("LIVE_WINDOW_SEC", 30.0))
+    live_hop_sec: float = float(os.environ.get("LIVE_HOP_SEC", 10.0))
+    live_buffer_sec: float = float(os.environ.get("LIVE_BUFFER_SEC", 120.0))
 
 CFG = Config()
+if CFG.analysis_depth not in ("fast", "standard", "full"):
+    CFG.analysis_depth = "full"
+if CFG.openai_mode not in ("live", "record", "replay"):
+    CFG.openai_mode = "live"
+if CFG.waveform_bits not in (8, 16):
+    CFG.waveform_bits = 8
 if isinstance(CFG.cache_db, str):
     CFG.cache_db = CFG.cache_db.strip() or None
 if CFG.cache_db is None and CFG.store_results:
     CFG.cache_db = CACHE_DB_DEFAULT
+# Unset: next to the results (it is rebuilt from them); set but empty: analytics disabled.
+if CFG.analytics_db is None:
+    CFG.analytics_db = os.path.join(CFG.results_dir, "analytics.sqlite")
+if not CFG.store_results:
+    CFG.analytics_db = None
+CFG.analytics_db = (CFG.analytics_db or "").strip() or None
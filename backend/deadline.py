@@ -0,0 +1,78 @@
+"""
+Per-request latency budget.
+
+A request runs its pipeline inside `use_deadline(budget_sec)`. API calls clamp
+their timeouts to the time left (`call_timeout`) and are made without the SDK's
+own retries (`openai_client.bounded`); retries stop once too little is left for
+another attempt (`retry_pause`), and the LLM stages degrade in a fixed order as
+the budget runs out:
+
+  1. tier prompts that cannot start with `TIER_MIN_SEC` left are skipped;
+  2. the coach uses the lean "fast" prompt with less than `COACH_FULL_MIN_SEC` left;
+  3. with less than `COACH_LEAN_MIN_SEC` left the coach is not called and the
+     fallback labels are used.
+
+The deadline lives in a ContextVar like the LLM options, so concurrent requests
+each see their own; without one every check passes and timeouts keep their defaults.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+TIER_MIN_SEC = 20.0
+COACH_FULL_MIN_SEC = 45.0
+COACH_LEAN_MIN_SEC = 15.0
+# The least time left worth another attempt.
+MIN_CALL_SEC = 5.0
+
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's latency budget ran out before a call could start."""
+
+
+@contextmanager
+def use_deadline(budget_sec: Optional[float], started: Optional[float] = None) -> Iterator[Optional[float]]:
+    """Deadline `budget_sec` after `started` (a `time.monotonic()` value, default now); None or <= 0 disables."""
+    deadline = None
+    if budget_sec is not None and budget_sec > 0:
+        deadline = (time.monotonic() if started is None else started) + budget_sec
+    token = _DEADLINE.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the active deadline (negative once passed), or None without one."""
+    deadline = _DEADLINE.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def has_time(seconds: float) -> bool:
+    left = remaining()
+    return left is None or left >= seconds
+
+
+def call_timeout(default: float) -> float:
+    """`default`, cut to the time left; raises DeadlineExceeded once the deadline has passed."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Request latency budget exhausted")
+    return min(default, left)
+
+
+def retry_pause(seconds: float) -> bool:
+    """
+    Back off `seconds` before another attempt; False (without sleeping) when the time
+    left after the pause would be too short for that attempt.
+    """
+    if not has_time(seconds + MIN_CALL_SEC):
+        return False
+    time.sleep(seconds)
+    return True
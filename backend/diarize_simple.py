@@ -1,19 +1,27 @@
 # backend/diarize_simple.py
-from typing import List, Dict
+from typing import Dict, Iterable, List
 import os
 import numpy as np
 import librosa
+import soundfile as sf
 import torch
 from sklearn.cluster import KMeans
 from speechbrain.pretrained import EncoderClassifier
 
 # ---------- Cache the classifier once (no re-init per request) ----------
 _SB_CACHE = os.environ.get("SB_CACHE_DIR", "./.sb_cache")
-CLF = EncoderClassifier.from_hparams(
-    source="speechbrain/spkrec-ecapa-voxceleb",
-    savedir=_SB_CACHE,
-    run_opts={"device": "cpu"}  # change to "cuda" if GPU available
-)
+_CLF = None
+
+def get_classifier() -> EncoderClassifier:
+    # Loaded on first use so importing the segment helpers stays cheap.
+    global _CLF
+    if _CLF is None:
+        _CLF = EncoderClassifier.from_hparams(
+            source="speechbrain/spkrec-ecapa-voxceleb",
+            savedir=_SB_CACHE,
+            run_opts={"device": "cpu"}  # change to "cuda" if GPU available
+        )
+    return _CLF
 
 # ---------- Embedding ----------
 def embed_segments(audio_path: str, segments: List[Dict], sr: int = 16000) -> np.ndarray:
@@ -22,19 +30,60 @@ def embed_segments(audio_path: str, segments: List[Dict], sr: int = 16000) -> np
 
     segments: list of dicts with keys {"start": float, "end": float}
     returns: np.ndarray with shape [num_segments, emb_dim]
+
+    Formats libsndfile can seek (WAV, FLAC, OGG, MP3, ...) are read one segment
+    at a time, so memory does not grow with recording length. Anything else
+    (m4a, webm, ...) is decoded in full by librosa as before.
+    """
+    try:
+        f = sf.SoundFile(audio_path)
+    except RuntimeError:  # libsndfile cannot decode this container
+        f = None
+    if f is None or not f.seekable():
+        if f is not None:
+            f.close()
+        # Load mono float32
+        y, sr = librosa.load(audio_path, sr=sr, mono=True)
+        return embed_array(y, segments, sr=sr)
+    with f:
+        return _embed_chunks((_read_segment(f, seg["start"], seg["end"], sr) for seg in segments), sr)
+
+
+def _read_segment(f: sf.SoundFile, start: float, end: float, sr: int) -> np.ndarray:
+    """[start, end) as mono float32 at `sr`; identical to slicing a full `librosa.load` when no resampling is needed."""
+    native = f.samplerate
+    s = max(0, int(start * native))
+    e = min(f.frames, int(end * native))
+    if e <= s:
+        return np.zeros(0, dtype=np.float32)
+    f.seek(s)
+    chunk = f.read(e - s, dtype="float32", always_2d=True).mean(axis=1)
+    if native != sr:
+        chunk = librosa.resample(chunk, orig_sr=native, target_sr=sr)
+    return np.ascontiguousarray(chunk, dtype=np.float32)
+
+
+def embed_array(y: np.ndarray, segments: List[Dict], sr: int = 16000) -> np.ndarray:
+    """
+    Same as `embed_segments`, for audio already in memory (mono float32 at `sr`).
+    Segment times are relative to the start of `y`.
     """
-    # Load mono float32
-    y, sr = librosa.load(audio_path, sr=sr, mono=True)
+    def chunks():
+        for seg in segments:
+            s = max(0, int(seg["start"] * sr))
+            e = min(len(y), int(seg["end"] * sr))
+            yield y[s:e]
 
+    return _embed_chunks(chunks(), sr)
+
+
+def _embed_chunks(chunks: Iterable[np.ndarray], sr: int) -> np.ndarray:
+    clf = get_classifier()
     embs = []
     min_dur = int(0.30 * sr)  # pad up to 300ms if too short
 
     with torch.no_grad():
-        for seg in segments:
-            s = max(0, int(seg["start"] * sr))
-            e = min(len(y), int(seg["end"] * sr))
-            chunk = y[s:e]
-
+        for chunk in chunks:
             # Handle empty segments
             if chunk.size == 0:
                 # ECAPA-Voxceleb default embedding dim is 192
@@ -51,9 +100,9 @@ def embed_segments(audio_path: str, segments: List[Dict], sr: int = 16000) -> np
 
             # Some versions accept wav_lens; try with it, then without
             try:
-                emb = CLF.encode_batch(wav, wav_lens=wav_lens)
+                emb = clf.encode_batch(wav, wav_lens=wav_lens)
             except TypeError:
-                emb = CLF.encode_batch(wav)
+                emb = clf.encode_batch(wav)
 
             emb = emb.squeeze().detach().cpu().numpy().astype(np.float32)
             embs.append(emb)
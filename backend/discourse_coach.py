@@ -1,14 +1,15 @@
 import json
-import time
 from typing import Dict, List, Tuple
 
-from openai import OpenAI
-
-from backend.cache import SQLiteCache
+from backend.cache import get_cache
 from backend.config import CFG
+from backend.deadline import COACH_LEAN_MIN_SEC, call_timeout, has_time, retry_pause
+from backend.openai_client import bounded, has_openai, make_client
+from backend.llm_options import active_depth, cache_fields, llm_params
+from backend.telemetry import LLM_FALLBACKS, LLM_RETRIES, record_llm_usage
 
-client = OpenAI(api_key=CFG.openai_api_key)
-cache = SQLiteCache(CFG.cache_db)
+client = make_client()
+cache = get_cache("coach")
 
 COACH_SYSTEM_PROMPT = """You are an OHCR discourse analyst and teaching coach.
 
@@ -129,6 +130,78 @@ JSON_SCHEMA = {
     "strict": True,
 }
 
+# Shorter instructions for the lean depths; labels and definitions match the full prompt.
+_LEAN_SYSTEM_PROMPT = """You are an OHCR discourse analyst.
+
+Group consecutive utterances into DISCOURSE MOVES (one intent per move; prefer fewer, larger moves).
+For each move give:
+- turn_range, e.g. "3-5";
+- discourse_act: question | statement | regulatory;
+- ohcr: O | H | C | R | none, where
+  O = factual presentation of a phenomenon/data to notice, or open prompts to notice it (not without data),
+  H = proposed explanation, C = question/critique exposing gaps or counterexamples,
+  R = synthesis/closure with teacher agreement;
+- iam_level 1-5 (Interaction Analysis Model): 1 sharing information, 2 dissonance,
+  3 negotiation of meaning, 4 testing a synthesis, 5 agreement/application.
+List the session's distinct sub-topics as short noun phrases.
+{extra}
+Be terse. OUTPUT must follow the JSON schema exactly. """
+
+_LEAN_EXTRA = {
+    "fast": "Do not write notes, rationales or feedback.",
+    "standard": (
+        "Add coach_notes of at most 15 words per move. In global_feedback give a 1-2 sentence "
+        "diagnosis and at most 3 concrete improvements that would raise O/H/C counts."
+    ),
+}
+
+_LEAN_MOVE_FIELDS = {
+    "turn_range": {"type": "string"},
+    "discourse_act": {"type": "string", "enum": ["question", "statement", "regulatory"]},
+    "ohcr": {"type": "string", "enum": ["O", "H", "C", "R", "none"]},
+    "iam_level": {"type": "integer", "minimum": 1, "maximum": 5},
+}
+
+
+def _lean_schema(move_fields: Dict, feedback: bool) -> Dict:
+    properties = {
+        "moves": {
+            "type": "array",
+            "items": {"type": "object", "properties": move_fields, "required": list(move_fields)},
+        },
+        "topics": {"type": "array", "items": {"type": "string"}},
+    }
+    if feedback:
+        properties["global_feedback"] = {
+            "type": "object",
+            "properties": {
+                "diagnosis": {"type": "string"},
+                "improvements": {"type": "array", "items": {"type": "string"}, "maxItems": 3},
+            },
+            "required": ["diagnosis", "improvements"],
+        }
+    return {
+        "name": "ohcr_discourse_analysis",
+        "schema": {
+            "type": "object",
+            "properties": properties,
+            "required": list(properties),
+            "additionalProperties": False,
+        },
+        "strict": True,
+    }
+
+
+# (system prompt, schema) per analysis depth; "full" is the original report.
+DEPTH_SPECS = {
+    "fast": (_LEAN_SYSTEM_PROMPT.replace("{extra}", _LEAN_EXTRA["fast"]), _lean_schema(_LEAN_MOVE_FIELDS, False)),
+    "standard": (
+        _LEAN_SYSTEM_PROMPT.replace("{extra}", _LEAN_EXTRA["standard"]),
+        _lean_schema({**_LEAN_MOVE_FIELDS, "coach_notes": {"type": "string"}}, True),
+    ),
+    "full": (COACH_SYSTEM_PROMPT, JSON_SCHEMA),
+}
+
 _DEFAULT_REPORT = {
     "transcript_meta": {"num_turns": 0, "has_observe": False, "has_knowledge_question": False},
     "moves": [],
@@ -153,6 +226,28 @@ def _default_report() -> Dict:
     return json.loads(json.dumps(_DEFAULT_REPORT))
 
 
+def _complete_report(report: Dict, num_turns: int) -> Dict:
+    """Fill the fields a lean-depth report leaves out, so consumers see the full report shape."""
+    moves = [m for m in report.get("moves") or [] if isinstance(m, dict)]
+    for idx, move in enumerate(moves, start=1):
+        move.setdefault("move_id", f"M{idx}")
+        move.setdefault("speakers", [])
+        for key in ("utterance_summary", "coach_notes", "iam_rationale"):
+            move.setdefault(key, "")
+    default = _default_report()
+    feedback = report.get("global_feedback") if isinstance(report.get("global_feedback"), dict) else {}
+    feedback.setdefault("diagnosis", "")
+    feedback.setdefault("improvements", [])
+    feedback.setdefault("next_time_observe_script", "")
+    feedback.setdefault("rubric_flags", default["global_feedback"]["rubric_flags"])
+    has_observe = any(str(m.get("ohcr", "")).upper() == "O" for m in moves)
+    report.setdefault("transcript_meta", {"num_turns": num_turns, "has_observe": has_observe,
+                                          "has_knowledge_question": False})
+    report.update({"moves": moves, "global_feedback": feedback})
+    report.setdefault("topics", [])
+    return report
+
+
 def _format_transcript(utterances: List[Dict]) -> List[Dict]:
     formatted = []
     for idx, utt in enumerate(utterances, start=1):
@@ -175,13 +270,14 @@ def _format_transcript(utterances: List[Dict]) -> List[Dict]:
     return formatted
 
 
-def _call_via_responses(transcript: List[Dict]) -> Tuple[Dict, Dict]:
-    response = client.responses.create(
-        model=CFG.llm_model,
-        temperature=0.1,
-        top_p=0.9,
-        seed=7,
-        system=COACH_SYSTEM_PROMPT,
+_COACH_DEFAULTS = {"temperature": 0.1, "top_p": 0.9, "seed": 7}
+
+
+def _call_via_responses(transcript: List[Dict], params: Dict, depth: str = "full") -> Tuple[Dict, Dict]:
+    system_prompt, schema = DEPTH_SPECS[depth]
+    response = bounded(client).responses.create(
+        **params,
+        system=system_prompt,
         input=[
             {
                 "role": "user",
@@ -190,8 +286,8 @@ def _call_via_responses(transcript: List[Dict]) -> Tuple[Dict, Dict]:
                 ],
             }
         ],
-        response_format={"type": "json_schema", "json_schema": JSON_SCHEMA},
-        timeout=60,
+        response_format={"type": "json_schema", "json_schema": schema},
+        timeout=call_timeout(60),
     )
     output = response.output[0].content[0].text
     parsed = json.loads(output)
@@ -205,16 +301,14 @@ def _call_via_responses(transcript: List[Dict]) -> Tuple[Dict, Dict]:
     return parsed, meta
 
 
-def _call_via_chat(transcript: List[Dict]) -> Tuple[Dict, Dict]:
-    schema_hint = json.dumps(JSON_SCHEMA["schema"], ensure_ascii=False)
+def _call_via_chat(transcript: List[Dict], params: Dict, depth: str = "full") -> Tuple[Dict, Dict]:
+    system_prompt, schema = DEPTH_SPECS[depth]
+    schema_hint = json.dumps(schema["schema"], ensure_ascii=False)
     payload = json.dumps({"transcript": transcript}, ensure_ascii=False)
-    resp = client.chat.completions.create(
-        model=CFG.llm_model,
-        temperature=0.1,
-        top_p=0.9,
-        seed=7,
+    resp = bounded(client).chat.completions.create(
+        **params,
         messages=[
-            {"role": "system", "content": COACH_SYSTEM_PROMPT},
+            {"role": "system", "content": system_prompt},
             {
                 "role": "user",
                 "content": (
@@ -225,7 +319,7 @@ def _call_via_chat(transcript: List[Dict]) -> Tuple[Dict, Dict]:
             },
         ],
         response_format={"type": "json_object"},
-        timeout=60,
+        timeout=call_timeout(60),
     )
     content = resp.choices[0].message.content
     parsed = json.loads(content)
@@ -245,34 +339,56 @@ def _run_coach(transcript: List[Dict]) -> Tuple[Dict, Dict]:
         report["transcript_meta"]["num_turns"] = 0
         return report, {"source": "fallback", "reason": "empty_transcript"}
 
-    if not CFG.use_llm or not CFG.openai_api_key:
+    if not CFG.use_llm or not has_openai():
         report = _default_report()
         report["transcript_meta"]["num_turns"] = len(transcript)
         return report, {"source": "fallback", "reason": "llm_disabled_or_missing_key"}
 
+    if not has_time(COACH_LEAN_MIN_SEC):
+        report = _default_report()
+        report["transcript_meta"]["num_turns"] = len(transcript)
+        return report, {"source": "fallback", "reason": "deadline"}
+
+    params = llm_params(**_COACH_DEFAULTS)
+    depth = active_depth()
     payload = {
         "v": "coach_v4",
-        "model": CFG.llm_model,
+        **cache_fields(params, **_COACH_DEFAULTS),
         "transcript": transcript,
     }
+    if depth != "full":
+        payload["depth"] = depth
 
     def _compute():
         last_err = None
+        cut_short = False
         for attempt in range(3):
             try:
                 if getattr(client, "responses", None):
-                    parsed, meta = _call_via_responses(transcript)
+                    parsed, meta = _call_via_responses(transcript, params, depth)
                 else:
-                    parsed, meta = _call_via_chat(transcript)
+                    parsed, meta = _call_via_chat(transcript, params, depth)
+                if depth != "full":
+                    parsed = _complete_report(parsed, len(transcript))
                 meta.setdefault("source", "llm")
+                record_llm_usage("coach", meta)
                 return parsed, meta
             except Exception as err:
                 last_err = err
-                time.sleep(0.8 * (attempt + 1))
-
+                if attempt == 2:
+                    break
+                if not retry_pause(0.8 * (attempt + 1)):
+                    cut_short = True
+                    break
+                LLM_RETRIES.inc(component="coach")
+
+        LLM_FALLBACKS.inc(component="coach")
         fallback = _default_report()
         fallback["transcript_meta"]["num_turns"] = len(transcript)
-        return fallback, {"source": "fallback", "error": str(last_err) if last_err else "unknown"}
+        meta = {"source": "fallback", "error": str(last_err) if last_err else "unknown"}
+        if cut_short:
+            meta["reason"] = "deadline"
+        return fallback, meta
 
     report, meta = cache.get_or_set(payload, _compute)
     if not isinstance(report, dict):
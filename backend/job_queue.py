@@ -0,0 +1,206 @@
+import sqlite3, json, time, os
+from typing import Any, Dict, Optional
+
+
+class LeaseLost(RuntimeError):
+    """Raised when a worker touches a job whose lease now belongs to someone else."""
+
+
+def remove_upload(audio_path: str) -> None:
+    """Delete a job's spooled upload and its per-job directory."""
+    try:
+        os.unlink(audio_path)
+        os.rmdir(os.path.dirname(audio_path))
+    except OSError:
+        pass
+
+
+class JobQueue:
+    """
+    Durable job queue backed by SQLite.
+
+    Jobs are claimed with a time-limited lease; a worker that dies simply stops
+    renewing it and the job becomes claimable again. Each finished stage is
+    checkpointed in `job_stages` so a re-claimed job resumes where it stopped.
+    Once a job completes or fails for good its checkpoints and upload are
+    removed; the result lives in the saved session.
+    """
+
+    def __init__(self, path: str, lease_sec: float = 300.0, max_attempts: int = 3):
+        self.path = path
+        self.lease_sec = lease_sec
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as c:
+            c.execute("PRAGMA journal_mode=WAL")
+            self._ensure_schema(c)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _ensure_schema(conn: sqlite3.Connection) -> None:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+              id TEXT PRIMARY KEY,
+              status TEXT NOT NULL,
+              audio_path TEXT NOT NULL,
+              filename TEXT,
+              created REAL,
+              updated REAL,
+              lease_owner TEXT,
+              lease_expires REAL,
+              attempts INTEGER NOT NULL DEFAULT 0,
+              error TEXT
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS job_stages (
+              job_id TEXT NOT NULL,
+              stage TEXT NOT NULL,
+              output TEXT NOT NULL,
+              created REAL,
+              PRIMARY KEY (job_id, stage)
+            )
+            """
+        )
+
+    def enqueue(self, job_id: str, audio_path: str, filename: str) -> None:
+        now = time.time()
+        with self._connect() as c:
+            c.execute(
+                "INSERT INTO jobs (id, status, audio_path, filename, created, updated) VALUES (?,?,?,?,?,?)",
+                (job_id, "queued", audio_path, filename, now, now),
+            )
+
+    def claim(self, owner: str) -> Optional[Dict[str, Any]]:
+        """Lease the oldest runnable job (queued, or running with an expired lease)."""
+        while True:
+            now = time.time()
+            with self._connect() as c:
+                c.execute("BEGIN IMMEDIATE")
+                try:
+                    row = c.execute(
+                        """
+                        SELECT * FROM jobs
+                        WHERE (status = 'queued' OR (status = 'running' AND lease_expires < ?))
+                        ORDER BY created LIMIT 1
+                        """,
+                        (now,),
+                    ).fetchone()
+                    if row is None:
+                        c.execute("COMMIT")
+                        return None
+                    exhausted = row["attempts"] >= self.max_attempts
+                    if exhausted:
+                        c.execute(
+                            "UPDATE jobs SET status='failed', updated=?, lease_owner=NULL, "
+                            "error=COALESCE(error, 'lease expired too many times') WHERE id=?",
+                            (now, row["id"]),
+                        )
+                        c.execute("DELETE FROM job_stages WHERE job_id=?", (row["id"],))
+                    else:
+                        c.execute(
+                            "UPDATE jobs SET status='running', lease_owner=?, lease_expires=?, "
+                            "attempts=attempts+1, updated=? WHERE id=?",
+                            (owner, now + self.lease_sec, now, row["id"]),
+                        )
+                    c.execute("COMMIT")
+                except Exception:
+                    c.execute("ROLLBACK")
+                    raise
+            if exhausted:
+                # Retire it and look at the next candidate.
+                remove_upload(row["audio_path"])
+                continue
+            job = dict(row)
+            job["attempts"] += 1
+            job["lease_owner"] = owner
+            return job
+
+    def _owned_update(self, c: sqlite3.Connection, sql: str, params: tuple, job_id: str, owner: str) -> None:
+        cur = c.execute(sql + " WHERE id=? AND lease_owner=? AND status='running'", params + (job_id, owner))
+        if cur.rowcount == 0:
+            raise LeaseLost(job_id)
+
+    def heartbeat(self, job_id: str, owner: str) -> None:
+        now = time.time()
+        with self._connect() as c:
+            self._owned_update(c, "UPDATE jobs SET lease_expires=?, updated=?",
+                               (now + self.lease_sec, now), job_id, owner)
+
+    def checkpoint(self, job_id: str, owner: str, stage: str, output: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._connect() as c:
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                self._owned_update(c, "UPDATE jobs SET lease_expires=?, updated=?",
+                                   (now + self.lease_sec, now), job_id, owner)
+                c.execute("INSERT OR REPLACE INTO job_stages VALUES (?,?,?,?)",
+                          (job_id, stage, json.dumps(output, ensure_ascii=False), now))
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+
+    def load_stages(self, job_id: str) -> Dict[str, Any]:
+        """Merge every checkpointed stage output into one `steps` dict."""
+        steps: Dict[str, Any] = {}
+        with self._connect() as c:
+            rows = c.execute("SELECT stage, output FROM job_stages WHERE job_id=? ORDER BY created",
+                             (job_id,)).fetchall()
+        for row in rows:
+            steps.update(json.loads(row["output"]))
+        return steps
+
+    def _finish(self, job_id: str, owner: str, status: str, error: Optional[str]) -> None:
+        # Terminal states: the checkpoints and the upload are no longer needed.
+        with self._connect() as c:
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                row = c.execute("SELECT audio_path FROM jobs WHERE id=?", (job_id,)).fetchone()
+                self._owned_update(c, "UPDATE jobs SET status=?, lease_owner=NULL, lease_expires=NULL, updated=?, "
+                                      "error=?", (status, time.time(), error), job_id, owner)
+                c.execute("DELETE FROM job_stages WHERE job_id=?", (job_id,))
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+        if row is not None:
+            remove_upload(row["audio_path"])
+
+    def complete(self, job_id: str, owner: str) -> None:
+        self._finish(job_id, owner, "completed", None)
+
+    def fail(self, job_id: str, owner: str, error: str, retry: bool = True) -> str:
+        """
+        Release the job for another attempt, or mark it failed once attempts run out
+        (or at once when `retry` is False). Returns the new status.
+        """
+        with self._connect() as c:
+            row = c.execute("SELECT attempts FROM jobs WHERE id=?", (job_id,)).fetchone()
+        if not retry or row is None or row["attempts"] >= self.max_attempts:
+            self._finish(job_id, owner, "failed", error)
+            return "failed"
+        with self._connect() as c:
+            self._owned_update(c, "UPDATE jobs SET status='queued', lease_owner=NULL, lease_expires=NULL, "
+                                  "updated=?, error=?", (time.time(), error), job_id, owner)
+        return "queued"
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as c:
+            row = c.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            stages = [r["stage"] for r in c.execute(
+                "SELECT stage FROM job_stages WHERE job_id=? ORDER BY created", (job_id,))]
+        job = dict(row)
+        job["completed_stages"] = stages
+        return job
@@ -0,0 +1,274 @@
+"""
+Live classroom mode: rolling analysis of audio streamed during the lesson.
+
+The client streams raw PCM over the `/live` WebSocket. Audio goes into a
+fixed-size ring buffer, so memory stays flat however long the lesson runs.
+Every `hop_sec` of new audio, the unanalysed part of the buffer (capped at
+`window_sec`) is transcribed, and each finished segment is then:
+
+  - assigned to a speaker by online nearest-centroid matching of ECAPA
+    embeddings, so speaker ids stay stable across windows (unlike re-running
+    KMeans per window);
+  - given a role by cumulative talk time, as in the offline pipeline;
+  - labelled with `label_utterance` using the previous utterances as context;
+  - folded into a `MetricsAccumulator`.
+
+Each analysis step sees at most `window_sec` of audio, the labels of a step
+share a `hop_sec` deadline (utterances still unlabelled when it passes get the
+fallback label), and the metrics in an update come from the accumulator's
+constant-cost `summary`, so update latency does not grow with the lesson.
+Transcripts are pushed to the client, not kept: the server only holds the audio
+ring buffer and a slim per-utterance record for the metrics. If analysis falls
+further behind than that, the oldest unanalysed audio is skipped and reported
+as `dropped_sec`.
+"""
+import io
+import threading
+import time
+import wave
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+import numpy as np
+
+from backend.config import CFG
+from backend.deadline import use_deadline
+from backend.metrics_engine import MetricsAccumulator
+from backend.telemetry import LIVE_ANALYSIS_SECONDS, LIVE_DROPPED_SECONDS
+
+ENCODINGS = ("pcm_s16le", "pcm_f32le")
+EMBED_SR = 16000
+# Whisper segments ending this close to the live edge may be cut mid-word; they are
+# re-transcribed with the next window instead of being committed now.
+EDGE_GUARD_SEC = 1.0
+MIN_WINDOW_SEC = 0.5
+# Cosine similarity below which a segment opens a new speaker (while fewer than max_speakers exist).
+NEW_SPEAKER_SIMILARITY = 0.45
+TIMELINE_TAIL = 6
+_LABEL_CONTEXT = 2
+_ACCUMULATED_FIELDS = ("start", "end", "speaker", "role", "ohcr", "discourse_act", "confidence")
+# Scalar compute_all fields pushed with every update.
+_METRIC_FIELDS = (
+    "ohcr_counts", "challenge_resolve_rate", "resolution_density_per_min",
+    "teacher_talk_pct", "student_talk_pct", "avg_teacher_turn", "avg_student_turn",
+    "beneficial_duration_pct", "kcs_score", "interaction_count",
+    "teacher_question_count", "student_question_count", "class_duration_sec",
+)
+
+
+class PCMRingBuffer:
+    """Fixed-capacity mono float32 buffer addressed by absolute sample position."""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._buf = np.zeros(self.capacity, dtype=np.float32)
+        self.total = 0  # samples written since the start of the stream
+
+    @property
+    def start(self) -> int:
+        """Oldest absolute sample still held."""
+        return max(0, self.total - self.capacity)
+
+    def write(self, samples: np.ndarray) -> None:
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.size > self.capacity:
+            self.total += samples.size - self.capacity
+            samples = samples[-self.capacity:]
+        pos = self.total % self.capacity
+        first = min(samples.size, self.capacity - pos)
+        self._buf[pos:pos + first] = samples[:first]
+        self._buf[:samples.size - first] = samples[first:]
+        self.total += samples.size
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        start, end = max(start, self.start), min(end, self.total)
+        if end <= start:
+            return np.zeros(0, dtype=np.float32)
+        a, b = start % self.capacity, end % self.capacity
+        if a < b:
+            return self._buf[a:b].copy()
+        return np.concatenate([self._buf[a:], self._buf[:b]])
+
+
+class OnlineSpeakerAssigner:
+    """Leader-follower clustering of speaker embeddings with running-mean centroids."""
+
+    def __init__(self, max_speakers: int = 2, threshold: float = NEW_SPEAKER_SIMILARITY):
+        self.max_speakers = max(1, max_speakers)
+        self.threshold = threshold
+        self.centroids: List[np.ndarray] = []
+        self.counts: List[int] = []
+
+    def assign(self, emb: np.ndarray) -> str:
+        norm = float(np.linalg.norm(emb))
+        if norm == 0.0:
+            # Empty/silent segment: attribute it to the first speaker rather than inventing one.
+            return "SPEAKER_0"
+        emb = emb / norm
+        if self.centroids:
+            sims = [float(np.dot(c, emb) / (np.linalg.norm(c) or 1.0)) for c in self.centroids]
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold or len(self.centroids) >= self.max_speakers:
+                self.counts[best] += 1
+                self.centroids[best] += (emb - self.centroids[best]) / self.counts[best]
+                return f"SPEAKER_{best}"
+        self.centroids.append(emb.astype(np.float32))
+        self.counts.append(1)
+        return f"SPEAKER_{len(self.centroids) - 1}"
+
+
+def decode_pcm(data: bytes, encoding: str) -> np.ndarray:
+    if encoding == "pcm_s16le":
+        usable = len(data) - len(data) % 2
+        return np.frombuffer(data[:usable], dtype="<i2").astype(np.float32) / 32768.0
+    usable = len(data) - len(data) % 4
+    return np.frombuffer(data[:usable], dtype="<f4").astype(np.float32)
+
+
+def _wav_bytes(y: np.ndarray, sr: int) -> bytes:
+    pcm = (np.clip(y, -1.0, 1.0) * 32767.0).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+class LiveSession:
+    def __init__(self, sample_rate: int = 16000, encoding: str = "pcm_s16le",
+                 window_sec: Optional[float] = None, hop_sec: Optional[float] = None,
+                 buffer_sec: Optional[float] = None):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of {', '.join(ENCODINGS)}")
+        if not 8000 <= sample_rate <= 48000:
+            raise ValueError("sample_rate must be between 8000 and 48000")
+        self.sample_rate = int(sample_rate)
+        self.encoding = encoding
+        self.window_sec = float(window_sec or CFG.live_window_sec)
+        self.hop_sec = min(float(hop_sec or CFG.live_hop_sec), self.window_sec)
+        # The buffer must hold at least one full window plus the hop that arrives while it is analysed.
+        self.buffer_sec = max(float(buffer_sec or CFG.live_buffer_sec), self.window_sec + self.hop_sec)
+        self.ring = PCMRingBuffer(int(self.buffer_sec * self.sample_rate))
+        self.speakers = OnlineSpeakerAssigner(max_speakers=CFG.max_speakers)
+        self.talk_time: Dict[str, float] = {}
+        self.metrics = MetricsAccumulator()
+        self._context: Deque[Dict] = deque(maxlen=_LABEL_CONTEXT)
+        self.analyzed_until = 0  # absolute sample up to which audio has been committed
+        self.dropped_sec = 0.0
+        self.updates = 0
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    # ---------- ingest (event loop) ----------
+    def feed(self, data: bytes) -> None:
+        samples = decode_pcm(data, self.encoding)
+        with self._lock:
+            self.ring.write(samples)
+
+    @property
+    def audio_sec(self) -> float:
+        return self.ring.total / self.sample_rate
+
+    def due(self) -> bool:
+        return self.ring.total - self.analyzed_until >= self.hop_sec * self.sample_rate
+
+    # ---------- analysis (worker thread) ----------
+    def analyze(self, final: bool = False) -> Dict:
+        """Transcribe and label the audio received since the last step, then return an update message."""
+        from backend.diarize_simple import embed_array
+        from backend.llm_labeler_robust import label_utterance
+        from backend.transcribe_openai import transcribe_audio_bytes
+
+        t0 = time.perf_counter()
+        sr = self.sample_rate
+        with self._lock:
+            end = self.ring.total
+            start = max(self.analyzed_until, end - int(self.window_sec * sr), self.ring.start)
+            audio = self.ring.read(start, end)
+        if start > self.analyzed_until:
+            skipped = (start - self.analyzed_until) / sr
+            self.dropped_sec += skipped
+            LIVE_DROPPED_SECONDS.inc(skipped)
+
+        new: List[Dict] = []
+        resume = end if final else end - int(EDGE_GUARD_SEC * sr)
+        if audio.size >= MIN_WINDOW_SEC * sr:
+            offset = start / sr
+            _, verbose = transcribe_audio_bytes(_wav_bytes(audio, sr), filename="live.wav")
+            edge = (end / sr) if final else (end / sr - EDGE_GUARD_SEC)
+            segments = []
+            for seg in verbose.get("segments", []):
+                s_abs, e_abs = offset + float(seg["start"]), offset + float(seg["end"])
+                # A segment spanning the whole window is committed anyway, or it would never be.
+                if e_abs > edge and s_abs > offset + MIN_WINDOW_SEC:
+                    resume = min(resume, int(s_abs * sr))
+                    break
+                if (seg.get("text") or "").strip():
+                    segments.append({"start": s_abs, "end": e_abs, "text": seg["text"].strip()})
+            if segments:
+                y = audio if sr == EMBED_SR else _resample(audio, sr)
+                rel = [{"start": s["start"] - offset, "end": s["end"] - offset} for s in segments]
+                embs = embed_array(y, rel, sr=EMBED_SR)
+                for seg, emb in zip(segments, embs):
+                    seg["speaker"] = self.speakers.assign(emb)
+                    self.talk_time[seg["speaker"]] = self.talk_time.get(seg["speaker"], 0.0) + seg["end"] - seg["start"]
+                teacher = self._teacher()
+                # One slow LLM call must not stall the stream: once a hop's worth of time is
+                # spent, the remaining utterances of this step get the fallback label.
+                with use_deadline(self.hop_sec):
+                    for seg in segments:
+                        seg["role"] = "teacher" if seg["speaker"] == teacher else "student"
+                        labeled = label_utterance(list(self._context), seg, [])
+                        self._context.append(seg)
+                        labeled["turn"] = self.metrics.count + 1
+                        # Only the fields metrics need: episode state then costs a few hundred bytes per utterance.
+                        self.metrics.add({key: labeled.get(key) for key in _ACCUMULATED_FIELDS})
+                        new.append(labeled)
+                self.analyzed_until = max(self.analyzed_until, int(round(segments[-1]["end"] * sr)))
+        # Speech cut at the live edge is re-transcribed next step; silence before it is consumed.
+        self.analyzed_until = max(self.analyzed_until, resume)
+
+        elapsed = time.perf_counter() - t0
+        LIVE_ANALYSIS_SECONDS.observe(elapsed)
+        self.updates += 1
+        return self.update(new, analysis_ms=int(elapsed * 1000), final=final)
+
+    def _teacher(self) -> Optional[str]:
+        return max(self.talk_time, key=self.talk_time.get) if self.talk_time else None
+
+    def update(self, new: List[Dict], analysis_ms: int = 0, final: bool = False) -> Dict:
+        summary = self.metrics.summary(TIMELINE_TAIL)
+        total_talk = sum(self.talk_time.values())
+        teacher = self._teacher()
+        teacher_sec = self.talk_time.get(teacher, 0.0) if teacher else 0.0
+        self._seq += 1
+        return {
+            "type": "final" if final else "update",
+            "seq": self._seq,
+            "audio_sec": round(self.audio_sec, 3),
+            "analyzed_sec": round(self.analyzed_until / self.sample_rate, 3),
+            "lag_sec": round(max(0.0, self.audio_sec - self.analyzed_until / self.sample_rate), 3),
+            "dropped_sec": round(self.dropped_sec, 3),
+            "analysis_ms": analysis_ms,
+            "utterances": new,
+            "talk_time": {
+                "speakers": {sp: round(sec, 3) for sp, sec in sorted(self.talk_time.items())},
+                "teacher_speaker": teacher,
+                # Current teacher mapping applied to all talk so far (roles on past utterances may differ).
+                "teacher_pct": round(100.0 * teacher_sec / total_talk, 1) if total_talk else 0.0,
+                "student_pct": round(100.0 * (total_talk - teacher_sec) / total_talk, 1) if total_talk else 0.0,
+            },
+            "metrics": {
+                **{key: summary[key] for key in _METRIC_FIELDS},
+                "discourse_summary": summary["discourse_analysis"]["summary"],
+                "timeline": summary["timeline"],
+            },
+        }
+
+
+def _resample(y: np.ndarray, sr: int) -> np.ndarray:
+    import librosa
+
+    return librosa.resample(y, orig_sr=sr, target_sr=EMBED_SR).astype(np.float32)
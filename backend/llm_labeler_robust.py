@@ -1,16 +1,20 @@
 # backend/llm_labeler_robust.py
-import json, time
-from typing import Dict, List, Literal
-from openai import OpenAI
-from backend.cache import SQLiteCache
+import json, re, unicodedata
+from typing import Dict, List, Literal, Optional
+from backend.cache import get_cache
 from backend.config import CFG
+from backend.deadline import call_timeout, retry_pause
+from backend.openai_client import bounded, has_openai, make_client
+from backend.llm_options import active_options, cache_fields, llm_params
+from backend.local_classifier import get_local_classifier
+from backend.telemetry import LLM_FALLBACKS, LLM_RETRIES, LOCAL_LABELS, record_llm_usage
 
 # NEW
 from string import Template
 from pydantic import BaseModel, Field, ValidationError
 
-client = OpenAI(api_key=CFG.openai_api_key)
-cache = SQLiteCache(CFG.cache_db)
+client = make_client()
+cache = get_cache("label_one")
 
 SYSTEM = (
     "You are a discourse analyst for classroom interactions using the OHCR framework.\n"
@@ -68,22 +72,62 @@ def _normalize_payload(data: Dict) -> Dict:
     d["rationale"] = str(d.get("rationale",""))[:200]  # keep concise
     return d
 
-def label_one(before: List[Dict], target: Dict, after: List[Dict]) -> Dict:
-    payload = {
-        "v": "v2.1",  # bump to invalidate old cache if needed
-        "model": CFG.llm_model,
-        "before": before,
-        "target": target,
-        "after": after
+_LABEL_DEFAULTS = {"temperature": 0}
+
+# ---- Cache keys ----
+# Keys use only role + normalized text, so re-segmenting or re-diarizing a session
+# (new timestamps, speaker ids) keeps hitting the cache while the words are unchanged.
+_SPACE = re.compile(r"\s+")
+_PUNCT = re.compile(r"[^\w\s'?]+")  # "?" is kept: it separates questions from statements
+
+def _norm_whitespace(text: str) -> str:
+    return _SPACE.sub(" ", text).strip()
+
+def _norm_loose(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _SPACE.sub(" ", _PUNCT.sub(" ", text)).strip()
+    return text.replace(" ?", "?")
+
+# name -> (version, fn). Bump a version whenever its output changes, so stale keys are not reused.
+KEY_NORMALIZERS = {
+    "whitespace": (1, _norm_whitespace),
+    "loose": (1, _norm_loose),
+}
+
+def _context_item(u: Dict) -> Dict:
+    """What the LLM sees of an utterance: its role and text."""
+    return {"role": str(u.get("role") or "unknown").lower(), "text": (u.get("text") or "").strip()}
+
+def label_cache_payload(before: List[Dict], target: Dict, after: List[Dict], params: Dict) -> Dict:
+    name = CFG.label_key_normalizer if CFG.label_key_normalizer in KEY_NORMALIZERS else "loose"
+    version, normalize = KEY_NORMALIZERS[name]
+
+    def key_item(u: Dict) -> Dict:
+        item = _context_item(u)
+        item["text"] = normalize(item["text"])
+        return item
+
+    return {
+        "v": "v3",  # bump to invalidate old cache if needed
+        "norm": f"{name}.{version}",
+        **cache_fields(params, **_LABEL_DEFAULTS),
+        "before": [key_item(u) for u in before],
+        "target": key_item(target),
+        "after": [key_item(u) for u in after],
     }
 
+def label_one(before: List[Dict], target: Dict, after: List[Dict], cached: Optional[Dict] = None) -> Dict:
+    """`cached` is a value already looked up for this payload (see `hybrid_label`)."""
+    params = llm_params(**_LABEL_DEFAULTS)
+    payload = label_cache_payload(before, target, after, params)
+
     def _compute():
         # --- build message safely with Template ---
         try:
             msg = PROMPT.substitute(
-                before=json.dumps(before, ensure_ascii=False),
-                target=json.dumps(target, ensure_ascii=False),
-                after=json.dumps(after, ensure_ascii=False),
+                before=json.dumps([_context_item(u) for u in before], ensure_ascii=False),
+                target=json.dumps(_context_item(target), ensure_ascii=False),
+                after=json.dumps([_context_item(u) for u in after], ensure_ascii=False),
             )
         except KeyError as e:
             # Very explicit error if a variable name is wrong
@@ -92,15 +136,14 @@ def label_one(before: List[Dict], target: Dict, after: List[Dict]) -> Dict:
         last_err = None
         for attempt in range(3):
             try:
-                resp = client.chat.completions.create(
-                    model=CFG.llm_model,
-                    temperature=0,               # deterministic
+                resp = bounded(client).chat.completions.create(
+                    **params,                    # model, temperature=0 (deterministic) unless overridden
                     messages=[
                         {"role": "system", "content": SYSTEM},
                         {"role": "user", "content": msg}
                     ],
                     response_format={"type": "json_object"},
-                    timeout=30,                  # keep tight
+                    timeout=call_timeout(30),    # keep tight
                 )
                 content = resp.choices[0].message.content
                 raw = json.loads(content)
@@ -111,21 +154,28 @@ def label_one(before: List[Dict], target: Dict, after: List[Dict]) -> Dict:
                 meta = {
                     "ptoks": getattr(resp.usage, "prompt_tokens", None),
                     "ctoks": getattr(resp.usage, "completion_tokens", None),
+                    # Training input for backend.local_classifier.
+                    "target": {"text": target.get("text", ""), "role": target.get("role", "unknown")},
                 }
+                record_llm_usage("label_one", meta)
                 return obj.model_dump(), meta
 
             except (json.JSONDecodeError, ValidationError) as e:
                 last_err = e
             except Exception as e:
                 last_err = e
-                time.sleep(0.8 * (attempt + 1))  # backoff
+                if attempt == 2 or not retry_pause(0.8 * (attempt + 1)):  # backoff
+                    break
+            if attempt < 2:
+                LLM_RETRIES.inc(component="label_one")
 
         # If all attempts fail, return a safe default
         # (hybrid will still compare confidence/role)
+        LLM_FALLBACKS.inc(component="label_one")
         return {"ohcr": "None", "discourse_act": "other",
-                "role": "unknown", "confidence": 0.0, "rationale": ""}, {}
+                "role": "unknown", "confidence": 0.0, "rationale": ""}, {"source": "fallback"}
 
-    out, _ = cache.get_or_set(payload, _compute)
+    out = cached if cached is not None else cache.get_or_set(payload, _compute)[0]
     return {
         "ohcr": out.get("ohcr", "None"),
         "discourse_act": out.get("discourse_act", "other"),
@@ -135,32 +185,52 @@ def label_one(before: List[Dict], target: Dict, after: List[Dict]) -> Dict:
         "source": "llm"
     }
 
+def local_label(u: Dict) -> Optional[Dict]:
+    """Confident local-classifier label for `u`, or None when the LLM should decide."""
+    # An explicit model override asks for that model's labels, so it bypasses the cascade.
+    if active_options().model:
+        return None
+    model = get_local_classifier()
+    if model is None:
+        return None
+    pred = model.predict(u)
+    LOCAL_LABELS.inc(result="local" if pred else "deferred")
+    return pred
+
+def label_utterance(before: List[Dict], u: Dict, after: List[Dict], cached: Optional[Dict] = None) -> Dict:
+    """Label one utterance given its neighbours (the per-item step of `hybrid_label`)."""
+    local_pred = local_label(u)
+    if local_pred is not None:
+        return {**u, **local_pred}
+
+    if not CFG.use_llm:
+        return {
+            **u,
+            "ohcr": "None",
+            "discourse_act": "statement" if "?" not in u["text"] else "question",
+            "role": u.get("role", "unknown"),
+            "confidence": 0.0,
+            "rationale": "LLM disabled"
+        }
+
+    llm_pred = label_one(before, u, after, cached)
+    final_pred = {**u, **llm_pred}
+
+    if final_pred.get("role", "unknown") == "unknown":
+        final_pred["role"] = u.get("role", "unknown")
+
+    if final_pred.get("confidence", 0.0) < CFG.conf_threshold:
+        final_pred["ohcr"] = "None"
+
+    final_pred.setdefault("source", "llm")
+    return final_pred
+
 def hybrid_label(utterances: List[Dict]) -> List[Dict]:
-    labeled = []
-    for i, u in enumerate(utterances):
-        before = utterances[max(0, i-2):i]
-        after  = utterances[i+1:i+2]
-
-        if not CFG.use_llm:
-            labeled.append({
-                **u,
-                "ohcr": "None",
-                "discourse_act": "statement" if "?" not in u["text"] else "question",
-                "role": u.get("role", "unknown"),
-                "confidence": 0.0,
-                "rationale": "LLM disabled"
-            })
-            continue
-
-        llm_pred = label_one(before, u, after)
-        final_pred = {**u, **llm_pred}
-
-        if final_pred.get("role", "unknown") == "unknown":
-            final_pred["role"] = u.get("role", "unknown")
-
-        if final_pred.get("confidence", 0.0) < CFG.conf_threshold:
-            final_pred["ohcr"] = "None"
-
-        final_pred.setdefault("source", "llm")
-        labeled.append(final_pred)
-    return labeled
+    windows = [(utterances[max(0, i-2):i], u, utterances[i+1:i+2]) for i, u in enumerate(utterances)]
+    # One bulk cache read for the whole transcript instead of a lookup per utterance.
+    cached = [None] * len(windows)
+    if CFG.use_llm:
+        params = llm_params(**_LABEL_DEFAULTS)
+        entries = cache.lookup_many([label_cache_payload(b, u, a, params) for b, u, a in windows])
+        cached = [entry[0] if entry else None for entry in entries]
+    return [label_utterance(b, u, a, c) for (b, u, a), c in zip(windows, cached)]
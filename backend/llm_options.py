@@ -0,0 +1,111 @@
+"""
+Per-request LLM model and sampling overrides.
+
+`CFG.llm_model` and each call site's sampling parameters are the defaults. A
+request (or one variant of a re-analysis) runs its pipeline inside
+`use_llm_options(...)`, and the coach, tier and label calls resolve their
+parameters through `llm_params`. Options live in a ContextVar, so concurrent
+requests and worker threads each see only their own.
+
+`depth` is not sent to the API: it selects how much the coach and tier
+prompts ask for (see `DEPTHS`), defaulting to `CFG.analysis_depth`.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, Optional
+
+from backend.config import CFG
+
+_MAX_MODEL_LEN = 100
+# fast: labels only, one quick-look tier; standard: short notes, compact tiers; full: everything.
+DEPTHS = ("fast", "standard", "full")
+# Options passed straight through to the API call.
+_CALL_FIELDS = ("model", "temperature", "top_p", "seed")
+
+
+@dataclass(frozen=True)
+class LLMOptions:
+    model: Optional[str] = None
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    seed: Optional[int] = None
+    depth: Optional[str] = None
+
+    def overrides(self) -> Dict[str, Any]:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+
+_ACTIVE: ContextVar[LLMOptions] = ContextVar("llm_options", default=LLMOptions())
+
+
+def parse_llm_options(data: Optional[Dict[str, Any]]) -> LLMOptions:
+    """Validate user-supplied overrides; raises ValueError with a client-facing message."""
+    data = dict(data or {})
+    unknown = set(data) - set(LLMOptions.__dataclass_fields__)
+    if unknown:
+        raise ValueError(f"Unknown LLM options: {', '.join(sorted(unknown))}")
+    model = data.get("model")
+    if model is not None:
+        model = str(model).strip()
+        if not model or len(model) > _MAX_MODEL_LEN:
+            raise ValueError("model must be a non-empty model name")
+        allowed = [m.strip() for m in CFG.llm_allowed_models.split(",") if m.strip()]
+        if allowed and model not in allowed:
+            raise ValueError(f"model must be one of {', '.join(allowed)}")
+    try:
+        temperature = None if data.get("temperature") is None else float(data["temperature"])
+        top_p = None if data.get("top_p") is None else float(data["top_p"])
+        seed = None if data.get("seed") is None else int(data["seed"])
+    except (TypeError, ValueError):
+        raise ValueError("temperature and top_p must be numbers, seed an integer")
+    if temperature is not None and not 0.0 <= temperature <= 2.0:
+        raise ValueError("temperature must be between 0 and 2")
+    if top_p is not None and not 0.0 < top_p <= 1.0:
+        raise ValueError("top_p must be in (0, 1]")
+    depth = data.get("depth")
+    if depth is not None and depth not in DEPTHS:
+        raise ValueError(f"depth must be one of {', '.join(DEPTHS)}")
+    return LLMOptions(model=model, temperature=temperature, top_p=top_p, seed=seed, depth=depth)
+
+
+@contextmanager
+def use_llm_options(options: Optional[LLMOptions]) -> Iterator[LLMOptions]:
+    token = _ACTIVE.set(options or LLMOptions())
+    try:
+        yield _ACTIVE.get()
+    finally:
+        _ACTIVE.reset(token)
+
+
+def active_options() -> LLMOptions:
+    return _ACTIVE.get()
+
+
+def active_depth() -> str:
+    return _ACTIVE.get().depth or CFG.analysis_depth
+
+
+def llm_params(**defaults: Any) -> Dict[str, Any]:
+    """`model` plus the call site's sampling `defaults`, with the active overrides applied."""
+    overrides = _ACTIVE.get().overrides()
+    params = {"model": CFG.llm_model, **defaults}
+    params.update({k: v for k, v in overrides.items() if k in _CALL_FIELDS})
+    return params
+
+
+def cache_fields(params: Dict[str, Any], **defaults: Any) -> Dict[str, Any]:
+    """
+    Cache-key fields for a call made with `params`. Only parameters that differ from
+    the call site's defaults are added, so keys for default requests are unchanged.
+    """
+    fields: Dict[str, Any] = {"model": params["model"]}
+    changed = {k: v for k, v in params.items() if k != "model" and defaults.get(k, None) != v}
+    if changed:
+        fields["params"] = changed
+    return fields
+
+
+def describe_llm() -> Dict[str, Any]:
+    """Model, depth and overrides in effect, recorded on the step entries they produced."""
+    return {"model": CFG.llm_model, "depth": active_depth(), **_ACTIVE.get().overrides()}
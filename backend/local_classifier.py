@@ -0,0 +1,210 @@
+"""
+Local OHCR classifier trained from cached `label_one` answers.
+
+Fresh `label_one` responses are cached together with their target text and
+role, so the LLM cache doubles as a labelled corpus. `train` fits one TF-IDF +
+logistic-regression model for the OHCR label and one for the discourse act:
+
+    python -m backend.local_classifier train
+
+`label_utterance` asks the local model first and only calls the LLM when the
+local OHCR probability is below `CFG.local_classifier_threshold`. The saved
+model is reloaded whenever the file changes, so retraining needs no restart.
+Cache entries written before the target text was stored cannot be used;
+re-labelling those sessions once makes them available.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from backend.cache import CacheBackend, SQLiteCache, get_cache
+from backend.config import CFG
+
+log = logging.getLogger(__name__)
+
+MODEL_VERSION = 1
+MIN_EXAMPLES = 200
+HOLDOUT_FRACTION = 0.2
+
+
+def _features(text: str, role: str) -> str:
+    # The role becomes a token of its own, so "what do you notice?" can weigh differently per speaker.
+    return f"__{role or 'unknown'}__ {text}"
+
+
+def load_examples(cache: CacheBackend) -> List[Tuple[str, str, str]]:
+    """(features, ohcr, discourse_act) for every cached `label_one` answer that recorded its target."""
+    examples: Dict[str, Tuple[str, str, str]] = {}
+    for _, value, meta, _ in sorted(cache.iter_items(), key=lambda item: item[3]):
+        target = meta.get("target") if isinstance(meta, dict) else None
+        if not isinstance(target, dict) or not isinstance(value, dict) or "ohcr" not in value:
+            continue
+        text = str(target.get("text") or "").strip()
+        if not text:
+            continue
+        # Mirror label_utterance: low-confidence OHCR answers count as "None".
+        confidence = float(value.get("confidence") or 0.0)
+        ohcr = value.get("ohcr", "None") if confidence >= CFG.conf_threshold else "None"
+        x = _features(text, str(target.get("role") or "unknown"))
+        # Later answers (e.g. from a newer model) replace earlier ones for the same utterance.
+        examples[x] = (x, ohcr, value.get("discourse_act", "other"))
+    return list(examples.values())
+
+
+def _fit(xs: List[str], ys: List[str]):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+
+    model = make_pipeline(
+        TfidfVectorizer(ngram_range=(1, 2), min_df=2, sublinear_tf=True, lowercase=True),
+        LogisticRegression(max_iter=1000, C=4.0),
+    )
+    return model.fit(xs, ys)
+
+
+def _evaluate(xs: List[str], ys: List[str], threshold: float) -> Dict:
+    """Hold-out agreement with the LLM labels, overall and on the part the cascade would keep local."""
+    from sklearn.model_selection import train_test_split
+
+    x_train, x_test, y_train, y_test = train_test_split(xs, ys, test_size=HOLDOUT_FRACTION, random_state=0)
+    model = _fit(x_train, y_train)
+    probs = model.predict_proba(x_test)
+    classes = model.classes_
+    predicted = [classes[row.argmax()] for row in probs]
+    confident = [i for i, row in enumerate(probs) if row.max() >= threshold]
+    return {
+        "holdout": len(y_test),
+        "accuracy": round(sum(p == y for p, y in zip(predicted, y_test)) / len(y_test), 4),
+        "coverage": round(len(confident) / len(y_test), 4),
+        "confident_accuracy": (
+            round(sum(predicted[i] == y_test[i] for i in confident) / len(confident), 4) if confident else None
+        ),
+    }
+
+
+def train(cache: CacheBackend, model_path: str, min_examples: int = MIN_EXAMPLES,
+          threshold: Optional[float] = None) -> Dict:
+    """Fit the OHCR and discourse-act models on the cache and save them; returns the evaluation report."""
+    import joblib
+
+    threshold = CFG.local_classifier_threshold if threshold is None else threshold
+    examples = load_examples(cache)
+    if len(examples) < min_examples:
+        raise ValueError(f"Only {len(examples)} usable cached labels; at least {min_examples} are needed")
+    xs = [x for x, _, _ in examples]
+    ohcr = [y for _, y, _ in examples]
+    acts = [a for _, _, a in examples]
+    if len(set(ohcr)) < 2 or len(set(acts)) < 2:
+        raise ValueError("Cached labels need at least two distinct OHCR labels and discourse acts")
+
+    report = {"examples": len(examples), "threshold": threshold, "ohcr": _evaluate(xs, ohcr, threshold)}
+    bundle = {
+        "version": MODEL_VERSION,
+        "trained_at": time.time(),
+        "report": report,
+        "ohcr": _fit(xs, ohcr),
+        "discourse_act": _fit(xs, acts),
+    }
+    directory = os.path.dirname(model_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{model_path}.tmp"
+    joblib.dump(bundle, tmp)
+    os.replace(tmp, model_path)
+    return report
+
+
+class LocalClassifier:
+    def __init__(self, bundle: Dict, threshold: float):
+        self.ohcr = bundle["ohcr"]
+        self.discourse_act = bundle["discourse_act"]
+        self.threshold = threshold
+
+    def predict(self, u: Dict) -> Optional[Dict]:
+        """Label fields for `u`, or None when the model is not confident enough to skip the LLM."""
+        text = (u.get("text") or "").strip()
+        if not text:
+            return None
+        x = [_features(text, str(u.get("role") or "unknown"))]
+        probs = self.ohcr.predict_proba(x)[0]
+        best = int(probs.argmax())
+        if probs[best] < self.threshold:
+            return None
+        return {
+            "ohcr": str(self.ohcr.classes_[best]),
+            "discourse_act": str(self.discourse_act.predict(x)[0]),
+            "role": u.get("role", "unknown"),
+            "confidence": round(float(probs[best]), 3),
+            "rationale": "local classifier",
+            "source": "local",
+        }
+
+
+_LOADED: Dict[str, object] = {"key": None, "model": None}
+_LOAD_LOCK = threading.Lock()
+
+
+def get_local_classifier() -> Optional[LocalClassifier]:
+    """The trained model at `CFG.local_classifier_path`, reloaded when the file changes; None if absent."""
+    path = CFG.local_classifier_path
+    if not path:
+        return None
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    key = (path, mtime)
+    with _LOAD_LOCK:
+        if _LOADED["key"] != key:
+            _LOADED["key"], _LOADED["model"] = key, None
+            try:
+                import joblib
+
+                bundle = joblib.load(path)
+                if bundle.get("version") == MODEL_VERSION:
+                    _LOADED["model"] = LocalClassifier(bundle, CFG.local_classifier_threshold)
+                else:
+                    log.warning("Ignoring local classifier %s: version %s", path, bundle.get("version"))
+            except Exception:
+                log.exception("Could not load local classifier %s", path)
+        return _LOADED["model"]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Train the local OHCR classifier from cached LLM labels.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cmd = sub.add_parser("train", help="Fit and save the classifier.")
+    cmd.add_argument("--cache-db", help="Read this SQLite cache file instead of the configured label_one cache.")
+    cmd.add_argument("--output", default=CFG.local_classifier_path)
+    cmd.add_argument("--min-examples", type=int, default=MIN_EXAMPLES)
+    cmd.add_argument("--threshold", type=float, default=None,
+                     help="Confidence used for the coverage report (default LOCAL_CLASSIFIER_THRESHOLD).")
+    args = parser.parse_args()
+
+    if args.cache_db and not os.path.exists(args.cache_db):
+        print(f"No such cache file: {args.cache_db}", file=sys.stderr)
+        return 2
+    cache = SQLiteCache(args.cache_db) if args.cache_db else get_cache("label_one")
+    if cache.disabled:
+        print("No LLM cache to train from (caching is disabled).", file=sys.stderr)
+        return 2
+    if not args.output:
+        print("No output path (set LOCAL_CLASSIFIER or pass --output).", file=sys.stderr)
+        return 2
+    try:
+        report = train(cache, args.output, args.min_examples, args.threshold)
+    except ValueError as err:
+        print(str(err), file=sys.stderr)
+        return 2
+    print(json.dumps(report, indent=2))
+    print(f"Saved local classifier to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,32 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request, Header, Body, Form, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-import os, json, uuid, tempfile, time
+from starlette.websockets import WebSocketState
+import asyncio, contextvars, os, uuid, tempfile, time, json
+from datetime import datetime, timezone
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
 load_dotenv()
 from backend.config import CFG
-from backend.transcribe_openai import transcribe_audio_bytes
-from backend.diarize_simple import (
-    embed_segments,
-    assign_speakers_k2,
-    map_roles_by_talk_time,
-    merge_contiguous_segments,
+from backend.pipeline import (
+    STAGES, PipelineError, run_pipeline, rerun_stages, build_response, save_results, load_results,
 )
-from backend.discourse_coach import label_transcript
-from backend.metrics_engine import compute_all
-from backend.tiered_prompts import run_tiered_prompts
+from backend import analytics, storage
+from backend import telemetry
+from backend.profiling import MODES as PROFILE_MODES, StageProfiler
+from backend.batch_pipeline import Batch, BatchItem, get_stage_pipeline
+from backend.deadline import use_deadline
+from backend.job_queue import JobQueue
+from backend.live import LiveSession
+from backend.llm_options import LLMOptions, parse_llm_options, use_llm_options
+from backend.openai_client import has_openai
+from backend.reanalysis import MAX_VARIANTS, reanalyze
+from backend.utterance_index import OHCR_LABELS, session_index
+from backend.waveform import select_peaks
+from backend.metrics_engine import session_timeline, timeline_window_key
 
 app = FastAPI(title="Make Teaching Great Again – Local")
 app.add_middleware(
@@ -24,120 +35,561 @@ app.add_middleware(
     allow_methods=["*"], allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    # Reject oversized uploads before the multipart body is parsed; _spool_upload enforces the cap per file.
+    length = request.headers.get("content-length")
+    if request.method == "POST" and length and length.isdigit():
+        files = CFG.batch_max_files if request.url.path == "/process/batch" else 1
+        if int(length) > _max_upload_bytes() * files + _UPLOAD_CHUNK:  # + multipart framing
+            return JSONResponse({"detail": f"Upload exceeds the {CFG.max_upload_mb:g} MB limit."}, status_code=413)
+    # Label by route template ("/sessions/{sid}/rerun"), not the raw path, to keep series bounded.
+    route = request.url.path
+    for candidate in app.router.routes:
+        if getattr(candidate, "path_regex", None) is not None and candidate.path_regex.match(request.url.path):
+            route = candidate.path
+            break
+    status = 500
+    t0 = time.perf_counter()
+    telemetry.REQUESTS_IN_FLIGHT.inc(route=route)
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        telemetry.REQUESTS_IN_FLIGHT.dec(route=route)
+        telemetry.REQUEST_SECONDS.observe(time.perf_counter() - t0, route=route, method=request.method, status=str(status))
+
 if CFG.store_results:
     os.makedirs(CFG.results_dir, exist_ok=True)
 
+_job_queue = None
+
+def get_job_queue() -> JobQueue:
+    # Created lazily so deployments that never use /jobs stay free of queue files.
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(CFG.jobs_db, lease_sec=CFG.job_lease_sec, max_attempts=CFG.job_max_attempts)
+    return _job_queue
+
 @app.get("/health")
 def health():
-    return {"ok": True, "use_llm": CFG.use_llm, "llm_model": CFG.llm_model, "transcriber": CFG.transcriber}
+    return {"ok": True, "use_llm": CFG.use_llm, "llm_model": CFG.llm_model,
+            "analysis_depth": CFG.analysis_depth, "transcriber": CFG.transcriber, "openai_mode": CFG.openai_mode}
+
+@app.get("/metrics")
+def metrics():
+    return Response(telemetry.render(), media_type=telemetry.CONTENT_TYPE)
+
+_UPLOAD_CHUNK = 1024 * 1024
+
+def _max_upload_bytes() -> int:
+    return int(CFG.max_upload_mb * 1024 * 1024)
+
+async def _spool_upload(upload: UploadFile, path: Optional[str] = None, fsync: bool = False) -> str:
+    """Copy an upload to `path` (default: a temp file) in chunks, enforcing MAX_UPLOAD_MB."""
+    if path is None:
+        suffix = os.path.splitext(upload.filename or "")[1].lower()
+        suffix = suffix if suffix[1:].isalnum() and len(suffix) <= 6 else ".wav"
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+    limit = _max_upload_bytes()
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            while True:
+                chunk = await upload.read(_UPLOAD_CHUNK)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise HTTPException(413, f"Upload exceeds the {CFG.max_upload_mb:g} MB limit.")
+                f.write(chunk)
+            if fsync:
+                f.flush()
+                await run_in_threadpool(os.fsync, f.fileno())
+    except BaseException:
+        try: os.unlink(path)
+        except OSError: pass
+        raise
+    return path
+
+def _clean_tag(value: Optional[str], field: str) -> Optional[str]:
+    value = (value or "").strip()
+    if len(value) > 100:
+        raise HTTPException(400, f"{field} is too long.")
+    return value or None
+
+def _profiling_allowed(token: Optional[str]) -> bool:
+    if CFG.profile_token:
+        return token == CFG.profile_token
+    return CFG.profiling_enabled
 
 @app.post("/process")
-async def process(audio: UploadFile = File(...)):
-    if not CFG.openai_api_key:
+async def process(
+    audio: UploadFile = File(...),
+    profile: bool = Query(False),
+    profile_mode: Optional[str] = Query(None),
+    x_profile_token: Optional[str] = Header(None),
+    llm_model: Optional[str] = Query(None),
+    llm_temperature: Optional[float] = Query(None),
+    llm_top_p: Optional[float] = Query(None),
+    llm_seed: Optional[int] = Query(None),
+    depth: Optional[str] = Query(None, description="Analysis depth: fast | standard | full"),
+    budget_sec: Optional[float] = Query(None, ge=0, description="Latency budget in seconds (0 = unbounded)"),
+    teacher_id: Optional[str] = Form(None),
+    cohort: Optional[str] = Form(None),
+):
+    started = time.monotonic()
+    if not has_openai():
         raise HTTPException(500, "OPENAI_API_KEY missing")
     if audio.content_type and not audio.content_type.startswith("audio/"):
         raise HTTPException(400, "Please upload an audio file.")
+    try:
+        llm_options = parse_llm_options({"model": llm_model, "temperature": llm_temperature,
+                                         "top_p": llm_top_p, "seed": llm_seed, "depth": depth})
+    except ValueError as err:
+        raise HTTPException(400, str(err))
+    teacher_id, cohort = _clean_tag(teacher_id, "teacher_id"), _clean_tag(cohort, "cohort")
+    profiler = None
+    if profile or x_profile_token is not None:
+        if not _profiling_allowed(x_profile_token):
+            raise HTTPException(403, "Profiling is not enabled for this request.")
+        mode = profile_mode or CFG.profile_mode
+        if mode not in PROFILE_MODES:
+            raise HTTPException(400, f"profile_mode must be one of {', '.join(PROFILE_MODES)}")
+        profiler = StageProfiler(mode=mode, interval_ms=CFG.profile_interval_ms)
 
-    raw = await audio.read()
-    steps = {}
-
-    # 1) Transcribe (OpenAI Whisper API)
-    t0 = time.perf_counter()
-    text, verbose = transcribe_audio_bytes(raw, filename=audio.filename or "audio.wav")
-    segments = [{"start": float(s["start"]), "end": float(s["end"]), "text": s.get("text", ""),
-                 "speaker": "", "role": "unknown"} for s in verbose.get("segments", [])]
-    transcription_segments = [dict(seg) for seg in segments]
-    if not segments:
-        raise HTTPException(500, "No segments produced by Whisper.")
-    transcription_duration = time.perf_counter() - t0
-    steps["transcription"] = {
-        "status": "completed",
-        "duration_ms": int(transcription_duration * 1000),
-        "text": text,
-        "segment_count": len(transcription_segments),
-        "segments": transcription_segments
-    }
-
-    # 2) Temp wav for diarization embeddings
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
-        tmp_path = f.name
-        f.write(raw)
+    # Temp copy on disk: transcription and diarization embeddings both read from it
+    tmp_path = await _spool_upload(audio)
 
-    # 3) Diarize simple (ECAPA + KMeans k=2) then map roles
-    diarize_start = time.perf_counter()
-    diarized_segments = []
+    sid = uuid.uuid4().hex[:8]
+    budget = CFG.request_budget_sec if budget_sec is None else budget_sec
     try:
-        embs = embed_segments(tmp_path, segments)
-        segments = assign_speakers_k2(segments, embs)
-        segments = merge_contiguous_segments(segments)
-        segments = map_roles_by_talk_time(segments)
-        diarized_segments = [dict(s) for s in segments]
+        # The pipeline blocks for minutes, so it runs off the event loop; the copied context
+        # keeps any request-scoped ContextVars set so far.
+        payload = await run_in_threadpool(
+            contextvars.copy_context().run, _process_upload, sid, tmp_path, audio.filename or "audio.wav",
+            llm_options, budget, started, teacher_id, cohort, profiler,
+        )
+    except PipelineError as err:
+        raise HTTPException(500, str(err))
     finally:
         try: os.unlink(tmp_path)
         except: pass
-    steps["diarization"] = {
-        "status": "completed",
-        "duration_ms": int((time.perf_counter() - diarize_start) * 1000),
-        "segment_count": len(diarized_segments),
-        "segments": diarized_segments,
-    }
 
-    # 4) Paragraph-level LLM discourse analysis (labels + coach)
-    labeling_start = time.perf_counter()
-    labeled, coach_report, coach_meta = label_transcript(segments)
-    labeling_duration = time.perf_counter() - labeling_start
-    steps["labeling"] = {
-        "status": "completed",
-        "duration_ms": int(labeling_duration * 1000),
-        "utterance_count": len(labeled),
-        "utterances": labeled,
-        "meta": coach_meta,
-    }
+    if profiler is not None and CFG.store_results:
+        storage.write_json_async(sid, "profile.json", payload["profile"])
+    return JSONResponse(payload)
 
-    # 5) Metrics & timeline
-    metrics_start = time.perf_counter()
-    metrics = compute_all(labeled, coach_report=coach_report)
-    steps["metrics"] = {
-        "status": "completed",
-        "duration_ms": int((time.perf_counter() - metrics_start) * 1000),
-        "metrics": metrics,
-    }
+def _process_upload(sid: str, audio_path: str, filename: str, llm_options: LLMOptions, budget: float,
+                    started: float, teacher_id: Optional[str], cohort: Optional[str],
+                    profiler: Optional[StageProfiler]) -> Dict[str, Any]:
+    """The blocking part of /process, run on a worker thread (the one the profiler samples)."""
+    if profiler is not None:
+        try:
+            profiler.start()
+        except RuntimeError as err:
+            raise HTTPException(409, str(err))
+    try:
+        analytics.tag_session(sid, teacher_id, cohort)
+        with use_llm_options(llm_options), use_deadline(budget, started):
+            steps = run_pipeline(audio_path, filename, profiler=profiler)
+        with profiler.stage("save_results") if profiler else nullcontext():
+            save_results(sid, steps, background=True)
+        with profiler.stage("build_response") if profiler else nullcontext():
+            payload = build_response(sid, steps)
+        if profiler is not None:
+            with profiler.stage("serialize_response"):
+                json.dumps(payload, ensure_ascii=False)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    if profiler is not None:
+        payload["profile"] = profiler.report()
+    return payload
 
-    # 6) Coach analysis
-    steps["coach_analysis"] = {
-        "status": "completed",
-        "duration_ms": 0,
-        "report": coach_report,
-        "meta": coach_meta,
-    }
+@app.websocket("/live")
+async def live(websocket: WebSocket, sample_rate: int = 16000, encoding: str = "pcm_s16le"):
+    """
+    Live classroom mode. Send binary frames of mono PCM; send {"type": "stop"} to
+    flush the remaining audio and receive a "final" message. Updates are pushed
+    as the rolling analysis completes.
+    """
+    await websocket.accept()
+    if not has_openai():
+        await websocket.send_json({"type": "error", "detail": "OPENAI_API_KEY missing"})
+        await websocket.close(code=1011)
+        return
+    try:
+        session = LiveSession(sample_rate=sample_rate, encoding=encoding)
+    except ValueError as err:
+        await websocket.send_json({"type": "error", "detail": str(err)})
+        await websocket.close(code=1003)
+        return
+
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    stopping = False
+
+    async def step(final: bool = False) -> None:
+        try:
+            message = await loop.run_in_executor(None, session.analyze, final)
+        except Exception as err:
+            # Nothing was committed, so the same audio is retried on the next step.
+            message = {"type": "error", "detail": f"{type(err).__name__}: {err}"}
+        await websocket.send_json(message)
+
+    async def analyze_loop():
+        # One analysis at a time; audio that arrives meanwhile is picked up by the next step.
+        try:
+            while True:
+                await wake.wait()
+                wake.clear()
+                if stopping:
+                    await step(final=True)
+                    return
+                if session.due():
+                    await step()
+                    if session.due():
+                        wake.set()
+        except Exception as err:
+            # Without the analyzer the session would take audio and never answer: end it visibly.
+            try:
+                await websocket.send_json({"type": "error", "detail": f"Live analysis stopped: {type(err).__name__}: {err}"})
+                await websocket.close(code=1011)
+            except Exception:
+                pass  # the socket itself is what failed
+
+    await websocket.send_json({
+        "type": "ready", "sample_rate": session.sample_rate, "encoding": session.encoding,
+        "window_sec": session.window_sec, "hop_sec": session.hop_sec, "buffer_sec": session.buffer_sec,
+    })
+    telemetry.LIVE_SESSIONS.inc()
+    analyzer = asyncio.create_task(analyze_loop())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                session.feed(message["bytes"])
+                wake.set()
+            elif message.get("text"):
+                try:
+                    command = json.loads(message["text"])
+                except ValueError:
+                    command = {}
+                if command.get("type") == "stop":
+                    stopping = True
+                    wake.set()
+                    await analyzer
+                    if websocket.application_state == WebSocketState.CONNECTED:
+                        await websocket.close()
+                    break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        telemetry.LIVE_SESSIONS.dec()
+        analyzer.cancel()
+
+@app.post("/process/batch", status_code=202)
+async def process_batch(
+    audio: List[UploadFile] = File(...),
+    teacher_id: Optional[str] = Form(None),
+    cohort: Optional[str] = Form(None),
+):
+    if not has_openai():
+        raise HTTPException(500, "OPENAI_API_KEY missing")
+    if len(audio) > CFG.batch_max_files:
+        raise HTTPException(400, f"At most {CFG.batch_max_files} files per batch.")
+    for upload in audio:
+        if upload.content_type and not upload.content_type.startswith("audio/"):
+            raise HTTPException(400, f"{upload.filename or 'file'} is not an audio file.")
+    teacher_id, cohort = _clean_tag(teacher_id, "teacher_id"), _clean_tag(cohort, "cohort")
+
+    items = []
+    try:
+        for idx, upload in enumerate(audio):
+            items.append(BatchItem(idx, upload.filename or f"audio_{idx}.wav", await _spool_upload(upload)))
+    except HTTPException:
+        for item in items:
+            os.unlink(item.audio_path)
+        raise
+    batch = Batch(items)
+    await run_in_threadpool(_submit_batch, batch, teacher_id, cohort)
+    return batch.summary()
 
-    # 7) Tiered prompts (Tier 1-3 narratives)
-    tier_start = time.perf_counter()
-    tier_analysis = run_tiered_prompts(labeled)
-    steps["tier_prompts"] = {
-        "status": "completed",
-        "duration_ms": int((time.perf_counter() - tier_start) * 1000),
-        "results": tier_analysis.get("results", []),
+def _submit_batch(batch: Batch, teacher_id: Optional[str], cohort: Optional[str]) -> None:
+    for item in batch.items:
+        analytics.tag_session(item.session_id, teacher_id, cohort)
+    get_stage_pipeline().submit(batch)
+
+@app.get("/process/batch/{batch_id}")
+def batch_status(batch_id: str):
+    batch = get_stage_pipeline().get(batch_id)
+    if batch is None:
+        raise HTTPException(404, "Unknown batch.")
+    return batch.summary()
+
+@app.get("/process/batch/{batch_id}/files/{index}")
+def batch_file_result(batch_id: str, index: int):
+    pipeline = get_stage_pipeline()
+    batch = pipeline.get(batch_id)
+    if batch is None or not 0 <= index < len(batch.items):
+        raise HTTPException(404, "Unknown batch file.")
+    item = batch.items[index]
+    if item.status == "failed":
+        raise HTTPException(500, item.error or "Processing failed.")
+    result = pipeline.result(batch, index)
+    if result is None:
+        return JSONResponse(item.summary(), status_code=202)
+    return JSONResponse(result)
+
+@app.post("/jobs", status_code=202)
+async def enqueue_job(
+    audio: UploadFile = File(...),
+    teacher_id: Optional[str] = Form(None),
+    cohort: Optional[str] = Form(None),
+):
+    if not has_openai():
+        raise HTTPException(500, "OPENAI_API_KEY missing")
+    if audio.content_type and not audio.content_type.startswith("audio/"):
+        raise HTTPException(400, "Please upload an audio file.")
+    teacher_id, cohort = _clean_tag(teacher_id, "teacher_id"), _clean_tag(cohort, "cohort")
+
+    job_id = uuid.uuid4().hex[:8]
+    filename = os.path.basename(audio.filename or "") or "audio.wav"
+    job_dir = os.path.join(CFG.uploads_dir, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    try:
+        audio_path = await _spool_upload(audio, os.path.join(job_dir, filename), fsync=True)
+    except HTTPException:
+        os.rmdir(job_dir)
+        raise
+    await run_in_threadpool(_enqueue_job, job_id, audio_path, filename, teacher_id, cohort)
+    return {"job_id": job_id, "status": "queued"}
+
+def _enqueue_job(job_id: str, audio_path: str, filename: str, teacher_id: Optional[str],
+                 cohort: Optional[str]) -> None:
+    # Job ids double as session ids, so the worker's save_results fills in this row.
+    analytics.tag_session(job_id, teacher_id, cohort)
+    get_job_queue().enqueue(job_id, audio_path, filename)
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    jobs = get_job_queue()
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job.")
+    completed = job["status"] == "completed"
+    out = {
+        "job_id": job_id,
+        "status": job["status"],
+        "attempts": job["attempts"],
+        # Checkpoints are dropped once a job completes; the saved session holds the result.
+        "completed_stages": STAGES if completed else job["completed_stages"],
+        "error": job["error"],
     }
+    if completed:
+        steps = load_results(job_id)
+        if steps is not None:
+            out["result"] = build_response(job_id, steps)
+    return out
 
-    # 8) Save and return
-    sid = uuid.uuid4().hex[:8]
-    if CFG.store_results:
-        out_dir = os.path.join(CFG.results_dir, sid)
-        os.makedirs(out_dir, exist_ok=True)
-        with open(os.path.join(out_dir, "utterances.json"), "w", encoding="utf-8") as f:
-            json.dump(labeled, f, ensure_ascii=False)
-        with open(os.path.join(out_dir, "metrics.json"), "w", encoding="utf-8") as f:
-            json.dump(metrics, f, ensure_ascii=False)
-        with open(os.path.join(out_dir, "coach_report.json"), "w", encoding="utf-8") as f:
-            json.dump(coach_report, f, ensure_ascii=False)
-
-    return JSONResponse({
+@app.post("/sessions/{sid}/rerun")
+def rerun_session(sid: str, stages: str = Query("labeling,metrics,tier_prompts")):
+    if not storage.valid_sid(sid) or not storage.session_exists(sid):
+        raise HTTPException(404, "Unknown session.")
+    steps = load_results(sid)
+    if steps is None:
+        raise HTTPException(409, "Session has no stored intermediate artifacts to re-run from.")
+    requested = [name.strip() for name in stages.split(",") if name.strip()]
+    if not requested:
+        raise HTTPException(400, "No stages requested.")
+    try:
+        steps, ran = rerun_stages(steps, requested)
+    except ValueError as err:
+        raise HTTPException(400, str(err))
+    except PipelineError as err:
+        raise HTTPException(400, str(err))
+    save_results(sid, steps, background=True)
+    return JSONResponse({**build_response(sid, steps), "rerun_stages": ran})
+
+@app.post("/sessions/{sid}/reanalyze")
+def reanalyze_session(
+    sid: str,
+    variants: List[Dict[str, Any]] = Body(..., embed=True),
+    include_results: bool = Body(False, embed=True),
+    save: bool = Body(False, embed=True),
+):
+    if not storage.valid_sid(sid) or not storage.session_exists(sid):
+        raise HTTPException(404, "Unknown session.")
+    steps = load_results(sid)
+    if steps is None:
+        raise HTTPException(409, "Session has no stored intermediate artifacts to re-run from.")
+    if not 1 <= len(variants) <= MAX_VARIANTS:
+        raise HTTPException(400, f"Provide between 1 and {MAX_VARIANTS} variants.")
+    try:
+        options = [parse_llm_options(v) for v in variants]
+    except ValueError as err:
+        raise HTTPException(400, str(err))
+
+    out = []
+    for summary, result in reanalyze(sid, steps, options):
+        if result is not None and save and CFG.store_results:
+            # Stored beside the session; the session's own artifacts are left untouched.
+            summary["result_file"] = f"reanalysis_{summary['variant_id']}.json"
+            storage.write_json_async(sid, summary["result_file"], result)
+        if include_results:
+            summary["result"] = result
+        out.append(summary)
+    return {"session_id": sid, "variants": out}
+
+UTTERANCE_PAGE_MAX = 1000
+
+def _label_list(value: Optional[str], allowed: List[str], field: str) -> Optional[List[str]]:
+    if not value:
+        return None
+    labels = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [v for v in labels if v not in allowed]
+    if unknown:
+        raise HTTPException(400, f"{field} must be among {', '.join(allowed)}")
+    return labels
+
+@app.get("/sessions/{sid}/utterances")
+def session_utterances(
+    sid: str,
+    start: Optional[float] = Query(None, alias="from", description="Seconds; utterances ending after this"),
+    end: Optional[float] = Query(None, alias="to", description="Seconds; utterances starting before this"),
+    ohcr: Optional[str] = Query(None, description="Comma-separated OHCR labels, e.g. O,H"),
+    role: Optional[str] = Query(None, description="Comma-separated roles, e.g. student"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(200, ge=1, le=UTTERANCE_PAGE_MAX),
+):
+    """One page of a stored session's utterances overlapping [from, to), in time order."""
+    if not storage.valid_sid(sid) or not storage.session_exists(sid):
+        raise HTTPException(404, "Unknown session.")
+    if start is not None and end is not None and end <= start:
+        raise HTTPException(400, "to must be greater than from.")
+    ohcr_labels = _label_list(ohcr, list(OHCR_LABELS), "ohcr")
+    roles = _label_list(role and role.lower(), ["teacher", "student", "unknown"], "role")
+    index = session_index(sid)
+    if index is None:
+        raise HTTPException(409, "Session has no stored utterances.")
+    total, page = index.query(start, end, ohcr=ohcr_labels, role=roles, offset=offset, limit=limit)
+    return {
         "session_id": sid,
-        "duration_sec": metrics.get("class_duration_sec", labeled[-1]["end"]),
-        "steps": steps,
-        "metrics": {k: v for k, v in metrics.items() if k != "timeline"},
-        "timeline": metrics.get("timeline", []),
-        "coach_report": coach_report,
-        "tier_analysis": tier_analysis,
-    })
+        "from": start,
+        "to": end,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + len(page) if offset + len(page) < total else None,
+        "utterances": [{"index": position, **u} for position, u in page],
+    }
+
+@app.get("/sessions/{sid}/timeline")
+def session_timeline_at(
+    sid: str,
+    window_sec: float = Query(20, ge=1, le=3600, description="IAM-level window size in seconds"),
+    start: Optional[float] = Query(None, alias="from", description="Seconds; windows centred at or after this"),
+    end: Optional[float] = Query(None, alias="to", description="Seconds; windows centred at or before this"),
+):
+    """
+    IAM-level timeline of a stored session at any window size. Sizes in the stored pyramid are
+    served as-is; others are recomputed from the stored utterances, never re-running the analysis.
+    """
+    if not storage.valid_sid(sid) or not storage.session_exists(sid):
+        raise HTTPException(404, "Unknown session.")
+    key = timeline_window_key(window_sec)
+    metrics = storage.read_json(sid, "metrics.json") or {}
+    timeline = (metrics.get("timelines") or {}).get(key)
+    source = "stored"
+    if timeline is None:
+        index = session_index(sid)
+        if index is None:
+            raise HTTPException(409, "Session has no stored utterances.")
+        timeline = session_timeline(index.utterances, window_sec)
+        source = "computed"
+    if start is not None or end is not None:
+        lo = float("-inf") if start is None else start
+        hi = float("inf") if end is None else end
+        timeline = [p for p in timeline if lo <= p["time"] <= hi]
+    return {"session_id": sid, "window_sec": window_sec, "source": source, "timeline": timeline}
+
+PEAKS_PIXELS_MAX = 20000
+
+@app.get("/sessions/{sid}/peaks")
+def session_peaks(
+    sid: str,
+    pixels: int = Query(2000, ge=1, le=PEAKS_PIXELS_MAX, description="Min/max pairs wanted across the range"),
+    start: Optional[float] = Query(None, alias="from", ge=0, description="Seconds"),
+    end: Optional[float] = Query(None, alias="to", description="Seconds"),
+):
+    """Waveform min/max peaks for [from, to) at the coarsest stored resolution giving `pixels` pairs."""
+    if not storage.valid_sid(sid) or not storage.session_exists(sid):
+        raise HTTPException(404, "Unknown session.")
+    if start is not None and end is not None and end <= start:
+        raise HTTPException(400, "to must be greater than from.")
+    waveform = storage.read_json(sid, "waveform.json")
+    if not waveform:
+        raise HTTPException(409, "Session has no stored waveform.")
+    return {"session_id": sid, **select_peaks(waveform, pixels, start, end)}
+
+def _analytics_store() -> analytics.AnalyticsStore:
+    store = analytics.get_analytics_store()
+    if store is None:
+        raise HTTPException(404, "Analytics are disabled.")
+    return store
+
+def _metric_list(metrics: Optional[str]) -> List[str]:
+    return [m.strip() for m in metrics.split(",") if m.strip()] if metrics else list(analytics.METRICS)
+
+def _parse_day(value: Optional[str], field: str) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        day = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(400, f"{field} must be an ISO date (YYYY-MM-DD).")
+    return (day if day.tzinfo else day.replace(tzinfo=timezone.utc)).timestamp()
+
+def _trend(group: str, value: str, metrics: Optional[str], bucket: str, since: Optional[str], until: Optional[str]):
+    store = _analytics_store()
+    t0 = time.perf_counter()
+    try:
+        points = store.trend(group, value, _metric_list(metrics), bucket=bucket,
+                             since=_parse_day(since, "since"), until=_parse_day(until, "until"))
+    except ValueError as err:
+        raise HTTPException(400, str(err))
+    return {group: value, "bucket": bucket, "points": points,
+            "query_ms": round((time.perf_counter() - t0) * 1000, 2)}
+
+def _groups(group: str, metrics: Optional[str]):
+    store = _analytics_store()
+    try:
+        return {"groups": store.groups(group, _metric_list(metrics))}
+    except ValueError as err:
+        raise HTTPException(400, str(err))
+
+@app.get("/analytics/teachers")
+def analytics_teachers(metrics: Optional[str] = Query(None)):
+    return _groups("teacher_id", metrics)
+
+@app.get("/analytics/teachers/{teacher_id}/trend")
+def teacher_trend(teacher_id: str, metrics: Optional[str] = Query(None), bucket: str = Query("week"),
+                  since: Optional[str] = Query(None), until: Optional[str] = Query(None)):
+    return _trend("teacher_id", teacher_id, metrics, bucket, since, until)
+
+@app.get("/analytics/cohorts")
+def analytics_cohorts(metrics: Optional[str] = Query(None)):
+    return _groups("cohort", metrics)
+
+@app.get("/analytics/cohorts/{cohort}/trend")
+def cohort_trend(cohort: str, metrics: Optional[str] = Query(None), bucket: str = Query("week"),
+                 since: Optional[str] = Query(None), until: Optional[str] = Query(None)):
+    return _trend("cohort", cohort, metrics, bucket, since, until)
+
@@ -1,9 +1,17 @@
-from bisect import bisect_left
-from typing import Dict, List
+from array import array
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 STAGE_ORDER = ["O", "H", "C", "R"]
 STAGE_INDEX = {stage: idx for idx, stage in enumerate(STAGE_ORDER)}
 VALID_OHCR = set(STAGE_ORDER)
+# Window sizes (seconds) of the timelines `compute_all` returns under "timelines", so charts can
+# zoom without re-running the analysis; "timeline" itself stays at the 20 s default.
+TIMELINE_PYRAMID_SEC = (5, 20, 60, 300)
+# Timeline windows at or above this level count towards `beneficial_duration_pct`.
+BENEFICIAL_LEVEL = 3
 
 
 def _normalize_ohcr(value) -> str:
@@ -26,55 +34,100 @@ def _extract_iam_level(value) -> int:
     return None
 
 
-def _simplify_utterance(u: Dict, index: int) -> Dict:
-    return {
-        "index": index,
-        "start": float(u.get("start", 0.0)),
-        "end": float(u.get("end", 0.0)),
-        "speaker": str(u.get("speaker", "")),
-        "role": str(u.get("role", "unknown")).lower(),
-        "ohcr": _normalize_ohcr(u.get("ohcr", "None")),
-        "discourse_act": u.get("discourse_act", ""),
-        "confidence": float(u.get("confidence", 0.0)),
-        "text": u.get("text", ""),
-        "duration": max(0.0, float(u.get("end", 0.0)) - float(u.get("start", 0.0))),
-        "iam_level": _extract_iam_level(u.get("iam_level")),
-    }
-
-def _finalize_episode(episodes: List[Dict], current: Dict) -> None:
-    if not current or not current.get("moves"):
+OHCR_CODES = STAGE_ORDER + ["None"]
+_OHCR_CODE = {label: code for code, label in enumerate(OHCR_CODES)}
+
+
+class UtteranceTable:
+    """
+    Columnar view of the utterance fields the metrics read, one row per utterance.
+
+    Times and confidences are typed float arrays; OHCR, role and discourse act are small
+    integer codes (roles and acts into per-table vocabularies); the IAM level is 1-5, or 0
+    when the utterance has none. Text stays in the labelled utterance list, and episodes
+    and segments refer to rows by index range rather than copying utterances.
+    """
+
+    __slots__ = ("start", "end", "confidence", "ohcr", "iam_level", "role", "act",
+                 "roles", "acts", "_role_codes", "_act_codes")
+
+    def __init__(self, utterances: Iterable[Dict] = ()):
+        self.start = array("d")
+        self.end = array("d")
+        self.confidence = array("d")
+        self.ohcr = array("b")
+        self.iam_level = array("b")
+        self.role = array("h")
+        self.act = array("h")
+        self.roles: List[str] = []
+        self.acts: List[str] = []
+        self._role_codes: Dict[str, int] = {}
+        self._act_codes: Dict[str, int] = {}
+        for u in utterances:
+            self.append(u)
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    @staticmethod
+    def _code(value: str, vocab: List[str], codes: Dict[str, int]) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(vocab)
+            vocab.append(value)
+        return code
+
+    def append(self, u: Dict) -> int:
+        """Add one utterance; returns its row index."""
+        self.start.append(float(u.get("start", 0.0)))
+        self.end.append(float(u.get("end", 0.0)))
+        self.confidence.append(float(u.get("confidence", 0.0)))
+        self.ohcr.append(_OHCR_CODE[_normalize_ohcr(u.get("ohcr", "None"))])
+        self.iam_level.append(_extract_iam_level(u.get("iam_level")) or 0)
+        self.role.append(self._code(str(u.get("role", "unknown")).lower(), self.roles, self._role_codes))
+        self.act.append(self._code(str(u.get("discourse_act", "")).lower(), self.acts, self._act_codes))
+        return len(self.start) - 1
+
+    def role_code(self, role: str) -> int:
+        return self._role_codes.get(role, -1)
+
+    def act_code(self, act: str) -> int:
+        return self._act_codes.get(act, -1)
+
+    def column(self, name: str, first: int = 0, end: Optional[int] = None) -> np.ndarray:
+        """Rows [first, end) of a column as a NumPy array (a copy, so the table can keep growing)."""
+        values = getattr(self, name)
+        return np.array(values[first:end] if first or end is not None else values)
+
+
+def _finalize_episode(table: UtteranceTable, episodes: List[Dict], current: Dict) -> None:
+    first, end = current["utterance_range"]
+    if end <= first:
         return
-    moves = current["moves"]
-    counts = {stage: 0 for stage in STAGE_ORDER}
-    confidences = []
-    teacher_moves = 0
-    student_moves = 0
-
-    for mv in moves:
-        counts[mv["ohcr"]] = counts.get(mv["ohcr"], 0) + 1
-        confidences.append(mv.get("confidence", 0.0))
-        if mv.get("role") == "teacher":
-            teacher_moves += 1
-        elif mv.get("role") == "student":
-            student_moves += 1
+    codes = table.column("ohcr", first, end)
+    roles = table.column("role", first, end)
+    per_code = np.bincount(codes, minlength=len(OHCR_CODES))
+    counts = {stage: int(per_code[_OHCR_CODE[stage]]) for stage in STAGE_ORDER}
+    moves = end - first
 
     coverage = sum(1 for stage in STAGE_ORDER if counts.get(stage, 0) > 0) / len(STAGE_ORDER)
-    avg_conf = (sum(confidences) / len(confidences)) if confidences else 0.0
+    avg_conf = float(table.column("confidence", first, end).mean())
     flow_penalty = current["order_violations"] + current["skipped_stages"]
-    denom = max(len(moves) - 1, 1)
+    denom = max(moves - 1, 1)
     flow_score = max(0.0, 1.0 - (flow_penalty / denom))
 
     current.update({
         "id": len(episodes) + 1,
-        "end": float(moves[-1]["end"]),
+        "end": float(table.end[end - 1]),
+        "move_count": moves,
         "counts": counts,
         "coverage": round(coverage, 3),
         "avg_confidence": round(avg_conf, 3),
         "flow_score": round(flow_score, 3),
-        "teacher_moves": teacher_moves,
-        "student_moves": student_moves,
-        "duration": round(max(0.0, moves[-1]["end"] - moves[0]["start"]), 3),
-        "sequence": [mv["ohcr"] for mv in moves],
+        "teacher_moves": int(np.count_nonzero(roles == table.role_code("teacher"))),
+        "student_moves": int(np.count_nonzero(roles == table.role_code("student"))),
+        "duration": round(max(0.0, table.end[end - 1] - table.start[first]), 3),
+        "sequence": [OHCR_CODES[code] for code in codes.tolist()],
     })
 
     current["status"] = "complete" if all(counts.get(stage, 0) > 0 for stage in STAGE_ORDER) else "partial"
@@ -83,186 +136,347 @@ def _finalize_episode(episodes: List[Dict], current: Dict) -> None:
     episodes.append(current.copy())
 
 
-def analyze_discourse_acts(utterances: List[Dict], *, preprocessed: bool = False) -> Dict:
-    episodes: List[Dict] = []
-    general_segments: List[Dict] = []
-    general_buffer: List[Dict] = []
-    current = None
+class _EpisodeTracker:
+    """
+    Streaming OHCR episode segmentation behind `analyze_discourse_acts`, over the rows of
+    an `UtteranceTable`. Every row joins either the open episode or the open general
+    segment, so both are contiguous and are kept as [first, end) row ranges.
+    """
+
+    def __init__(self, table: UtteranceTable):
+        self.table = table
+        self.episodes: List[Dict] = []
+        self.general_segments: List[Dict] = []
+        self.general_range: Optional[List[int]] = None
+        self.current = None
+        # Running totals over `episodes`, in order, for `summary()`.
+        self._complete = 0
+        self._quality_sum = 0.0
+        self._coverage_sum = 0.0
+
+    def _general_segment(self, first: int, end: int) -> Dict:
+        return {
+            "start": float(self.table.start[first]),
+            "end": float(self.table.end[end - 1]),
+            "utterance_count": end - first,
+            "utterance_range": [first, end],
+        }
+
+    def _buffer(self, idx: int) -> None:
+        if self.general_range is None:
+            self.general_range = [idx, idx + 1]
+        else:
+            self.general_range[1] = idx + 1
 
-    def flush_general():
-        nonlocal general_buffer
-        if not general_buffer:
+    def _flush_general(self) -> None:
+        if self.general_range is None:
             return
-        segment = {
-            "start": float(general_buffer[0]["start"]),
-            "end": float(general_buffer[-1]["end"]),
-            "utterance_count": len(general_buffer),
-            "utterances": general_buffer.copy(),
-        }
-        general_segments.append(segment)
-        general_buffer = []
+        self.general_segments.append(self._general_segment(*self.general_range))
+        self.general_range = None
 
-    def start_episode(move_entry: Dict, stage_idx: int) -> Dict:
+    def _start_episode(self, idx: int, stage_idx: int) -> Dict:
         return {
-            "start": float(move_entry["start"]),
-            "moves": [move_entry],
+            "start": float(self.table.start[idx]),
+            "utterance_range": [idx, idx + 1],
             "highest_stage": stage_idx,
             "order_violations": 0,
             "skipped_stages": 0,
             "status": "active",
         }
 
-    def add_move(ep: Dict, move_entry: Dict, stage_idx: int) -> None:
-        if ep["moves"]:
-            if stage_idx < ep["highest_stage"]:
-                ep["order_violations"] += 1
-            elif stage_idx > ep["highest_stage"] + 1:
-                ep["skipped_stages"] += stage_idx - ep["highest_stage"] - 1
-        ep["moves"].append(move_entry)
+    @staticmethod
+    def _add_move(ep: Dict, idx: int, stage_idx: int) -> None:
+        if stage_idx < ep["highest_stage"]:
+            ep["order_violations"] += 1
+        elif stage_idx > ep["highest_stage"] + 1:
+            ep["skipped_stages"] += stage_idx - ep["highest_stage"] - 1
+        ep["utterance_range"][1] = idx + 1
         ep["highest_stage"] = max(ep["highest_stage"], stage_idx)
         ep["status"] = "complete" if ep["highest_stage"] >= STAGE_INDEX["R"] else "active"
 
-    for idx, utt in enumerate(utterances):
-        move = utt if preprocessed else _simplify_utterance(utt, idx)
-        label = move["ohcr"]
+    def _close_current(self) -> None:
+        closed = len(self.episodes)
+        _finalize_episode(self.table, self.episodes, self.current)
+        for ep in self.episodes[closed:]:
+            self._complete += ep["status"] == "complete"
+            self._quality_sum += ep["quality_score"]
+            self._coverage_sum += ep["coverage"]
+        self.current = None
+
+    def add(self, idx: int) -> None:
+        label = OHCR_CODES[self.table.ohcr[idx]]
         if label not in STAGE_INDEX:
-            if current:
-                _finalize_episode(episodes, current)
-                current = None
-            general_buffer.append(move)
-            continue
+            if self.current:
+                self._close_current()
+            self._buffer(idx)
+            return
 
         stage_idx = STAGE_INDEX[label]
-        flush_general()
+        self._flush_general()
 
-        if current is None:
+        if self.current is None:
             if label != "O":
-                general_buffer.append(move)
-                continue
-            current = start_episode(move, stage_idx)
-            continue
+                self._buffer(idx)
+                return
+            self.current = self._start_episode(idx, stage_idx)
+            return
 
-        if label == "O" and current["moves"]:
-            _finalize_episode(episodes, current)
-            current = start_episode(move, stage_idx)
-            continue
+        if label == "O":
+            self._close_current()
+            self.current = self._start_episode(idx, stage_idx)
+            return
 
-        if stage_idx < current["highest_stage"] and label == "O":
-            _finalize_episode(episodes, current)
-            current = start_episode(move, stage_idx)
-            continue
+        self._add_move(self.current, idx, stage_idx)
+
+    def _open_episode(self) -> List[Dict]:
+        """The open episode closed on a copy ([] or one episode), leaving the stream as it is."""
+        closed: List[Dict] = []
+        if self.current:
+            _finalize_episode(self.table, closed,
+                              {**self.current, "utterance_range": list(self.current["utterance_range"])})
+            for ep in closed:
+                ep["id"] = len(self.episodes) + 1
+        return closed
+
+    def summary(self, open_episodes: Optional[List[Dict]] = None) -> Dict:
+        """The "summary" of `snapshot()` from the running totals."""
+        if open_episodes is None:
+            open_episodes = self._open_episode()
+        total = len(self.episodes) + len(open_episodes)
+        complete, quality_sum, coverage_sum = self._complete, self._quality_sum, self._coverage_sum
+        for ep in open_episodes:
+            complete += ep["status"] == "complete"
+            quality_sum += ep["quality_score"]
+            coverage_sum += ep["coverage"]
+        return {
+            "total_acts": total,
+            "complete_acts": complete,
+            "partial_acts": total - complete,
+            "avg_quality_score": round(quality_sum / total, 3) if total else 0.0,
+            "avg_coverage": round(coverage_sum / total, 3) if total else 0.0,
+        }
 
-        add_move(current, move, stage_idx)
+    def snapshot(self) -> Dict:
+        """Result as if the stream ended now; the open episode and segment are closed on copies."""
+        open_episodes = self._open_episode()
+        general_segments = list(self.general_segments)
+        if self.general_range is not None:
+            general_segments.append(self._general_segment(*self.general_range))
+        return {
+            "episodes": self.episodes + open_episodes,
+            "general_segments": general_segments,
+            "summary": self.summary(open_episodes),
+        }
 
-    if current:
-        _finalize_episode(episodes, current)
-    flush_general()
 
-    complete = [ep for ep in episodes if ep["status"] == "complete"]
-    partial = [ep for ep in episodes if ep["status"] != "complete"]
-    avg_quality = round(sum(ep["quality_score"] for ep in episodes) / len(episodes), 3) if episodes else 0.0
-    avg_coverage = round(sum(ep["coverage"] for ep in episodes) / len(episodes), 3) if episodes else 0.0
+def analyze_discourse_acts(utterances: List[Dict]) -> Dict:
+    table = UtteranceTable(utterances)
+    tracker = _EpisodeTracker(table)
+    for idx in range(len(table)):
+        tracker.add(idx)
+    return tracker.snapshot()
 
-    summary = {
-        "total_acts": len(episodes),
-        "complete_acts": len(complete),
-        "partial_acts": len(partial),
-        "avg_quality_score": avg_quality,
-        "avg_coverage": avg_coverage,
-    }
 
-    return {
-        "episodes": episodes,
-        "general_segments": general_segments,
-        "summary": summary,
-    }
+def _timeline_points(starts: np.ndarray, ends: np.ndarray, levels: np.ndarray, fallback: np.ndarray,
+                     window_sec: float = 20) -> List[Dict]:
+    """
+    IAM-level aggregates over overlapping windows. Window k is centred on the k-th
+    accumulated multiple of `window_sec` and spans +/- half a window (clamped at 0); the
+    last utterance by start time (ties: the later one) bounds the timeline.
 
-def level_timeline(utterances: List[Dict], window_sec: int = 20) -> List[Dict]:
-    if not utterances:
-        return []
-    window_sec = max(float(window_sec), 1e-9)
-    half_window = window_sec / 2.0
-
-    sorted_utts = sorted(
-        (
-            {
-                "start": float(u.get("start", 0.0)),
-                "end": float(u.get("end", 0.0)),
-                "iam_level": int(u.get("iam_level", 1)),
-                "iam_level_source": u.get("iam_level_source", "llm"),
-            }
-            for u in utterances
-        ),
-        key=lambda item: item["start"],
-    )
-    if not sorted_utts:
+    Each utterance covers a contiguous run of windows, found by binary search, and the
+    per-window sums are prefix sums over where those runs start and stop.
+    """
+    if not len(starts):
         return []
-
-    limit = max(sorted_utts[-1]["end"], window_sec)
-    times: List[float] = []
-    t = 0.0
-    while t <= limit:
-        times.append(t)
-        t += window_sec
+    window = max(float(window_sec), 1e-9)
+    half = window / 2.0
+    last = len(starts) - 1 - int(np.argmax(starts[::-1]))
+    limit = max(float(ends[last]), window)
+    # Centres are accumulated (t += window) rather than multiplied, keeping float parity with earlier results.
+    centers: List[float] = []
+    center = 0.0
+    while center <= limit:
+        centers.append(center)
+        center += window
+    centers_arr = np.array(centers)
+    first = np.searchsorted(centers_arr + half, starts, side="left")
+    stop = np.searchsorted(np.maximum(0.0, centers_arr - half), ends, side="right")
+    covers = first < stop
+    first, stop = first[covers], stop[covers]
+    n = len(centers)
+
+    def per_window(weights: np.ndarray) -> np.ndarray:
+        weights = weights[covers].astype(np.float64)
+        diff = np.bincount(first, weights, minlength=n + 1) - np.bincount(stop, weights, minlength=n + 1)
+        return np.rint(np.cumsum(diff[:n])).astype(np.int64)
+
+    total = per_window(np.ones(len(starts)))
+    level_sum = per_window(levels)
+    fallback_count = per_window(fallback)
+    # Levels are 1-5, so the window maximum is the number of thresholds some utterance reaches.
+    max_level = sum((per_window(levels >= threshold) > 0).astype(np.int64) for threshold in range(1, 6))
 
     out = []
-    for center in times:
-        window_start = max(0.0, center - half_window)
-        window_end = center + half_window
-
-        total = 0
-        level_sum = 0.0
-        max_level = 0
-        llm_count = 0
-        fallback_count = 0
-
-        for candidate in sorted_utts:
-            start = candidate["start"]
-            end = candidate["end"]
-            if end < window_start or start > window_end:
-                continue
-            total += 1
-            lvl = int(candidate.get("iam_level", 1))
-            level_sum += lvl
-            if lvl > max_level:
-                max_level = lvl
-            if candidate.get("iam_level_source") == "fallback":
-                fallback_count += 1
-            else:
-                llm_count += 1
-
-        if total == 0:
+    for k, center in enumerate(centers):
+        count = int(total[k])
+        if count == 0:
             out.append({"time": float(center), "level": 1, "count": 0, "avg_level": 1.0, "max_level": 1, "llm_count": 0, "fallback_count": 0})
             continue
-
-        avg = level_sum / total
-        blended = 0.6 * avg + 0.4 * max_level
+        avg = int(level_sum[k]) / count
+        blended = 0.6 * avg + 0.4 * int(max_level[k])
         level = int(min(5, max(1, round(blended))))
         out.append({
             "time": float(center),
             "level": level,
             "avg_level": round(avg, 2),
-            "max_level": max_level,
-            "count": total,
-            "llm_count": llm_count,
-            "fallback_count": fallback_count,
+            "max_level": int(max_level[k]),
+            "count": count,
+            "llm_count": count - int(fallback_count[k]),
+            "fallback_count": int(fallback_count[k]),
         })
     return out
 
-def ohcr_metrics(utterances: List[Dict], counts: Dict[str, int], challenge_indices: List[int]) -> Dict:
-    cr_pairs = len(challenge_indices)
-    cr_resolved = 0
-    for idx in challenge_indices:
-        if any(v.get("ohcr") == "R" for v in utterances[idx + 1 : idx + 4]):
-            cr_resolved += 1
-    cr_rate = (cr_resolved / cr_pairs) if cr_pairs else 0.0
-    duration_min = (utterances[-1]["end"] / 60.0) if utterances else 1.0
-    res_density = counts.get("R", 0) / max(duration_min, 1e-9)
-    return {
-        "ohcr_counts": counts,
-        "challenge_resolve_rate": round(cr_rate, 3),
-        "resolution_density_per_min": round(res_density, 3),
-    }
+
+def _table_timeline(table: "UtteranceTable", window_sec: float) -> List[Dict]:
+    levels = table.column("iam_level")
+    fallback = levels == 0
+    return _timeline_points(table.column("start"), table.column("end"), np.where(fallback, 1, levels),
+                            fallback, window_sec)
+
+
+class _TimelineBins:
+    """
+    Running IAM-level aggregates for the windows of `_timeline_points`, for streams.
+
+    Each utterance touches only the windows it overlaps, so adding one is
+    O(duration / window_sec + 1). Window levels and their totals are kept up to
+    date as well, so `scores()` and `tail()` do not depend on the stream length;
+    `points()` is O(windows).
+    """
+
+    def __init__(self, window_sec: float = 20):
+        self.window_sec = max(float(window_sec), 1e-9)
+        self.half_window = self.window_sec / 2.0
+        self.centers: List[float] = []
+        self._next_center = 0.0
+        # per window: [count, level_sum, max_level, fallback_count]
+        self.bins: List[List[int]] = []
+        self.levels: List[int] = []
+        # Over every window created so far, including any past the current end of the timeline.
+        self._level_total = 0
+        self._beneficial = 0
+        self.count = 0
+        self._max_start = None
+        self._limit_end = 0.0
+
+    def _ensure(self, k: int) -> None:
+        # Centres are accumulated (t += window) like `_timeline_points`, keeping float parity.
+        while len(self.centers) <= k:
+            self.centers.append(self._next_center)
+            self.bins.append([0, 0, 0, 0])
+            self.levels.append(1)
+            self._level_total += 1
+            self._next_center += self.window_sec
+
+    @staticmethod
+    def _level(b: List[int]) -> int:
+        count, level_sum, max_level, _ = b
+        if count == 0:
+            return 1
+        blended = 0.6 * (level_sum / count) + 0.4 * max_level
+        return int(min(5, max(1, round(blended))))
+
+    def add(self, start: float, end: float, level: int, fallback: bool) -> None:
+        self.count += 1
+        # The last utterance by start time (ties: the later one) bounds the timeline.
+        if self._max_start is None or start >= self._max_start:
+            self._max_start = start
+            self._limit_end = end
+        k = max(0, int((start - self.half_window) // self.window_sec) - 1)
+        while True:
+            self._ensure(k)
+            center = self.centers[k]
+            if end < max(0.0, center - self.half_window):
+                break
+            if not start > center + self.half_window:
+                b = self.bins[k]
+                b[0] += 1
+                b[1] += level
+                if level > b[2]:
+                    b[2] = level
+                if fallback:
+                    b[3] += 1
+                old, new = self.levels[k], self._level(b)
+                self.levels[k] = new
+                self._level_total += new - old
+                self._beneficial += (new >= BENEFICIAL_LEVEL) - (old >= BENEFICIAL_LEVEL)
+            k += 1
+
+    def _size(self) -> int:
+        """Number of windows in the timeline: centres up to the end of its last utterance."""
+        if not self.count:
+            return 0
+        limit = max(self._limit_end, self.window_sec)
+        while not self.centers or self.centers[-1] <= limit:
+            self._ensure(len(self.centers))
+        # Only windows reached by an utterance ending past the limit lie beyond it; usually none.
+        n = len(self.centers)
+        while self.centers[n - 1] > limit:
+            n -= 1
+        return n
+
+    def _point(self, k: int) -> Dict:
+        center = float(self.centers[k])
+        count, level_sum, max_level, fallback_count = self.bins[k]
+        if count == 0:
+            return {"time": center, "level": 1, "count": 0, "avg_level": 1.0, "max_level": 1, "llm_count": 0, "fallback_count": 0}
+        return {
+            "time": center,
+            "level": self.levels[k],
+            "avg_level": round(level_sum / count, 2),
+            "max_level": max_level,
+            "count": count,
+            "llm_count": count - fallback_count,
+            "fallback_count": fallback_count,
+        }
+
+    def points(self) -> List[Dict]:
+        return [self._point(k) for k in range(self._size())]
+
+    def tail(self, windows: int) -> List[Dict]:
+        """The last `windows` points of `points()`."""
+        n = self._size()
+        return [self._point(k) for k in range(max(0, n - windows), n)]
+
+    def scores(self) -> Tuple[float, float]:
+        """(`beneficial_duration_pct`, `kcs_score`) of `points()`, from the running totals."""
+        n = self._size()
+        if not n:
+            return beneficial_duration_pct([]), kcs_score([])
+        beyond = self.levels[n:]
+        total = self._level_total - sum(beyond)
+        beneficial = self._beneficial - sum(1 for level in beyond if level >= BENEFICIAL_LEVEL)
+        return round(beneficial / n, 3), round(total / n, 3)
+
+
+def level_timeline(utterances: List[Dict], window_sec: int = 20) -> List[Dict]:
+    return _timeline_points(
+        np.array([float(u.get("start", 0.0)) for u in utterances]),
+        np.array([float(u.get("end", 0.0)) for u in utterances]),
+        np.array([int(u.get("iam_level", 1)) for u in utterances]),
+        np.array([u.get("iam_level_source", "llm") == "fallback" for u in utterances], dtype=bool),
+        window_sec,
+    )
+
+
+def timeline_window_key(window_sec: float) -> str:
+    return f"{float(window_sec):g}"
+
+
+def session_timeline(utterances: List[Dict], window_sec: float = 20) -> List[Dict]:
+    """`level_timeline` over stored labelled utterances, reading IAM levels the way `compute_all` does."""
+    return _table_timeline(UtteranceTable(utterances), window_sec)
 
 def participation_metrics(role_totals: Dict[str, float], role_counts: Dict[str, int]) -> Dict:
     dur_teacher = role_totals.get("teacher", 0.0)
@@ -279,7 +493,7 @@ def participation_metrics(role_totals: Dict[str, float], role_counts: Dict[str,
         "avg_student_turn": round(avg_student, 3),
     }
 
-def beneficial_duration_pct(timeline: List[Dict], threshold: int = 3) -> float:
+def beneficial_duration_pct(timeline: List[Dict], threshold: int = BENEFICIAL_LEVEL) -> float:
     if not timeline:
         return 0.0
     good = sum(1 for p in timeline if p["level"] >= threshold)
@@ -306,114 +520,84 @@ def _format_duration(seconds: float) -> str:
         parts.append(f"{sec}s")
     return " ".join(parts)
 
+_STAGE_PROMPTS = {
+    "Observe": "\u201cWhat do we notice?\u201d Highlight concrete evidence before moving forward.",
+    "Hypothesis": "\u201cWhat could explain the observation?\u201d Encourage learners to voice emerging theories.",
+    "Challenge": "\u201cDoes this hypothesis hold up?\u201d Invite critique and stress-testing of ideas.",
+    "Resolve": "\u201cWhat have we learned?\u201d Synthesize takeaways and close the loop together.",
+}
 
-def compute_all(utterances: List[Dict], coach_report: Dict = None) -> Dict:
-    simplified = [_simplify_utterance(u, idx) for idx, u in enumerate(utterances)]
-    if not simplified:
-        return {
-            "ohcr_counts": {"O": 0, "H": 0, "C": 0, "R": 0, "None": 0},
-            "challenge_resolve_rate": 0.0,
-            "resolution_density_per_min": 0.0,
-            "teacher_talk_pct": 0.0,
-            "student_talk_pct": 0.0,
-            "avg_teacher_turn": 0.0,
-            "avg_student_turn": 0.0,
-            "beneficial_duration_pct": 0.0,
-            "kcs_score": 1.0,
-            "timeline": [],
-            "discourse_analysis": analyze_discourse_acts([]),
-            "class_duration_sec": 0.0,
-            "class_duration_formatted": "0s",
-            "interaction_count": 0,
-            "subtopic_count": 0,
-            "teacher_question_count": 0,
-            "student_question_count": 0,
-            "topics": [],
-            "observe_count": 0,
-            "hypothesis_count": 0,
-            "challenge_count": 0,
-            "resolution_count": 0,
-            "observe_context": "0 moves \u2022 \u201cWhat do we notice?\u201d Highlight concrete evidence before moving forward.",
-            "hypothesis_context": "0 moves \u2022 \u201cWhat could explain the observation?\u201d Encourage learners to voice emerging theories.",
-            "challenge_context": "0 moves \u2022 \u201cDoes this hypothesis hold up?\u201d Invite critique and stress-testing of ideas.",
-            "resolution_context": "0 moves \u2022 \u201cWhat have we learned?\u201d Synthesize takeaways and close the loop together.",
-        }
 
-    counts = {"O": 0, "H": 0, "C": 0, "R": 0, "None": 0}
-    role_totals = {"teacher": 0.0, "student": 0.0}
-    role_counts = {"teacher": 0, "student": 0}
-    challenge_indices: List[int] = []
-    teacher_question_count = 0
-    student_question_count = 0
-    interaction_count = 0
-    prev_role = None
-    class_start = simplified[0]["start"]
-    class_end = simplified[0]["end"]
-
-    for idx, utt in enumerate(simplified):
-        label = utt["ohcr"]
-        counts[label] += 1
-        if label == "C":
-            challenge_indices.append(idx)
-
-        role = utt["role"]
-        if role in role_totals:
-            role_totals[role] += utt.get("duration", 0.0)
-            role_counts[role] += 1
-        iam_int = utt.get("iam_level")
-        if iam_int is None:
-            utt["iam_level"] = 1
-            utt["iam_level_source"] = "fallback"
-        else:
-            utt["iam_level"] = iam_int
-            utt["iam_level_source"] = "llm"
-        discourse_act = str(utt.get("discourse_act", "")).lower()
-        if discourse_act == "question":
-            if role == "teacher":
-                teacher_question_count += 1
-            elif role == "student":
-                student_question_count += 1
-        if role in {"teacher", "student"}:
-            if prev_role and prev_role != role:
-                interaction_count += 1
-            prev_role = role
-        class_start = min(class_start, utt["start"])
-        class_end = max(class_end, utt["end"])
-
-    timeline = level_timeline(simplified)
-    ohcr = ohcr_metrics(simplified, counts, challenge_indices)
-    participation = participation_metrics(role_totals, role_counts)
-    class_duration_sec = max(0.0, class_end - class_start)
+def _stage_context(count: int, stage: str) -> str:
+    base = _STAGE_PROMPTS[stage]
+    if count <= 0:
+        return f"0 moves \u2022 {base}"
+    label = "move" if count == 1 else "moves"
+    return f"{count} {label} \u2022 {base}"
+
+
+def _empty_metrics() -> Dict:
+    return {
+        "ohcr_counts": {"O": 0, "H": 0, "C": 0, "R": 0, "None": 0},
+        "challenge_resolve_rate": 0.0,
+        "resolution_density_per_min": 0.0,
+        "teacher_talk_pct": 0.0,
+        "student_talk_pct": 0.0,
+        "avg_teacher_turn": 0.0,
+        "avg_student_turn": 0.0,
+        "beneficial_duration_pct": 0.0,
+        "kcs_score": 1.0,
+        "timeline": [],
+        "discourse_analysis": analyze_discourse_acts([]),
+        "class_duration_sec": 0.0,
+        "class_duration_formatted": "0s",
+        "interaction_count": 0,
+        "subtopic_count": 0,
+        "teacher_question_count": 0,
+        "student_question_count": 0,
+        "topics": [],
+        "observe_count": 0,
+        "hypothesis_count": 0,
+        "challenge_count": 0,
+        "resolution_count": 0,
+        "observe_context": _stage_context(0, "Observe"),
+        "hypothesis_context": _stage_context(0, "Hypothesis"),
+        "challenge_context": _stage_context(0, "Challenge"),
+        "resolution_context": _stage_context(0, "Resolve"),
+    }
+
+
+def _metrics_result(counts: Dict[str, int], *, challenges_resolved: int, last_end: float,
+                    participation: Dict, timeline: List[Dict], scores: Tuple[float, float],
+                    timelines: Optional[Dict[str, List[Dict]]], discourse_analysis: Dict, class_duration_sec: float, interaction_count: int,
+                    teacher_question_count: int, student_question_count: int, coach_report: Dict = None) -> Dict:
+    """
+    The `compute_all` result from aggregates, however they were accumulated. `scores`
+    are the (beneficial_duration_pct, kcs_score) of the whole timeline, which need
+    not be `timeline` itself (see `MetricsAccumulator.summary`).
+    """
+    cr_rate = (challenges_resolved / counts["C"]) if counts["C"] else 0.0
+    duration_min = last_end / 60.0
 
     topics: List[str] = []
     if isinstance(coach_report, dict):
         topics = [t for t in coach_report.get("topics", []) if isinstance(t, str)]
 
-    def _stage_context(count: int, stage: str) -> str:
-        prompts = {
-            "Observe": "\u201cWhat do we notice?\u201d Highlight concrete evidence before moving forward.",
-            "Hypothesis": "\u201cWhat could explain the observation?\u201d Encourage learners to voice emerging theories.",
-            "Challenge": "\u201cDoes this hypothesis hold up?\u201d Invite critique and stress-testing of ideas.",
-            "Resolve": "\u201cWhat have we learned?\u201d Synthesize takeaways and close the loop together.",
-        }
-        base = prompts[stage]
-        if count <= 0:
-            return f"0 moves \u2022 {base}"
-        label = "move" if count == 1 else "moves"
-        return f"{count} {label} \u2022 {base}"
-
     observe_count = counts.get("O", 0)
     hypothesis_count = counts.get("H", 0)
     challenge_count = counts.get("C", 0)
     resolution_count = counts.get("R", 0)
 
     return {
-        **ohcr,
+        "ohcr_counts": counts,
+        "challenge_resolve_rate": round(cr_rate, 3),
+        "resolution_density_per_min": round(resolution_count / max(duration_min, 1e-9), 3),
         **participation,
-        "beneficial_duration_pct": beneficial_duration_pct(timeline),
-        "kcs_score": kcs_score(timeline),
+        "beneficial_duration_pct": scores[0],
+        "kcs_score": scores[1],
         "timeline": timeline,
-        "discourse_analysis": analyze_discourse_acts(simplified, preprocessed=True),
+        **({"timelines": timelines} if timelines else {}),
+        "discourse_analysis": discourse_analysis,
         "class_duration_sec": round(class_duration_sec, 3),
         "class_duration_formatted": _format_duration(class_duration_sec),
         "interaction_count": interaction_count,
@@ -430,3 +614,192 @@ def compute_all(utterances: List[Dict], coach_report: Dict = None) -> Dict:
         "challenge_context": _stage_context(challenge_count, "Challenge"),
         "resolution_context": _stage_context(resolution_count, "Resolve"),
     }
+
+
+def _empty_result(timeline_keys: Iterable[str]) -> Dict:
+    empty = _empty_metrics()
+    keys = list(timeline_keys)
+    if keys:
+        empty["timelines"] = {key: [] for key in keys}
+    return empty
+
+
+def _resolved_challenges(ohcr: np.ndarray, window: int) -> int:
+    # Resolved: the next R after the challenge is at most `window` rows later.
+    challenges = np.flatnonzero(ohcr == _OHCR_CODE["C"])
+    resolves = np.flatnonzero(ohcr == _OHCR_CODE["R"])
+    if not len(challenges) or not len(resolves):
+        return 0
+    nxt = np.searchsorted(resolves, challenges, side="right")
+    has_next = nxt < len(resolves)
+    gaps = resolves[nxt[has_next]] - challenges[has_next]
+    return int(np.count_nonzero(gaps <= window))
+
+
+class MetricsAccumulator:
+    """
+    Incremental `compute_all`: feed utterances one at a time with `add` and call
+    `snapshot()` whenever a `compute_all`-compatible result is needed.
+
+    Utterances are appended to an `UtteranceTable`; counts, role totals,
+    question/interaction counts, the challenge->resolve window, timeline bins and
+    the open OHCR episode are all updated in O(1) amortised time per utterance, so
+    `snapshot()` costs O(timeline windows + episodes) however long the stream gets.
+    """
+
+    # A challenge counts as resolved if an R arrives within this many following utterances.
+    RESOLVE_WINDOW = 3
+
+    def __init__(self, coach_report: Dict = None, window_sec: int = 20, pyramid: Sequence[float] = ()):
+        self.coach_report = coach_report
+        self.table = UtteranceTable()
+        self.window_sec = window_sec
+        self.counts = {label: 0 for label in OHCR_CODES}
+        self.role_totals = {"teacher": 0.0, "student": 0.0}
+        self.role_counts = {"teacher": 0, "student": 0}
+        self.teacher_question_count = 0
+        self.student_question_count = 0
+        self.interaction_count = 0
+        self.challenges_resolved = 0
+        self._open_challenges: Deque[int] = deque()
+        self._prev_role = None
+        self.class_start = None
+        self.class_end = None
+        self._timeline = _TimelineBins(window_sec)
+        # Extra resolutions share the pass; the main window's bins are reused rather than duplicated.
+        self._pyramid = {
+            timeline_window_key(w): self._timeline if w == window_sec else _TimelineBins(w) for w in pyramid
+        }
+        self._extra_bins = [b for b in self._pyramid.values() if b is not self._timeline]
+        self._episodes = _EpisodeTracker(self.table)
+
+    @property
+    def count(self) -> int:
+        return len(self.table)
+
+    def add(self, utterance: Dict) -> int:
+        """Fold one utterance in; returns its row in `self.table`."""
+        table = self.table
+        idx = table.append(utterance)
+        start, end = table.start[idx], table.end[idx]
+
+        label = OHCR_CODES[table.ohcr[idx]]
+        self.counts[label] += 1
+        while self._open_challenges and idx - self._open_challenges[0] > self.RESOLVE_WINDOW:
+            self._open_challenges.popleft()
+        if label == "R":
+            self.challenges_resolved += len(self._open_challenges)
+            self._open_challenges.clear()
+        elif label == "C":
+            self._open_challenges.append(idx)
+
+        role = table.roles[table.role[idx]]
+        if role in self.role_totals:
+            self.role_totals[role] += max(end - start, 0.0)
+            self.role_counts[role] += 1
+            # Interactions are teacher<->student hand-overs, ignoring other speakers in between.
+            if self._prev_role and self._prev_role != role:
+                self.interaction_count += 1
+            self._prev_role = role
+            if table.acts[table.act[idx]] == "question":
+                if role == "teacher":
+                    self.teacher_question_count += 1
+                else:
+                    self.student_question_count += 1
+        self.class_start = start if self.class_start is None else min(self.class_start, start)
+        self.class_end = end if self.class_end is None else max(self.class_end, end)
+
+        level = table.iam_level[idx]
+        self._timeline.add(start, end, level or 1, level == 0)
+        for bins in self._extra_bins:
+            bins.add(start, end, level or 1, level == 0)
+        self._episodes.add(idx)
+        return idx
+
+    def extend(self, utterances: List[Dict]) -> None:
+        for u in utterances:
+            self.add(u)
+
+    def _result(self, timeline: List[Dict], timelines: Dict[str, List[Dict]], discourse_analysis: Dict) -> Dict:
+        return _metrics_result(
+            dict(self.counts),
+            challenges_resolved=self.challenges_resolved,
+            last_end=self.table.end[-1],
+            participation=participation_metrics(self.role_totals, self.role_counts),
+            timeline=timeline,
+            scores=self._timeline.scores(),
+            timelines=timelines,
+            discourse_analysis=discourse_analysis,
+            class_duration_sec=max(0.0, self.class_end - self.class_start),
+            interaction_count=self.interaction_count,
+            teacher_question_count=self.teacher_question_count,
+            student_question_count=self.student_question_count,
+            coach_report=self.coach_report,
+        )
+
+    def snapshot(self) -> Dict:
+        """The `compute_all` result so far, read off the running state."""
+        if not self.count:
+            return _empty_result(self._pyramid)
+        timeline = self._timeline.points()
+        return self._result(
+            timeline,
+            {key: timeline if bins is self._timeline else bins.points() for key, bins in self._pyramid.items()},
+            self._episodes.snapshot(),
+        )
+
+    def summary(self, timeline_tail: int) -> Dict:
+        """
+        `snapshot()` with only the last `timeline_tail` timeline windows, no pyramid and
+        only the "summary" of "discourse_analysis", at a cost independent of the stream
+        length (beyond the open episode); live mode sends one after every step.
+        """
+        if not self.count:
+            return _empty_result(())
+        return self._result(self._timeline.tail(timeline_tail), {}, {"summary": self._episodes.summary()})
+
+
+def compute_all(utterances: List[Dict], coach_report: Dict = None,
+                pyramid: Sequence[float] = TIMELINE_PYRAMID_SEC, window_sec: int = 20) -> Dict:
+    """
+    Session metrics over the complete utterance list, computed from the columns of
+    an `UtteranceTable` with vectorized NumPy operations. `MetricsAccumulator` gives
+    the same result for a stream.
+    """
+    table = UtteranceTable(utterances)
+    timeline_keys = {timeline_window_key(w): w for w in pyramid}
+    if not len(table):
+        return _empty_result(timeline_keys)
+    episodes = _EpisodeTracker(table)
+    for idx in range(len(table)):
+        episodes.add(idx)
+
+    starts, ends = table.column("start"), table.column("end")
+    ohcr, roles, acts = table.column("ohcr"), table.column("role"), table.column("act")
+    is_teacher, is_student = roles == table.role_code("teacher"), roles == table.role_code("student")
+    per_code = np.bincount(ohcr, minlength=len(OHCR_CODES))
+    durations = np.maximum(ends - starts, 0.0)
+    questions = acts == table.act_code("question")
+    # Interactions are teacher<->student hand-overs, ignoring other speakers in between.
+    speaking = roles[is_teacher | is_student]
+    timeline = _table_timeline(table, window_sec)
+
+    return _metrics_result(
+        {label: int(per_code[code]) for code, label in enumerate(OHCR_CODES)},
+        challenges_resolved=_resolved_challenges(ohcr, MetricsAccumulator.RESOLVE_WINDOW),
+        last_end=float(ends[-1]),
+        participation=participation_metrics(
+            {"teacher": float(durations[is_teacher].sum()), "student": float(durations[is_student].sum())},
+            {"teacher": int(np.count_nonzero(is_teacher)), "student": int(np.count_nonzero(is_student))},
+        ),
+        timeline=timeline,
+        scores=(beneficial_duration_pct(timeline), kcs_score(timeline)),
+        timelines={key: timeline if w == window_sec else _table_timeline(table, w)
+                   for key, w in timeline_keys.items()},
+        discourse_analysis=episodes.snapshot(),
+        class_duration_sec=max(0.0, float(ends.max() - starts.min())),
+        interaction_count=int(np.count_nonzero(speaking[1:] != speaking[:-1])),
+        teacher_question_count=int(np.count_nonzero(questions & is_teacher)),
+        student_question_count=int(np.count_nonzero(questions & is_student)),
+        coach_report=coach_report,
+    )
@@ -0,0 +1,174 @@
+"""
+The OpenAI client shared by transcription, labelling, the coach and the tier prompts.
+
+`OPENAI_MODE` selects how calls are served:
+
+  - live:   straight to the API (default);
+  - record: to the API, and every request/response pair is also written to
+            the fixture store (`OPENAI_FIXTURES_DIR`) with its latency;
+  - replay: from the fixture store only, without network or API key, after
+            sleeping the recorded latency times `OPENAI_REPLAY_LATENCY_SCALE`
+            (0 replays instantly).
+
+Fixtures are keyed by a hash of the endpoint and its arguments (uploaded audio by
+content digest), so replaying the same inputs reproduces a recorded run exactly.
+The LLM response cache sits in front of these calls: record and replay with an
+empty cache (e.g. `CACHE_BACKEND=memory`) to capture or reproduce every call.
+"""
+import copy
+import hashlib
+import json
+import logging
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+from openai import OpenAI
+
+from backend.cache import CacheBackend, FileCache
+from backend.config import CFG
+from backend.deadline import remaining
+from backend.telemetry import OPENAI_FIXTURES
+
+log = logging.getLogger(__name__)
+
+_HASH_CHUNK = 1024 * 1024
+
+
+class FixtureMissing(RuntimeError):
+    """Replay mode found no recorded response for a request."""
+
+
+def has_openai() -> bool:
+    """Whether API calls can be served: a key is configured, or responses are replayed."""
+    return bool(CFG.openai_api_key) or CFG.openai_mode == "replay"
+
+
+def _file_digest(value: Any) -> Dict[str, Any]:
+    """Stand-in for an uploaded file in the request key: its name and content hash."""
+    name, f = value if isinstance(value, tuple) else (getattr(value, "name", ""), value)
+    digest = hashlib.sha256()
+    if isinstance(f, (bytes, bytearray)):
+        digest.update(f)
+    else:
+        position = f.tell()
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+        f.seek(position)  # the real call still has to stream it
+    return {"name": str(name), "sha256": digest.hexdigest()}
+
+
+def _request_view(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    # The timeout does not change the response, so it is not part of the key.
+    return {k: (_file_digest(v) if k == "file" else v) for k, v in kwargs.items() if k != "timeout"}
+
+
+def _request_key(endpoint: str, request: Dict[str, Any]) -> str:
+    s = json.dumps({"endpoint": endpoint, "request": request}, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+
+class _Replayed:
+    """A recorded response with the attribute access of the SDK object it was dumped from."""
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: Dict[str, Any]):
+        self._data = data
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return _wrap(self._data[name])
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def model_dump(self, **_: Any) -> Dict[str, Any]:
+        return copy.deepcopy(self._data)
+
+
+def _wrap(value: Any) -> Any:
+    if isinstance(value, dict):
+        return _Replayed(value)
+    if isinstance(value, list):
+        return [_wrap(v) for v in value]
+    return value
+
+
+class _Endpoint:
+    def __init__(self, client: "RecordReplayClient", path: str):
+        self._client = client
+        self._path = path
+
+    def create(self, **kwargs: Any) -> Any:
+        return self._client.call(self._path, kwargs)
+
+
+class RecordReplayClient:
+    """Stands in for `OpenAI`, exposing the same endpoints as the installed SDK's client."""
+
+    def __init__(self, mode: str, store: CacheBackend, inner: OpenAI, latency_scale: float = 1.0):
+        self.mode = mode
+        self.store = store
+        self.inner = inner
+        self.latency_scale = max(0.0, latency_scale)
+        self.audio = SimpleNamespace(transcriptions=_Endpoint(self, "audio.transcriptions"))
+        self.chat = SimpleNamespace(completions=_Endpoint(self, "chat.completions"))
+        # Callers pick the Responses API only when the SDK has it; keep that choice identical.
+        if getattr(inner, "responses", None) is not None:
+            self.responses = _Endpoint(self, "responses")
+
+    def _target(self, endpoint: str) -> Any:
+        target = self.inner
+        for part in endpoint.split("."):
+            target = getattr(target, part)
+        return target
+
+    def with_options(self, **options: Any) -> "RecordReplayClient":
+        return RecordReplayClient(self.mode, self.store, self.inner.with_options(**options), self.latency_scale)
+
+    def call(self, endpoint: str, kwargs: Dict[str, Any]) -> Any:
+        request = _request_view(kwargs)
+        key = _request_key(endpoint, request)
+        if self.mode == "replay":
+            entry = self.store.get(key)
+            if entry is None:
+                OPENAI_FIXTURES.inc(endpoint=endpoint, result="missing")
+                raise FixtureMissing(f"No recorded {endpoint} response for request {key[:12]}")
+            response, meta = entry
+            delay = float(meta.get("latency_sec") or 0.0) * self.latency_scale
+            if delay > 0:
+                time.sleep(delay)
+            OPENAI_FIXTURES.inc(endpoint=endpoint, result="replayed")
+            return _wrap(response)
+
+        t0 = time.perf_counter()
+        response = self._target(endpoint).create(**kwargs)
+        latency = time.perf_counter() - t0
+        data = response.model_dump(mode="json") if hasattr(response, "model_dump") else response
+        try:
+            self.store.set(key, data, {"endpoint": endpoint, "latency_sec": round(latency, 4), "request": request})
+        except (OSError, TypeError, ValueError):
+            log.exception("Could not record %s response", endpoint)
+        else:
+            OPENAI_FIXTURES.inc(endpoint=endpoint, result="recorded")
+        return response
+
+
+def make_client(mode: Optional[str] = None) -> Any:
+    """The client for `mode` (default `CFG.openai_mode`)."""
+    mode = mode or CFG.openai_mode
+    # Building the SDK client does not touch the network, so replay can use it for its shape.
+    inner = OpenAI(api_key=CFG.openai_api_key)
+    if mode == "live":
+        return inner
+    return RecordReplayClient(mode, FileCache(CFG.openai_fixtures_dir), inner, CFG.openai_replay_latency_scale)
+
+
+def bounded(client: Any) -> Any:
+    """
+    `client` for one call. While a request deadline is active the SDK's own retries are
+    off, so a call cannot outlive its clamped timeout; callers retry within the budget.
+    """
+    if remaining() is None:
+        return client
+    return client.with_options(max_retries=0)
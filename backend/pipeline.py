@@ -0,0 +1,345 @@
+import contextvars
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from dataclasses import replace
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from backend.config import CFG
+from backend.transcribe_openai import transcribe_audio_file
+from backend.diarize_simple import (
+    embed_segments,
+    assign_speakers_k2,
+    map_roles_by_talk_time,
+    merge_contiguous_segments,
+)
+from backend.discourse_coach import label_transcript
+from backend.deadline import COACH_FULL_MIN_SEC, has_time
+from backend.llm_options import active_depth, active_options, describe_llm, use_llm_options
+from backend.metrics_engine import compute_all
+from backend.tiered_prompts import run_tiered_prompts
+from backend.waveform import compute_peaks, describe as describe_waveform
+from backend import analytics, storage
+from backend.profiling import StageProfiler
+from backend.telemetry import STAGE_DEGRADATIONS, STAGE_FAILURES, STAGE_SECONDS
+
+log = logging.getLogger(__name__)
+
+# A dependency order: every stage only reads the step entries of the stages it depends on.
+STAGES = ["transcription", "waveform", "diarization", "labeling", "metrics", "tier_prompts"]
+STAGE_DEPS = {
+    "transcription": [],
+    "waveform": [],
+    "diarization": ["transcription"],
+    "labeling": ["diarization"],
+    "metrics": ["labeling"],
+    "tier_prompts": ["labeling"],
+}
+# Step entries written by each stage (labeling also produces the coach report).
+STAGE_OUTPUTS = {name: [name] for name in STAGES}
+STAGE_OUTPUTS["labeling"] = ["labeling", "coach_analysis"]
+# Stages that need the original audio, which is not kept after a session finishes.
+AUDIO_STAGES = {"transcription", "waveform", "diarization"}
+
+
+class PipelineError(RuntimeError):
+    """Raised when a stage cannot produce usable output."""
+
+
+def _elapsed_ms(start: float) -> int:
+    return int((time.perf_counter() - start) * 1000)
+
+
+def transcribe_stage(steps: Dict, audio_path: str, filename: str) -> Dict:
+    # 1) Transcribe (OpenAI Whisper API)
+    t0 = time.perf_counter()
+    with open(audio_path, "rb") as f:
+        text, verbose = transcribe_audio_file(f, filename=filename or "audio.wav")
+    segments = [{"start": float(s["start"]), "end": float(s["end"]), "text": s.get("text", ""),
+                 "speaker": "", "role": "unknown"} for s in verbose.get("segments", [])]
+    if not segments:
+        raise PipelineError("No segments produced by Whisper.")
+    return {"transcription": {
+        "status": "completed",
+        "duration_ms": _elapsed_ms(t0),
+        "text": text,
+        "segment_count": len(segments),
+        "segments": segments,
+    }}
+
+
+def diarize_stage(steps: Dict, audio_path: str, filename: str) -> Dict:
+    # 2) Diarize simple (ECAPA + KMeans k=2) then map roles
+    t0 = time.perf_counter()
+    segments = [dict(seg) for seg in steps["transcription"]["segments"]]
+    embs = embed_segments(audio_path, segments)
+    segments = assign_speakers_k2(segments, embs)
+    segments = merge_contiguous_segments(segments)
+    segments = map_roles_by_talk_time(segments)
+    diarization = {
+        "status": "completed",
+        "duration_ms": _elapsed_ms(t0),
+        "segment_count": len(segments),
+        "segments": segments,
+    }
+    return {"diarization": diarization}
+
+
+def waveform_stage(steps: Dict, audio_path: str, filename: str) -> Dict:
+    # Peaks for the frontend waveform; a failure here only loses the picture, not the session.
+    t0 = time.perf_counter()
+    try:
+        peaks = compute_peaks(audio_path)
+    except Exception as err:
+        log.warning("Could not compute waveform peaks: %s", err)
+        return {"waveform": {"status": "failed", "duration_ms": _elapsed_ms(t0), "error": str(err), "peaks": None}}
+    return {"waveform": {"status": "completed", "duration_ms": _elapsed_ms(t0), **describe_waveform(peaks),
+                         "peaks": peaks}}
+
+
+def _degraded(reason: Optional[str]) -> Dict:
+    # Step status fields for output cut back to fit the request's latency budget.
+    return {"status": "degraded", "degraded": reason} if reason else {"status": "completed"}
+
+
+def label_stage(steps: Dict, audio_path: str, filename: str) -> Dict:
+    # 3) Paragraph-level LLM discourse analysis (labels + coach)
+    t0 = time.perf_counter()
+    segments = [dict(seg) for seg in steps["diarization"]["segments"]]
+    # Without time for the full coach report, ask for the lean one (see backend.deadline).
+    lean = active_depth() != "fast" and not has_time(COACH_FULL_MIN_SEC)
+    with use_llm_options(replace(active_options(), depth="fast")) if lean else nullcontext():
+        labeled, coach_report, coach_meta = label_transcript(segments)
+        llm = describe_llm()
+    if coach_meta.get("reason") == "deadline":
+        status = _degraded("fallback_labels")
+    else:
+        status = _degraded("lean_coach" if lean else None)
+    return {
+        "labeling": {
+            **status,
+            "duration_ms": _elapsed_ms(t0),
+            "utterance_count": len(labeled),
+            "utterances": labeled,
+            "meta": coach_meta,
+            "llm": llm,
+        },
+        "coach_analysis": {
+            **status,
+            "duration_ms": 0,
+            "report": coach_report,
+            "meta": coach_meta,
+        },
+    }
+
+
+def metrics_stage(steps: Dict, audio_path: str, filename: str) -> Dict:
+    # 4) Metrics & timeline
+    t0 = time.perf_counter()
+    metrics = compute_all(steps["labeling"]["utterances"], coach_report=steps["coach_analysis"]["report"])
+    return {"metrics": {
+        "status": "completed",
+        "duration_ms": _elapsed_ms(t0),
+        "metrics": metrics,
+    }}
+
+
+def tier_stage(steps: Dict, audio_path: str, filename: str) -> Dict:
+    # 5) Tiered prompts (Tier 1-3 narratives)
+    t0 = time.perf_counter()
+    tier_analysis = run_tiered_prompts(steps["labeling"]["utterances"])
+    results, skipped = tier_analysis.get("results", []), tier_analysis.get("skipped", [])
+    status = _degraded("skipped_tiers" if skipped else None)
+    if skipped:
+        status.update({"status": "skipped" if not results else "degraded", "skipped_tiers": skipped})
+    return {"tier_prompts": {
+        **status,
+        "duration_ms": _elapsed_ms(t0),
+        "results": results,
+        "transcript": tier_analysis.get("transcript", ""),
+        "llm": describe_llm(),
+    }}
+
+
+STAGE_FUNCS: Dict[str, Callable[[Dict, str, str], Dict]] = {
+    "transcription": transcribe_stage,
+    "waveform": waveform_stage,
+    "diarization": diarize_stage,
+    "labeling": label_stage,
+    "metrics": metrics_stage,
+    "tier_prompts": tier_stage,
+}
+
+
+def downstream_stages(stages: Iterable[str]) -> List[str]:
+    """Return the named stages plus every stage that depends on them, in pipeline order."""
+    selected = set(stages)
+    unknown = selected - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+    for name in STAGES:
+        if any(dep in selected for dep in STAGE_DEPS[name]):
+            selected.add(name)
+    return [name for name in STAGES if name in selected]
+
+
+def run_stage(name: str, steps: Dict, audio_path: Optional[str], filename: str,
+              profiler: Optional[StageProfiler] = None) -> Dict:
+    """Run a single stage against `steps` and return its new step entries (not merged)."""
+    t0 = time.perf_counter()
+    try:
+        with profiler.stage(name) if profiler is not None else nullcontext():
+            output = STAGE_FUNCS[name](steps, audio_path, filename)
+    except Exception:
+        STAGE_FAILURES.inc(stage=name)
+        raise
+    STAGE_SECONDS.observe(time.perf_counter() - t0, stage=name)
+    if output.get(name, {}).get("status") in ("degraded", "skipped"):
+        STAGE_DEGRADATIONS.inc(stage=name, reason=output[name].get("degraded", "skipped"))
+    return output
+
+
+def run_pipeline(audio_path: Optional[str], filename: str, steps: Optional[Dict] = None,
+                 on_stage: Optional[Callable[[str, Dict], None]] = None,
+                 profiler: Optional[StageProfiler] = None) -> Dict:
+    """
+    Run every stage whose output is not already present in `steps`.
+
+    Each stage starts as soon as the stages in its `STAGE_DEPS` have finished, so
+    independent ones overlap: the waveform is decoded while Whisper transcribes,
+    and metrics are computed while the tier prompts wait on the LLM. Stages run
+    on worker threads with the caller's context (LLM options, deadline) and see
+    the step entries present when they start.
+
+    `on_stage(name, output)` is called on the calling thread after each stage
+    finishes so callers can checkpoint the output; a resumed run passes the
+    checkpoints back in as `steps`. If a stage fails, no further stages start and
+    its error is raised once the running ones have finished.
+
+    When `profiler` is given the stages run one at a time, each inside
+    `profiler.stage(name)`, since the profiler follows a single thread.
+    """
+    steps = dict(steps or {})
+    pending = [name for name in STAGES if name not in steps]
+    if profiler is not None:
+        for name in pending:
+            output = run_stage(name, steps, audio_path, filename, profiler=profiler)
+            steps.update(output)
+            if on_stage is not None:
+                on_stage(name, output)
+        return steps
+
+    running: Dict[Future, str] = {}
+    error: Optional[BaseException] = None
+    with ThreadPoolExecutor(max_workers=len(STAGES), thread_name_prefix="stage") as pool:
+        while pending or running:
+            if error is None:
+                for name in [n for n in pending if all(dep in steps for dep in STAGE_DEPS[n])]:
+                    pending.remove(name)
+                    ctx = contextvars.copy_context()
+                    running[pool.submit(ctx.run, run_stage, name, dict(steps), audio_path, filename)] = name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    output = future.result()
+                except Exception as err:
+                    error = error or err
+                    continue
+                steps.update(output)
+                if on_stage is not None:
+                    on_stage(name, output)
+    if error is not None:
+        raise error
+    return steps
+
+
+def rerun_stages(steps: Dict, stages: Iterable[str]) -> Tuple[Dict, List[str]]:
+    """
+    Re-execute `stages` and their dependents on top of previously stored `steps`.
+
+    Upstream outputs (e.g. diarized segments) are reused as-is, so Whisper and
+    diarization are skipped unless explicitly requested.
+    """
+    to_run = downstream_stages(stages)
+    needs_audio = AUDIO_STAGES.intersection(to_run)
+    if needs_audio:
+        raise PipelineError(f"Stages {', '.join(sorted(needs_audio))} need the original audio, which is not stored.")
+    dropped = {out for name in to_run for out in STAGE_OUTPUTS[name]}
+    kept = {name: step for name, step in steps.items() if name not in dropped}
+    return run_pipeline(None, "", steps=kept), to_run
+
+
+def build_response(sid: str, steps: Dict) -> Dict:
+    labeled = steps["labeling"]["utterances"]
+    metrics = steps["metrics"]["metrics"]
+    coach_report = steps["coach_analysis"]["report"]
+    tier_step = steps["tier_prompts"]
+    # Peaks are served by /sessions/{sid}/peaks rather than inlined in the response.
+    lean = {"tier_prompts": {k: v for k, v in tier_step.items() if k != "transcript"}}
+    if "waveform" in steps:
+        lean["waveform"] = {k: v for k, v in steps["waveform"].items() if k != "peaks"}
+    return {
+        "session_id": sid,
+        "duration_sec": metrics.get("class_duration_sec", labeled[-1]["end"] if labeled else 0.0),
+        "steps": {**steps, **lean},
+        "metrics": {k: v for k, v in metrics.items() if k not in ("timeline", "timelines")},
+        "timeline": metrics.get("timeline", []),
+        "timelines": metrics.get("timelines", {}),
+        "coach_report": coach_report,
+        "tier_analysis": {"transcript": tier_step.get("transcript", ""), "results": tier_step.get("results", [])},
+    }
+
+
+# Step fields that duplicate a standalone artifact file; stripped from steps.json.
+_SPLIT_FIELDS = {
+    "labeling": ("utterances", "utterances.json"),
+    "metrics": ("metrics", "metrics.json"),
+    "coach_analysis": ("report", "coach_report.json"),
+    "waveform": ("peaks", "waveform.json"),
+}
+
+
+def _write_results(sid: str, steps: Dict) -> None:
+    stored = {}
+    for name, step in steps.items():
+        split = _SPLIT_FIELDS.get(name)
+        if split:
+            field, filename = split
+            storage.write_json(sid, filename, step[field])
+            step = {k: v for k, v in step.items() if k != field}
+        stored[name] = step
+    storage.write_json(sid, "steps.json", stored)
+    if "metrics" in steps:
+        analytics.record_session(sid, steps["metrics"]["metrics"])
+
+
+def save_results(sid: str, steps: Dict, background: bool = False) -> None:
+    """
+    Store a session's artifacts. With `background`, serialization, compression and
+    disk writes happen on the storage writer threads; `steps` must not be modified afterwards.
+    """
+    if not CFG.store_results:
+        return
+    if background:
+        storage.submit(sid, _write_results, sid, steps)
+    else:
+        _write_results(sid, steps)
+
+
+def load_results(sid: str) -> Optional[Dict]:
+    """Rebuild the `steps` dict saved by `save_results`, or None for unknown/legacy sessions."""
+    stored = storage.read_json(sid, "steps.json")
+    if stored is None:
+        return None
+    steps = {}
+    for name, step in stored.items():
+        split = _SPLIT_FIELDS.get(name)
+        if split:
+            field, filename = split
+            step = {**step, field: storage.read_json(sid, filename)}
+        steps[name] = step
+    return steps
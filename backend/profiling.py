@@ -0,0 +1,192 @@
+"""
+Opt-in per-request profiler for the `/process` pipeline.
+
+Two CPU modes are supported:
+  - "sample": a background thread samples the pipeline thread's stack every
+    `interval_ms` and aggregates collapsed stacks (flamegraph.pl / speedscope
+    format) plus self/inclusive sample counts per function.
+  - "cprofile": deterministic `cProfile` per stage, reported as the top
+    functions by own time.
+
+In both modes every stage also reports wall/CPU time, RSS at start/end, the
+peak RSS seen by the sampler, and tracemalloc allocation deltas with the top
+allocating lines. tracemalloc is process-wide, so allocations from concurrent
+requests leak into the numbers; only one profiled request runs at a time.
+"""
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter as Tally
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+MODES = ("sample", "cprofile")
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_ACTIVE = threading.Lock()
+
+
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is the lifetime peak (KiB on Linux); the best we have without /proc.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _mb(n: float) -> float:
+    return round(n / (1024 * 1024), 2)
+
+
+def _frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+
+
+class StageProfiler:
+    def __init__(self, mode: str = "sample", interval_ms: float = 5.0, top_n: int = 25):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}; expected one of {', '.join(MODES)}")
+        self.mode = mode
+        self.interval = max(interval_ms, 0.5) / 1000.0
+        self.top_n = top_n
+        self.stages: Dict[str, Dict] = {}
+        self._thread_id: Optional[int] = None
+        self._stage: Optional[str] = None
+        self._stacks: Dict[str, Tally] = {}
+        self._rss_peak: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started_tracemalloc = False
+
+    # ---------- lifecycle ----------
+    def start(self) -> "StageProfiler":
+        if not _ACTIVE.acquire(blocking=False):
+            raise RuntimeError("Another profiled request is already running.")
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(1)
+            self._started_tracemalloc = True
+        self._thread_id = threading.get_ident()
+        self._sampler = threading.Thread(target=self._sample_loop, name="stage-profiler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        _ACTIVE.release()
+
+    def __enter__(self) -> "StageProfiler":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # ---------- sampling ----------
+    def _sample_loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            stage = self._stage
+            if stage is None:
+                continue
+            rss = current_rss_bytes()
+            if rss > self._rss_peak.get(stage, 0):
+                self._rss_peak[stage] = rss
+            if self.mode != "sample":
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            stack: List[str] = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self._stacks.setdefault(stage, Tally())[";".join(reversed(stack))] += 1
+
+    def _sample_report(self, stage: str) -> Dict:
+        stacks = self._stacks.get(stage, Tally())
+        own: Tally = Tally()
+        inclusive: Tally = Tally()
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for fn in set(frames):
+                inclusive[fn] += count
+        total = sum(stacks.values()) or 1
+        top = [
+            {"function": fn, "self_samples": n, "self_pct": round(100.0 * n / total, 1),
+             "inclusive_samples": inclusive[fn], "inclusive_pct": round(100.0 * inclusive[fn] / total, 1)}
+            for fn, n in own.most_common(self.top_n)
+        ]
+        collapsed = [f"{stack} {count}" for stack, count in stacks.most_common()]
+        return {"samples": sum(stacks.values()), "top_functions": top, "collapsed": collapsed}
+
+    def _cprofile_report(self, prof: cProfile.Profile) -> Dict:
+        stats = pstats.Stats(prof)
+        rows = []
+        for (filename, line, name), (cc, nc, tt, ct, _callers) in stats.stats.items():
+            rows.append({
+                "function": f"{os.path.basename(filename)}:{name}:{line}",
+                "ncalls": nc,
+                "tottime_ms": round(tt * 1000, 3),
+                "cumtime_ms": round(ct * 1000, 3),
+            })
+        rows.sort(key=lambda r: r["tottime_ms"], reverse=True)
+        return {"top_functions": rows[: self.top_n]}
+
+    # ---------- per-stage measurement ----------
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        prof = cProfile.Profile() if self.mode == "cprofile" else None
+        rss_start = current_rss_bytes()
+        self._rss_peak[name] = rss_start
+        snap_before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        traced_before, _ = tracemalloc.get_traced_memory()
+        wall0, cpu0 = time.perf_counter(), time.thread_time()
+        self._stage = name
+        if prof is not None:
+            prof.enable()
+        try:
+            yield
+        finally:
+            if prof is not None:
+                prof.disable()
+            self._stage = None
+            wall_ms = (time.perf_counter() - wall0) * 1000
+            cpu_ms = (time.thread_time() - cpu0) * 1000
+            traced_after, traced_peak = tracemalloc.get_traced_memory()
+            snap_after = tracemalloc.take_snapshot()
+            rss_end = current_rss_bytes()
+            top_allocs = [
+                {"where": str(stat.traceback[0]), "size_diff_kb": round(stat.size_diff / 1024, 1),
+                 "count_diff": stat.count_diff}
+                for stat in snap_after.compare_to(snap_before, "lineno")[:10]
+            ]
+            entry = {
+                "wall_ms": round(wall_ms, 2),
+                "cpu_ms": round(cpu_ms, 2),
+                "rss_start_mb": _mb(rss_start),
+                "rss_end_mb": _mb(rss_end),
+                "rss_peak_mb": _mb(max(self._rss_peak.get(name, 0), rss_end)),
+                "tracemalloc": {
+                    "allocated_delta_kb": round((traced_after - traced_before) / 1024, 1),
+                    "peak_above_start_kb": round(max(0, traced_peak - traced_before) / 1024, 1),
+                    "top_allocations": top_allocs,
+                },
+            }
+            entry.update(self._cprofile_report(prof) if prof is not None else self._sample_report(name))
+            self.stages[name] = entry
+
+    def report(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "interval_ms": round(self.interval * 1000, 2) if self.mode == "sample" else None,
+            "stages": self.stages,
+        }
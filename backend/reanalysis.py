@@ -0,0 +1,79 @@
+"""
+Re-run the LLM stages of a stored session under several model variants.
+
+Each variant re-labels the session's stored diarized segments (labeling plus
+its dependents, metrics and tier prompts) inside its own `use_llm_options`
+context. Variants run concurrently, so comparing N models costs about one
+variant's wall time and no Whisper or diarization work. Each summary reports
+tokens, fallbacks, stage timings, headline metrics and OHCR agreement with
+the stored labels.
+"""
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from backend.llm_options import LLMOptions, describe_llm, use_llm_options
+from backend.pipeline import build_response, rerun_stages
+
+MAX_VARIANTS = 4
+# Re-running labeling also re-runs everything downstream of it.
+REANALYSIS_STAGES = ["labeling"]
+_SUMMARY_METRICS = (
+    "ohcr_counts", "challenge_resolve_rate", "teacher_talk_pct", "student_talk_pct",
+    "beneficial_duration_pct", "kcs_score", "teacher_question_count", "student_question_count",
+)
+
+
+def variant_id(options: LLMOptions) -> str:
+    return hashlib.sha256(json.dumps(options.overrides(), sort_keys=True).encode("utf-8")).hexdigest()[:8]
+
+
+def _usage(steps: Dict) -> Dict:
+    metas = [steps.get("coach_analysis", {}).get("meta") or {}]
+    metas += [r.get("meta") or {} for r in steps.get("tier_prompts", {}).get("results", [])]
+    return {
+        "llm_calls": len(metas),
+        "prompt_tokens": sum(m.get("ptoks") or 0 for m in metas),
+        "completion_tokens": sum(m.get("ctoks") or 0 for m in metas),
+        "fallbacks": sum(1 for m in metas if m.get("source") == "fallback"),
+    }
+
+
+def ohcr_agreement(reference: List[Dict], candidate: List[Dict]) -> Optional[float]:
+    """Share of utterances given the same OHCR label by both runs (None when not comparable)."""
+    if not reference or len(reference) != len(candidate):
+        return None
+    same = sum(1 for a, b in zip(reference, candidate) if a.get("ohcr") == b.get("ohcr"))
+    return round(same / len(reference), 3)
+
+
+def run_variant(sid: str, steps: Dict, options: LLMOptions) -> Tuple[Dict, Optional[Dict]]:
+    """Return (summary, full response) for one variant; the response is None if it failed."""
+    t0 = time.perf_counter()
+    with use_llm_options(options):
+        summary = {"variant_id": variant_id(options), "llm": describe_llm()}
+        try:
+            new_steps, ran = rerun_stages(steps, REANALYSIS_STAGES)
+        except Exception as err:
+            summary.update({"status": "failed", "error": f"{type(err).__name__}: {err}",
+                            "duration_ms": int((time.perf_counter() - t0) * 1000)})
+            return summary, None
+    metrics = new_steps["metrics"]["metrics"]
+    summary.update({
+        "status": "completed",
+        "duration_ms": int((time.perf_counter() - t0) * 1000),
+        "stage_ms": {name: new_steps[name].get("duration_ms", 0) for name in ran},
+        "usage": _usage(new_steps),
+        "metrics": {key: metrics.get(key) for key in _SUMMARY_METRICS},
+        "ohcr_agreement": ohcr_agreement(steps["labeling"]["utterances"], new_steps["labeling"]["utterances"]),
+    })
+    return summary, build_response(sid, new_steps)
+
+
+def reanalyze(sid: str, steps: Dict, variants: List[LLMOptions]) -> List[Tuple[Dict, Optional[Dict]]]:
+    """Run every variant concurrently; results come back in request order."""
+    with ThreadPoolExecutor(max_workers=max(1, len(variants)), thread_name_prefix="reanalyze") as pool:
+        futures = [pool.submit(run_variant, sid, steps, options) for options in variants]
+        return [f.result() for f in futures]
@@ -0,0 +1,363 @@
+"""
+Session artifact storage.
+
+Artifacts are serialized, compressed (`RESULTS_CODEC`: gzip by default, zstd
+when the `zstandard` package is installed, or none) and stored once under
+`<results>/blobs/<digest[:2]>/<digest>.json.<ext>`, addressed by the sha256
+of their JSON. A session directory only holds small `<name>.ref` pointers, so
+re-runs that reproduce an artifact reuse its blob. Every file is written to a
+temporary name and renamed into place, so readers never see partial writes.
+
+`submit` runs writes on a background thread pool, off the request path;
+reads for a session first wait for its pending writes. Plain `<name>` JSON
+files from before this layout are still read, and
+`python -m backend.storage compact` converts them. Blobs are kept when a
+pointer is overwritten or deleted (others may share them);
+`python -m backend.storage gc` removes the ones no pointer refers to.
+"""
+import argparse
+import atexit
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from backend.config import CFG
+
+log = logging.getLogger(__name__)
+
+_SID_RE = re.compile(r"^[0-9a-f]{8}$")
+_REF_SUFFIX = ".ref"
+_CODECS = {"gzip": "gz", "zstd": "zst", "none": "raw"}
+# A blob is written just before the pointer to it; younger unreferenced blobs may be in flight.
+GC_GRACE_SEC = 3600.0
+
+
+def valid_sid(sid: str) -> bool:
+    return bool(_SID_RE.match(sid or ""))
+
+
+def session_dir(sid: str) -> str:
+    return os.path.join(CFG.results_dir, sid)
+
+
+def session_exists(sid: str) -> bool:
+    return os.path.isdir(session_dir(sid))
+
+
+def _blob_dir() -> str:
+    return os.path.join(CFG.results_dir, "blobs")
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+# ---------- codecs ----------
+def _codec() -> str:
+    codec = CFG.results_codec
+    if codec == "zstd":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            log.warning("RESULTS_CODEC=zstd but the zstandard package is not installed; using gzip")
+            return "gzip"
+    return codec if codec in _CODECS else "gzip"
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        # mtime=0 keeps the output deterministic for identical content.
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if codec == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return data
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def _blob_path(digest: str, codec: str) -> str:
+    return os.path.join(_blob_dir(), digest[:2], f"{digest}.json.{_CODECS[codec]}")
+
+
+# ---------- artifacts ----------
+def write_json(sid: str, name: str, value: Any, compress: bool = True) -> None:
+    """Store `value` as artifact `name` of `sid`; `compress=False` writes a plain file (for transient data)."""
+    out_dir = session_dir(sid)
+    os.makedirs(out_dir, exist_ok=True)
+    data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+    if not compress:
+        _atomic_write(os.path.join(out_dir, name), data)
+        return
+    codec = _codec()
+    digest = hashlib.sha256(data).hexdigest()
+    blob = _blob_path(digest, codec)
+    try:
+        # Reusing a blob restarts its `gc` grace period, which covers the pointer write below.
+        os.utime(blob)
+    except FileNotFoundError:
+        _atomic_write(blob, _compress(data, codec))
+    ref = {"blob": digest, "codec": codec, "bytes": len(data)}
+    _atomic_write(os.path.join(out_dir, name + _REF_SUFFIX), json.dumps(ref).encode("utf-8"))
+    if not os.path.exists(blob):
+        # A `gc` that judged the blob before the utime above may still have removed it.
+        _atomic_write(blob, _compress(data, codec))
+    # The pointer takes precedence on read; a legacy plain copy would only take space.
+    legacy = os.path.join(out_dir, name)
+    if os.path.exists(legacy):
+        os.unlink(legacy)
+
+
+def _read_ref(path: str) -> Optional[Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_json(sid: str, name: str) -> Optional[Any]:
+    wait(sid)
+    out_dir = session_dir(sid)
+    ref = _read_ref(os.path.join(out_dir, name + _REF_SUFFIX))
+    if ref is not None:
+        try:
+            with open(_blob_path(ref["blob"], ref["codec"]), "rb") as f:
+                return json.loads(_decompress(f.read(), ref["codec"]).decode("utf-8"))
+        except (OSError, KeyError, ValueError) as e:
+            log.error("Artifact %s of session %s points to an unreadable blob (%s); treating it as missing", name, sid, e)
+            return None
+    path = os.path.join(out_dir, name)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _artifact_file(sid: str, name: str) -> Optional[str]:
+    for path in (os.path.join(session_dir(sid), name + _REF_SUFFIX), os.path.join(session_dir(sid), name)):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def exists(sid: str, name: str) -> bool:
+    wait(sid)
+    return _artifact_file(sid, name) is not None
+
+
+def mtime(sid: str, name: str) -> Optional[float]:
+    """When artifact `name` was last written, or None if it does not exist."""
+    wait(sid)
+    path = _artifact_file(sid, name)
+    return os.path.getmtime(path) if path else None
+
+
+def delete(sid: str, name: str) -> None:
+    """Remove the artifact's pointer (or plain file); blobs may be shared and are kept."""
+    wait(sid)
+    for path in (os.path.join(session_dir(sid), name + _REF_SUFFIX), os.path.join(session_dir(sid), name)):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+# ---------- background writes ----------
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_PENDING: Dict[str, List[Future]] = {}
+_LOCK = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max(1, CFG.storage_writers), thread_name_prefix="storage")
+            atexit.register(flush)
+        return _EXECUTOR
+
+
+def _done(sid: str, future: Future) -> None:
+    with _LOCK:
+        pending = _PENDING.get(sid, [])
+        if future in pending:
+            pending.remove(future)
+        if not pending:
+            _PENDING.pop(sid, None)
+    if future.exception() is not None:
+        log.error("Background write for session %s failed", sid, exc_info=future.exception())
+
+
+def submit(sid: str, fn: Callable[..., Any], *args: Any) -> Future:
+    """
+    Run `fn(*args)` on the storage thread pool. The session directory exists when this
+    returns, and reads of `sid` wait for the write. `fn` must not share mutable state
+    with code that keeps running, so callers hand over values they no longer modify.
+    """
+    os.makedirs(session_dir(sid), exist_ok=True)
+    future = _executor().submit(fn, *args)
+    with _LOCK:
+        _PENDING.setdefault(sid, []).append(future)
+    future.add_done_callback(lambda f: _done(sid, f))
+    return future
+
+
+def write_json_async(sid: str, name: str, value: Any) -> Future:
+    return submit(sid, write_json, sid, name, value)
+
+
+def wait(sid: str) -> None:
+    with _LOCK:
+        pending = list(_PENDING.get(sid, []))
+    for future in pending:
+        try:
+            future.result()
+        except Exception:
+            pass  # logged by _done; the reader sees whatever is on disk
+
+
+def flush() -> None:
+    """Wait for every pending background write."""
+    with _LOCK:
+        sids = list(_PENDING)
+    for sid in sids:
+        wait(sid)
+
+
+# ---------- maintenance ----------
+def compact(results_dir: str) -> Dict[str, int]:
+    """Move legacy plain `*.json` artifacts of every session into the blob store."""
+    stats = {"files": 0, "bytes_before": 0, "bytes_after": 0}
+    for sid in sorted(os.listdir(results_dir)):
+        if not valid_sid(sid):
+            continue
+        for name in sorted(os.listdir(session_dir(sid))):
+            path = os.path.join(session_dir(sid), name)
+            # Batch checkpoints are transient and stay plain.
+            if not name.endswith(".json") or name.startswith("checkpoint_") or not os.path.isfile(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            stats["bytes_before"] += os.path.getsize(path)
+            write_json(sid, name, value)
+            ref = _read_ref(os.path.join(session_dir(sid), name + _REF_SUFFIX))
+            stats["bytes_after"] += os.path.getsize(_blob_path(ref["blob"], ref["codec"]))
+            stats["files"] += 1
+    return stats
+
+
+def _referenced_blobs(results_dir: str) -> Set[str]:
+    """Paths of every blob some `.ref` pointer under `results_dir` refers to."""
+    blob_dir = os.path.join(results_dir, "blobs")
+    referenced: Set[str] = set()
+    for entry in os.scandir(results_dir):
+        if not entry.is_dir() or entry.path == blob_dir:
+            continue
+        for name in os.listdir(entry.path):
+            if not name.endswith(_REF_SUFFIX):
+                continue
+            ref = _read_ref(os.path.join(entry.path, name))
+            if ref and ref.get("codec") in _CODECS:
+                referenced.add(os.path.join(blob_dir, ref["blob"][:2], f"{ref['blob']}.json.{_CODECS[ref['codec']]}"))
+    return referenced
+
+
+def gc(results_dir: str, grace_sec: float = GC_GRACE_SEC, dry_run: bool = False) -> Dict[str, int]:
+    """Delete blobs no pointer refers to, sparing those written in the last `grace_sec` seconds."""
+    stats = {"blobs": 0, "deleted": 0, "bytes_freed": 0, "recent": 0}
+    blob_dir = os.path.join(results_dir, "blobs")
+    if not os.path.isdir(blob_dir):
+        return stats
+    flush()  # this process's queued writes land before pointers are read
+    referenced = _referenced_blobs(results_dir)
+    cutoff = time.time() - grace_sec
+    blob_exts = tuple(f".json.{ext}" for ext in _CODECS.values())
+    for prefix in sorted(os.listdir(blob_dir)):
+        directory = os.path.join(blob_dir, prefix)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not name.endswith(blob_exts):
+                continue  # e.g. a temporary file of a write in progress
+            stats["blobs"] += 1
+            if path in referenced:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_mtime > cutoff:
+                stats["recent"] += 1
+                continue
+            stats["deleted"] += 1
+            stats["bytes_freed"] += st.st_size
+            if not dry_run:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+        if not dry_run:
+            try:
+                os.rmdir(directory)  # only succeeds once the prefix directory is empty
+            except OSError:
+                pass
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Maintain stored session artifacts.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("compact", help="Compress legacy plain JSON artifacts into the blob store.")
+    cmd = sub.add_parser("gc", help="Delete blobs no session artifact points to (left behind by re-runs).")
+    cmd.add_argument("--grace-sec", type=float, default=GC_GRACE_SEC,
+                     help="Keep unreferenced blobs younger than this, as their pointer may not be written yet.")
+    cmd.add_argument("--dry-run", action="store_true", help="Only report what would be deleted.")
+    args = parser.parse_args()
+
+    if not os.path.isdir(CFG.results_dir):
+        print(f"No results directory at {CFG.results_dir}", file=sys.stderr)
+        return 2
+    if args.command == "gc":
+        stats = gc(CFG.results_dir, args.grace_sec, args.dry_run)
+        verb = "Would delete" if args.dry_run else "Deleted"
+        print(f"{verb} {stats['deleted']} of {stats['blobs']} blob(s), {stats['bytes_freed']} bytes; "
+              f"kept {stats['recent']} unreferenced blob(s) younger than {args.grace_sec:g} s")
+        return 0
+    stats = compact(CFG.results_dir)
+    print(f"Compacted {stats['files']} artifact(s): {stats['bytes_before']} -> {stats['bytes_after']} bytes "
+          "(shared blobs are counted once per artifact)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
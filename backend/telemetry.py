@@ -0,0 +1,230 @@
+"""
+In-process metrics registry rendered in the Prometheus text format at `/metrics`.
+
+Values live in the memory of the process that records them, so with several
+uvicorn workers each worker reports its own series (scrape them individually
+or aggregate with `sum by`).
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+LabelKey = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Sample lines of the exposition, after the HELP and TYPE lines."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[LabelKey, List[float]] = {}  # bucket counts..., sum, count
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def count(self, **labels: str) -> float:
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0.0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                le = ("le", _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(count)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(series[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "profess_stage_duration_seconds", "Wall-clock time of each pipeline stage.", ["stage"]))
+STAGE_FAILURES = REGISTRY.register(Counter(
+    "profess_stage_failures_total", "Pipeline stages that raised.", ["stage"]))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "profess_cache_requests_total", "LLM cache lookups by payload namespace and result.", ["namespace", "result"]))
+LLM_RETRIES = REGISTRY.register(Counter(
+    "profess_llm_retries_total", "Failed LLM attempts that were retried.", ["component"]))
+LLM_FALLBACKS = REGISTRY.register(Counter(
+    "profess_llm_fallbacks_total", "LLM calls that gave up and returned fallback output.", ["component"]))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "profess_llm_tokens_total", "Tokens reported by the API for uncached LLM calls.", ["component", "kind"]))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "profess_http_requests_in_flight", "HTTP requests currently being served.", ["route"]))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "profess_http_request_duration_seconds", "HTTP request latency.", ["route", "method", "status"]))
+
+LOCAL_LABELS = REGISTRY.register(Counter(
+    "profess_local_labels_total", "Utterances seen by the local classifier cascade, by outcome.", ["result"]))
+
+STAGE_DEGRADATIONS = REGISTRY.register(Counter(
+    "profess_stage_degradations_total", "Stage outputs cut back to fit a request's latency budget.", ["stage", "reason"]))
+
+OPENAI_FIXTURES = REGISTRY.register(Counter(
+    "profess_openai_fixture_calls_total", "OpenAI calls recorded to or replayed from fixtures.", ["endpoint", "result"]))
+
+LIVE_SESSIONS = REGISTRY.register(Gauge(
+    "profess_live_sessions", "Open live-classroom WebSocket sessions."))
+LIVE_ANALYSIS_SECONDS = REGISTRY.register(Histogram(
+    "profess_live_analysis_duration_seconds", "Time of one rolling live-mode analysis step."))
+LIVE_DROPPED_SECONDS = REGISTRY.register(Counter(
+    "profess_live_dropped_audio_seconds_total", "Live audio skipped because analysis fell behind."))
+
+
+def record_llm_usage(component: str, meta: Optional[Dict]) -> None:
+    """Add the `ptoks`/`ctoks` of a fresh (uncached) LLM response to the token counters."""
+    if not meta:
+        return
+    for field, kind in (("ptoks", "prompt"), ("ctoks", "completion")):
+        value = meta.get(field)
+        if isinstance(value, (int, float)) and value > 0:
+            LLM_TOKENS.inc(value, component=component, kind=kind)
+
+
+def render() -> str:
+    return REGISTRY.render()
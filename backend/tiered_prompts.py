@@ -2,13 +2,15 @@ import json
 import time
 from typing import Dict, List, Tuple
 
-from openai import OpenAI
-
-from backend.cache import SQLiteCache
+from backend.cache import get_cache
 from backend.config import CFG
+from backend.deadline import TIER_MIN_SEC, call_timeout, has_time, retry_pause
+from backend.openai_client import bounded, has_openai, make_client
+from backend.llm_options import active_depth, cache_fields, llm_params
+from backend.telemetry import LLM_FALLBACKS, LLM_RETRIES, record_llm_usage
 
-client = OpenAI(api_key=CFG.openai_api_key)
-cache = SQLiteCache(CFG.cache_db)
+client = make_client()
+cache = get_cache("tier_prompts")
 
 TIER_OUTPUT_SCHEMA = {
     "name": "tiered_prompt_output",
@@ -738,6 +740,66 @@ Perform the Tier 3 analysis following steps A–F and output **SECTION 1–5** i
 ]
 
 
+# Lean depths: summary plus short bullet sections, no tables or quoted examples.
+TIER_COMPACT_SCHEMA = {
+    "name": "tiered_prompt_output",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "summary": {"type": "string"},
+            "sections": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "title": {"type": "string"},
+                        "bullets": {"type": "array", "items": {"type": "string"}},
+                    },
+                    "required": ["title", "bullets"],
+                },
+            },
+            "reliability_flags": {"type": "array", "items": {"type": "string"}},
+        },
+        "required": ["summary", "sections", "reliability_flags"],
+        "additionalProperties": False,
+    },
+    "strict": True,
+}
+
+# Appended to each tier prompt at "standard" depth.
+_BREVITY_SUFFIX = """
+
+LENGTH LIMITS (these override the output format above): return JSON with `summary` (at most 2
+sentences), at most 3 `sections` of at most 4 short bullets each, and at most 3 `reliability_flags`.
+No paragraphs, tables or quoted examples."""
+
+# The single tier run at "fast" depth.
+QUICK_LOOK_PROMPT = {
+    "id": "quick_look",
+    "title": "Quick Look",
+    "description": "Participation, questioning and OHCR flow at a glance.",
+    "prompt": """You are an expert classroom discourse analyst. Give a quick look at the labelled class transcript below.
+
+Return JSON with:
+- `summary`: at most 2 sentences on how the discussion went;
+- `sections`: one section titled "Quick Look" with at most 5 short bullets covering participation balance (teacher vs students), who asks questions and of what kind, and whether any Observe → Hypothesize → Challenge → Resolve sequence occurred;
+- `reliability_flags`: only clear data problems (e.g. unlabelled speakers, truncated transcript), otherwise empty.
+
+TRANSCRIPT STARTS BELOW:
+
+{transcript}""",
+}
+
+
+def tiers_for_depth(depth: str) -> Tuple[List[Dict], Dict, str]:
+    """(tiers, output schema, prompt suffix) run at `depth`."""
+    if depth == "fast":
+        return [QUICK_LOOK_PROMPT], TIER_COMPACT_SCHEMA, ""
+    if depth == "standard":
+        return TIER_PROMPTS, TIER_COMPACT_SCHEMA, _BREVITY_SUFFIX
+    return TIER_PROMPTS, TIER_OUTPUT_SCHEMA, ""
+
+
 def _expand_prompt(prompt: str, transcript: str) -> str:
     return prompt.replace("{transcript}", transcript)
 
@@ -788,36 +850,37 @@ def _default_structured_output(message: str) -> Dict:
     }
 
 
-def _call_prompt(full_prompt: str) -> Tuple[Dict, Dict]:
-    if not CFG.use_llm or not CFG.openai_api_key:
+_TIER_DEFAULTS = {"temperature": 0.2, "top_p": 0.9}
+
+
+def _call_prompt(full_prompt: str, schema: Dict = TIER_OUTPUT_SCHEMA, depth: str = "full") -> Tuple[Dict, Dict]:
+    if not CFG.use_llm or not has_openai():
         return (
             _default_structured_output("LLM disabled or API key missing. Unable to run tiered prompt."),
             {"source": "fallback", "reason": "llm_disabled_or_missing_key"},
         )
 
+    params = llm_params(**_TIER_DEFAULTS)
+
     def _compute():
         last_err = None
         for attempt in range(3):
             try:
                 if getattr(client, "responses", None):
-                    response = client.responses.create(
-                        model=CFG.llm_model,
-                        temperature=0.2,
-                        top_p=0.9,
+                    response = bounded(client).responses.create(
+                        **params,
                         input=[{"role": "user", "content": [{"type": "text", "text": full_prompt}]}],
-                        response_format={"type": "json_schema", "json_schema": TIER_OUTPUT_SCHEMA},
-                        timeout=90,
+                        response_format={"type": "json_schema", "json_schema": schema},
+                        timeout=call_timeout(90),
                     )
                     text = response.output[0].content[0].text
                     usage = getattr(response, "usage", None)
                 else:
-                    resp = client.chat.completions.create(
-                        model=CFG.llm_model,
-                        temperature=0.2,
-                        top_p=0.9,
+                    resp = bounded(client).chat.completions.create(
+                        **params,
                         messages=[{"role": "user", "content": full_prompt}],
-                        response_format={"type": "json_schema", "json_schema": TIER_OUTPUT_SCHEMA},
-                        timeout=90,
+                        response_format={"type": "json_schema", "json_schema": schema},
+                        timeout=call_timeout(90),
                     )
                     text = (resp.choices[0].message.content or "").strip()
                     usage = getattr(resp, "usage", None)
@@ -832,11 +895,15 @@ def _call_prompt(full_prompt: str) -> Tuple[Dict, Dict]:
                         "ctoks": getattr(usage, "completion_tokens", None),
                     }
                 meta.setdefault("source", "llm")
+                record_llm_usage("tier_prompts", meta)
                 return data, meta
             except Exception as err:
                 last_err = err
-                time.sleep(0.8 * (attempt + 1))
+                if attempt == 2 or not retry_pause(0.8 * (attempt + 1)):
+                    break
+                LLM_RETRIES.inc(component="tier_prompts")
 
+        LLM_FALLBACKS.inc(component="tier_prompts")
         message = f"Unable to complete analysis due to repeated errors: {last_err}"
         return (
             _default_structured_output(message),
@@ -845,20 +912,29 @@ def _call_prompt(full_prompt: str) -> Tuple[Dict, Dict]:
 
     payload = {
         "v": "tier_prompts_v2",
-        "model": CFG.llm_model,
+        **cache_fields(params, **_TIER_DEFAULTS),
         "prompt_body": full_prompt,
     }
+    if depth != "full":
+        payload["depth"] = depth
     return cache.get_or_set(payload, _compute)
 
 
 def run_tiered_prompts(utterances: List[Dict]) -> Dict:
     transcript = _format_transcript(utterances)
+    depth = active_depth()
+    tiers, schema, suffix = tiers_for_depth(depth)
     results = []
+    skipped = []
 
-    for tier in TIER_PROMPTS:
-        prompt = _expand_prompt(tier["prompt"], transcript)
+    for tier in tiers:
+        # Tiers are the first thing dropped when the request's latency budget runs short.
+        if not has_time(TIER_MIN_SEC):
+            skipped.append(tier["id"])
+            continue
+        prompt = _expand_prompt(tier["prompt"], transcript) + suffix
         start = time.perf_counter()
-        output, meta = _call_prompt(prompt)
+        output, meta = _call_prompt(prompt, schema, depth)
         duration_ms = int((time.perf_counter() - start) * 1000)
         results.append(
             {
@@ -871,4 +947,4 @@ def run_tiered_prompts(utterances: List[Dict]) -> Dict:
             }
         )
 
-    return {"transcript": transcript, "results": results}
+    return {"transcript": transcript, "results": results, "skipped": skipped}
@@ -1,16 +1,23 @@
-from openai import OpenAI
-import io, os
-from typing import Tuple, Dict, Any
+import io
+from typing import Any, BinaryIO, Dict, Tuple
 
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+from backend.deadline import call_timeout
+from backend.openai_client import bounded, make_client
+
+client = make_client()
 
 def transcribe_audio_bytes(audio_bytes: bytes, filename: str = "audio.wav") -> Tuple[str, Dict[str, Any]]:
     f = io.BytesIO(audio_bytes); f.name = filename
-    resp = client.audio.transcriptions.create(
+    return transcribe_audio_file(f, filename)
+
+def transcribe_audio_file(f: BinaryIO, filename: str = "audio.wav") -> Tuple[str, Dict[str, Any]]:
+    """Transcribe from an open binary file; the HTTP client streams it instead of copying it into memory."""
+    resp = bounded(client).audio.transcriptions.create(
         model="whisper-1",
-        file=f,
+        file=(filename, f),
         response_format="verbose_json",
-        temperature=0
+        temperature=0,
+        timeout=call_timeout(600),  # the SDK's default, cut to the request's budget
     )
     data = resp.model_dump() if hasattr(resp, "model_dump") else resp
     return (data.get("text", ""), data)
@@ -0,0 +1,149 @@
+"""
+Time-range queries over a session's labelled utterances.
+
+`UtteranceIndex` keeps utterance starts sorted alongside a running maximum of
+their ends, plus per-OHCR, per-role and per-(OHCR, role) position lists. A
+query for the utterances overlapping [t0, t1) with optional label filters is a
+few binary searches plus the page itself, O(log n + k), and the total match
+count comes without materializing the matches.
+
+Indexes of recently queried sessions are kept in memory and rebuilt when the
+session's `utterances.json` changes (e.g. after a rerun).
+"""
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from backend import storage
+
+OHCR_LABELS = ("O", "H", "C", "R", "None")
+_INDEX_CACHE_SIZE = 32
+
+
+class UtteranceIndex:
+    def __init__(self, utterances: Sequence[Dict]):
+        # Stored utterances are in time order; sort defensively so bisect stays valid.
+        order = sorted(range(len(utterances)), key=lambda i: float(utterances[i].get("start", 0.0)))
+        self.utterances = [utterances[i] for i in order]
+        self.positions = order  # index of each sorted utterance in the stored list
+        self.starts = [float(u.get("start", 0.0)) for u in self.utterances]
+        self.ends = [float(u.get("end", 0.0)) for u in self.utterances]
+        self.max_end: List[float] = []
+        running = float("-inf")
+        for end in self.ends:
+            running = max(running, end)
+            self.max_end.append(running)
+        self._by_key: Dict[Tuple[Optional[str], Optional[str]], List[int]] = {}
+        for pos, u in enumerate(self.utterances):
+            ohcr, role = str(u.get("ohcr") or "None"), str(u.get("role") or "unknown").lower()
+            for key in ((ohcr, None), (None, role), (ohcr, role)):
+                self._by_key.setdefault(key, []).append(pos)
+
+    def __len__(self) -> int:
+        return len(self.utterances)
+
+    def _lists(self, ohcr: Optional[Iterable[str]], role: Optional[Iterable[str]]) -> Optional[List[List[int]]]:
+        """Position lists whose union is the filter's matches (None = no filter)."""
+        ohcrs, roles = list(ohcr or []) or [None], list(role or []) or [None]
+        if ohcrs == [None] and roles == [None]:
+            return None
+        return [self._by_key.get((o, r), []) for o in ohcrs for r in roles]
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None,
+              ohcr: Optional[Iterable[str]] = None, role: Optional[Iterable[str]] = None,
+              offset: int = 0, limit: int = 100) -> Tuple[int, List[Tuple[int, Dict]]]:
+        """
+        (total, page) of utterances overlapping [start, end) that match the filters, in time order.
+        Page items are (position in the stored list, utterance).
+        """
+        t0 = float("-inf") if start is None else start
+        t1 = float("inf") if end is None else end
+        if t1 <= t0:
+            return 0, []
+        # Candidates start before t1 and are not wholly before t0. Everything starting at or
+        # after t0 overlaps; only the few that start before t0 need their own end checked.
+        lo = bisect_right(self.max_end, t0)
+        mid = max(lo, bisect_left(self.starts, t0))
+        hi = max(mid, bisect_left(self.starts, t1))
+
+        lists = self._lists(ohcr, role)
+        if lists is None:
+            lists = [range(len(self.utterances))]
+        straddling: List[int] = []
+        spans: List[Tuple[Sequence[int], int, int]] = []
+        for positions in lists:
+            a, m, b = bisect_left(positions, lo), bisect_left(positions, mid), bisect_left(positions, hi)
+            straddling.extend(p for p in positions[a:m] if self.ends[p] > t0)
+            spans.append((positions, m, b))
+        straddling.sort()
+        total = len(straddling) + sum(b - m for _, m, b in spans)
+
+        page: List[int] = []
+        skip = max(0, offset)
+        take = max(0, limit)
+        head = straddling[skip:skip + take]
+        page.extend(head)
+        skip = max(0, skip - len(straddling))
+        if len(page) < take:
+            page.extend(self._merged_slice(spans, skip, take - len(page)))
+        return total, [(self.positions[p], self.utterances[p]) for p in page]
+
+    @staticmethod
+    def _merged_slice(spans: List[Tuple[Sequence[int], int, int]], skip: int, take: int) -> List[int]:
+        if len(spans) == 1:
+            positions, m, b = spans[0]
+            return list(positions[m + skip:min(b, m + skip + take)])
+        # Several label lists (e.g. ohcr=O,H): locate the k-th smallest across them by binary search
+        # on position, so deep pages do not walk the earlier ones.
+        def count_below(x: int) -> int:
+            return sum(bisect_left(positions, x, m, b) - m for positions, m, b in spans)
+
+        if skip >= sum(b - m for _, m, b in spans):
+            return []
+        lo_pos = min(positions[m] for positions, m, b in spans if m < b)
+        hi_pos = max(positions[b - 1] for positions, m, b in spans if m < b) + 1
+        left, right = lo_pos, hi_pos
+        while left < right:
+            mid = (left + right) // 2
+            if count_below(mid) <= skip:
+                left = mid + 1
+            else:
+                right = mid
+        first = left - 1  # smallest position with `skip` matches before it
+        out: List[int] = []
+        cursors = [bisect_left(positions, first, m, b) for positions, m, b in spans]
+        while len(out) < take:
+            best = None
+            for i, (positions, _, b) in enumerate(spans):
+                if cursors[i] < b and (best is None or positions[cursors[i]] < spans[best][0][cursors[best]]):
+                    best = i
+            if best is None:
+                break
+            out.append(spans[best][0][cursors[best]])
+            cursors[best] += 1
+        return out
+
+
+_CACHE: "OrderedDict[str, Tuple[float, UtteranceIndex]]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def session_index(sid: str) -> Optional[UtteranceIndex]:
+    """Index of a stored session's utterances, or None if it has none."""
+    version = storage.mtime(sid, "utterances.json")
+    if version is None:
+        return None
+    with _CACHE_LOCK:
+        cached = _CACHE.get(sid)
+        if cached and cached[0] == version:
+            _CACHE.move_to_end(sid)
+            return cached[1]
+    utterances = storage.read_json(sid, "utterances.json") or []
+    index = UtteranceIndex(utterances)
+    with _CACHE_LOCK:
+        _CACHE[sid] = (version, index)
+        _CACHE.move_to_end(sid)
+        while len(_CACHE) > _INDEX_CACHE_SIZE:
+            _CACHE.popitem(last=False)
+    return index
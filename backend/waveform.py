@@ -0,0 +1,170 @@
+"""
+Multi-resolution waveform peaks for the frontend.
+
+While a session is processed, the decoded audio is streamed once (block by
+block, so memory does not grow with recording length) into per-bucket
+min/max pairs at `CFG.waveform_peaks_per_sec`, then coarsened by
+`LEVEL_FACTOR` into a few zoom levels. Peaks are quantized to signed 8- or
+16-bit integers (`CFG.waveform_bits`) and stored base64-encoded, interleaved
+min/max, as the session's `waveform.json`.
+
+`select_peaks` returns one level for a time range in the JSON layout of
+BBC's audiowaveform tool, so the browser can draw the waveform without
+downloading or decoding the audio.
+"""
+import base64
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from backend.config import CFG
+
+FORMAT_VERSION = 1
+LEVEL_FACTOR = 4
+MAX_LEVELS = 5
+_BLOCK_PEAKS = 1024  # peaks per read, i.e. ~10 s of audio at the default resolution
+_DTYPES = {8: np.dtype("i1"), 16: np.dtype("<i2")}
+
+
+def _scale(bits: int) -> int:
+    return (1 << (bits - 1)) - 1
+
+
+def _open(audio_path: str) -> Tuple[int, Callable[[int], Iterator[np.ndarray]]]:
+    """(native sample rate, reader yielding mono float32 blocks of a given size)."""
+    import soundfile as sf
+
+    try:
+        f = sf.SoundFile(audio_path)
+    except RuntimeError:  # libsndfile cannot decode this container (m4a, webm, ...)
+        import librosa
+
+        y, sr = librosa.load(audio_path, sr=None, mono=True)
+        return sr, lambda frames: iter([np.asarray(y, dtype=np.float32)])
+
+    def read(frames: int) -> Iterator[np.ndarray]:
+        with f:
+            while True:
+                block = f.read(frames, dtype="float32", always_2d=True)
+                if not len(block):
+                    return
+                yield block.mean(axis=1)
+
+    return f.samplerate, read
+
+
+def _base_peaks(blocks: Iterator[np.ndarray], spp: int) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Per-bucket (mins, maxs) over `spp` samples, plus the total sample count."""
+    mins: List[np.ndarray] = []
+    maxs: List[np.ndarray] = []
+    carry = np.zeros(0, dtype=np.float32)
+    frames = 0
+    for block in blocks:
+        frames += len(block)
+        if carry.size:
+            block = np.concatenate([carry, block])
+        whole = len(block) // spp * spp
+        if whole:
+            rows = block[:whole].reshape(-1, spp)
+            mins.append(rows.min(axis=1))
+            maxs.append(rows.max(axis=1))
+        carry = block[whole:]
+    if carry.size:  # final partial bucket
+        mins.append(carry[None].min(axis=1))
+        maxs.append(carry[None].max(axis=1))
+    if not mins:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32), frames
+    return np.concatenate(mins), np.concatenate(maxs), frames
+
+
+def _coarsen(mins: np.ndarray, maxs: np.ndarray, factor: int) -> Tuple[np.ndarray, np.ndarray]:
+    pad = -len(mins) % factor
+    if pad:  # repeating the last bucket leaves the final min/max unchanged
+        mins = np.concatenate([mins, np.repeat(mins[-1:], pad)])
+        maxs = np.concatenate([maxs, np.repeat(maxs[-1:], pad)])
+    return mins.reshape(-1, factor).min(axis=1), maxs.reshape(-1, factor).max(axis=1)
+
+
+def _encode(mins: np.ndarray, maxs: np.ndarray, bits: int) -> str:
+    scale = _scale(bits)
+    pairs = np.empty(2 * len(mins), dtype=np.float32)
+    pairs[0::2], pairs[1::2] = mins, maxs
+    quantized = np.clip(np.round(pairs * scale), -scale, scale).astype(_DTYPES[bits])
+    return base64.b64encode(quantized.tobytes()).decode("ascii")
+
+
+def decode_level(level: Dict, bits: int) -> np.ndarray:
+    """Interleaved min/max integers of a stored level."""
+    return np.frombuffer(base64.b64decode(level["data"]), dtype=_DTYPES[bits])
+
+
+def compute_peaks(audio_path: str, peaks_per_sec: Optional[float] = None, bits: Optional[int] = None) -> Dict:
+    """Stream `audio_path` once and return its peak levels, finest first."""
+    peaks_per_sec = peaks_per_sec or CFG.waveform_peaks_per_sec
+    bits = bits or CFG.waveform_bits
+    if bits not in _DTYPES:
+        raise ValueError("bits must be 8 or 16")
+    sr, read = _open(audio_path)
+    spp = max(1, int(round(sr / peaks_per_sec)))
+    mins, maxs, frames = _base_peaks(read(spp * _BLOCK_PEAKS), spp)
+
+    levels = []
+    for i in range(MAX_LEVELS):
+        if i:
+            if len(mins) <= 1:
+                break
+            mins, maxs = _coarsen(mins, maxs, LEVEL_FACTOR)
+        levels.append({
+            "samples_per_pixel": spp * LEVEL_FACTOR ** i,
+            "length": int(len(mins)),
+            "data": _encode(mins, maxs, bits),
+        })
+    return {
+        "version": FORMAT_VERSION,
+        "sample_rate": int(sr),
+        "frames": int(frames),
+        "duration": round(frames / sr, 3) if sr else 0.0,
+        "bits": bits,
+        "levels": levels,
+    }
+
+
+def describe(waveform: Dict) -> Dict:
+    """Summary of stored peaks, without the data."""
+    return {
+        "sample_rate": waveform["sample_rate"],
+        "duration": waveform["duration"],
+        "bits": waveform["bits"],
+        "levels": [{k: v for k, v in level.items() if k != "data"} for level in waveform["levels"]],
+    }
+
+
+def select_peaks(waveform: Dict, pixels: int, start: Optional[float] = None, end: Optional[float] = None) -> Dict:
+    """
+    Peaks covering [start, end) seconds from the coarsest level that still has at least
+    `pixels` min/max pairs in that range (or the finest level if none does).
+    """
+    sr = waveform["sample_rate"]
+    t0 = max(0.0, start or 0.0)
+    t1 = min(waveform["duration"], end if end is not None else waveform["duration"])
+    span = max(0.0, t1 - t0)
+    levels = waveform["levels"]
+    level = levels[0]
+    for candidate in levels:
+        if span * sr / candidate["samples_per_pixel"] >= pixels:
+            level = candidate
+    spp = level["samples_per_pixel"]
+    first = min(level["length"], int(t0 * sr // spp))
+    last = min(level["length"], max(first, -int(-t1 * sr // spp)))
+    data = decode_level(level, waveform["bits"])[2 * first:2 * last]
+    return {
+        "version": 2,
+        "channels": 1,
+        "sample_rate": sr,
+        "samples_per_pixel": spp,
+        "bits": waveform["bits"],
+        "length": last - first,
+        "start": round(first * spp / sr, 3),
+        "duration": waveform["duration"],
+        "data": data.tolist(),
+    }
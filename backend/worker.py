@@ -0,0 +1,110 @@
+"""
+Pipeline workers for the durable job queue.
+
+Run with `python -m backend.worker --processes 2`. Each process claims jobs from
+`CFG.jobs_db`, checkpoints every finished stage and resumes interrupted jobs
+from their last completed stage.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+from dotenv import load_dotenv
+load_dotenv()
+from backend.config import CFG
+from backend.job_queue import JobQueue, LeaseLost
+
+
+def make_queue() -> JobQueue:
+    return JobQueue(CFG.jobs_db, lease_sec=CFG.job_lease_sec, max_attempts=CFG.job_max_attempts)
+
+
+def _heartbeat(queue: JobQueue, job_id: str, owner: str, stop: threading.Event) -> None:
+    # Renew the lease well before it expires so long stages (Whisper, tiers) keep ownership.
+    interval = max(queue.lease_sec / 3.0, 1.0)
+    while not stop.wait(interval):
+        try:
+            queue.heartbeat(job_id, owner)
+        except LeaseLost:
+            return
+
+
+def process_job(queue: JobQueue, job: dict, owner: str) -> None:
+    from backend.pipeline import run_pipeline, save_results
+
+    job_id = job["id"]
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(queue, job_id, owner, stop), daemon=True)
+    beat.start()
+    try:
+        steps = queue.load_stages(job_id)
+        steps = run_pipeline(
+            job["audio_path"], job["filename"], steps=steps,
+            on_stage=lambda name, output: queue.checkpoint(job_id, owner, name, output),
+        )
+        # Renewing raises LeaseLost if another worker owns the job now, so a stale
+        # worker never overwrites the session; the renewed lease covers the save.
+        queue.heartbeat(job_id, owner)
+        save_results(job_id, steps)
+        queue.complete(job_id, owner)
+    finally:
+        stop.set()
+        beat.join()
+
+
+def work_loop(owner: str, once: bool = False) -> None:
+    queue = make_queue()
+    while True:
+        job = queue.claim(owner)
+        if job is None:
+            if once:
+                return
+            time.sleep(CFG.worker_poll_sec)
+            continue
+        try:
+            process_job(queue, job, owner)
+        except LeaseLost:
+            # Another worker took over after our lease expired; drop the job silently.
+            pass
+        except Exception as err:
+            traceback.print_exc()
+            from backend.pipeline import PipelineError
+
+            try:
+                # A stage that cannot produce output (e.g. no speech) fails the same way every time.
+                queue.fail(job["id"], owner, f"{type(err).__name__}: {err}", retry=not isinstance(err, PipelineError))
+            except LeaseLost:
+                pass
+
+
+def _owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def _run(once: bool) -> None:
+    work_loop(_owner_id(), once=once)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run pipeline workers for queued /jobs uploads.")
+    parser.add_argument("--processes", type=int, default=CFG.worker_processes)
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _run(args.once)
+        return
+    procs = [mp.Process(target=_run, args=(args.once,), daemon=False) for _ in range(args.processes)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Benchmarks for the backend hot paths. See benchmarks/README.md."""
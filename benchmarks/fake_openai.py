@@ -0,0 +1,240 @@
+"""
+Local OpenAI-compatible stand-in for pipeline benchmarks.
+
+    python -m benchmarks.fake_openai --port 9100 --latency transcription=800,chat=300 --error-rate 0.02
+
+Point the backend at it with `OPENAI_BASE_URL=http://127.0.0.1:9100/v1`. It serves
+`/v1/audio/transcriptions` (verbose_json), `/v1/chat/completions` and `/v1/responses`
+with synthetic payloads shaped like the real ones: OHCR labels for `label_one`,
+a full coach report for the discourse coach and sectioned tier output.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+DEFAULT_LATENCY_MS = {"transcription": 800.0, "chat": 300.0, "responses": 300.0}
+
+
+class FakeSettings:
+    def __init__(self, latency_ms: Dict[str, float], jitter: float, error_rate: float,
+                 payload_scale: float, seconds_per_segment: float, seed: int):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.payload_scale = payload_scale
+        self.seconds_per_segment = seconds_per_segment
+        self.rng = random.Random(seed)
+
+
+SETTINGS = FakeSettings(dict(DEFAULT_LATENCY_MS), 0.2, 0.0, 1.0, 4.0, 0)
+app = FastAPI(title="Fake OpenAI")
+
+
+async def _simulate(kind: str):
+    base = SETTINGS.latency_ms.get(kind, 0.0) / 1000.0
+    delay = base * (1.0 + SETTINGS.rng.uniform(-SETTINGS.jitter, SETTINGS.jitter))
+    await asyncio.sleep(max(0.0, delay))
+    if SETTINGS.rng.random() < SETTINGS.error_rate:
+        return JSONResponse({"error": {"message": "Injected failure", "type": "server_error"}}, status_code=500)
+    return None
+
+
+def _usage(prompt_chars: int, completion: str) -> Dict:
+    ptoks = max(1, prompt_chars // 4)
+    ctoks = max(1, len(completion) // 4)
+    return {"prompt_tokens": ptoks, "completion_tokens": ctoks, "total_tokens": ptoks + ctoks}
+
+
+def _filler(words: int) -> str:
+    words = max(1, int(words * SETTINGS.payload_scale))
+    return " ".join(SETTINGS.rng.choice(["students", "observe", "explain", "evidence", "why", "graph"])
+                    for _ in range(words))
+
+
+def _wav_duration(data: bytes) -> float:
+    # 16-bit PCM WAV is what the load harness uploads; anything else gets a guess from its size.
+    if data[:4] == b"RIFF" and len(data) > 44:
+        channels = int.from_bytes(data[22:24], "little") or 1
+        rate = int.from_bytes(data[24:28], "little") or 16000
+        bits = int.from_bytes(data[34:36], "little") or 16
+        return (len(data) - 44) / float(rate * channels * bits // 8)
+    return len(data) / 16000.0
+
+
+def _transcription(duration: float) -> Dict:
+    segments: List[Dict] = []
+    t = 0.0
+    step = SETTINGS.seconds_per_segment
+    while t < duration:
+        end = min(duration, t + step)
+        text = _filler(10) + ("?" if SETTINGS.rng.random() < 0.3 else ".")
+        segments.append({"id": len(segments), "start": round(t, 2), "end": round(end, 2), "text": text})
+        t = end
+    return {"task": "transcribe", "language": "english", "duration": duration,
+            "text": " ".join(s["text"] for s in segments), "segments": segments}
+
+
+def _coach_report(num_turns: int) -> Dict:
+    moves = []
+    for first in range(1, num_turns + 1, 3):
+        last = min(num_turns, first + 2)
+        moves.append({
+            "move_id": f"move_{len(moves) + 1}",
+            "turn_range": f"{first}-{last}",
+            "speakers": ["Teacher"],
+            "utterance_summary": _filler(12),
+            "discourse_act": SETTINGS.rng.choice(["question", "statement", "regulatory"]),
+            "ohcr": SETTINGS.rng.choice(["O", "H", "C", "R", "none"]),
+            "coach_notes": _filler(20),
+            "iam_level": SETTINGS.rng.randint(1, 5),
+            "iam_rationale": _filler(12),
+        })
+    return {
+        "transcript_meta": {"num_turns": num_turns, "has_observe": True, "has_knowledge_question": True},
+        "moves": moves,
+        "global_feedback": {
+            "diagnosis": _filler(60),
+            "improvements": [_filler(25) for _ in range(4)],
+            "next_time_observe_script": _filler(40),
+            "rubric_flags": {
+                "observe_is_factual": True,
+                "observe_sets_problem": True,
+                "kq_is_conceptual_not_recall": True,
+                "sequencing_supports_inquiry": False,
+            },
+        },
+        "topics": ["regression", "metric scale"],
+    }
+
+
+def _tier_output() -> Dict:
+    return {
+        "summary": _filler(50),
+        "sections": [
+            {"title": f"SECTION {i} – Synthetic", "paragraphs": [_filler(80)], "bullets": [_filler(15) for _ in range(3)]}
+            for i in range(1, 6)
+        ],
+        "reliability_flags": ["Synthetic output"],
+        "notes": [],
+    }
+
+
+def _label() -> Dict:
+    return {
+        "ohcr": SETTINGS.rng.choice(["O", "H", "C", "R", "None"]),
+        "discourse_act": SETTINGS.rng.choice(["question", "statement", "regulatory"]),
+        "role": SETTINGS.rng.choice(["teacher", "student"]),
+        "confidence": round(SETTINGS.rng.uniform(0.3, 1.0), 2),
+        "rationale": _filler(10),
+    }
+
+
+def _completion_for(text: str) -> Dict:
+    """Pick the payload the backend expects from the shape of the prompt."""
+    if "Transcript payload:" in text or text.lstrip().startswith('{"transcript"'):
+        payload = text.split("Transcript payload:", 1)[-1]
+        try:
+            turns = len(json.loads(payload).get("transcript", []))
+        except (ValueError, AttributeError):
+            turns = 0
+        return _coach_report(turns)
+    if "Context_before:" in text:
+        return _label()
+    return _tier_output()
+
+
+@app.post("/v1/audio/transcriptions")
+async def transcriptions(request: Request):
+    form = await request.form()
+    upload = form.get("file")
+    data = await upload.read() if upload is not None else b""
+    failure = await _simulate("transcription")
+    if failure is not None:
+        return failure
+    return _transcription(_wav_duration(data))
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    failure = await _simulate("chat")
+    if failure is not None:
+        return failure
+    prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []) if m.get("role") == "user")
+    content = json.dumps(_completion_for(prompt), ensure_ascii=False)
+    return {
+        "id": f"chatcmpl-{SETTINGS.rng.getrandbits(32):x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": _usage(len(prompt), content),
+    }
+
+
+@app.post("/v1/responses")
+async def responses(request: Request):
+    body = await request.json()
+    failure = await _simulate("responses")
+    if failure is not None:
+        return failure
+    parts = []
+    for item in body.get("input", []):
+        for chunk in item.get("content", []):
+            parts.append(str(chunk.get("text", "")))
+    prompt = "\n".join(parts)
+    text = json.dumps(_completion_for(prompt), ensure_ascii=False)
+    return {
+        "id": f"resp_{SETTINGS.rng.getrandbits(32):x}",
+        "object": "response",
+        "model": body.get("model", "fake"),
+        "output": [{"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": text}]}],
+        "usage": _usage(len(prompt), text),
+    }
+
+
+def parse_latency(value: str) -> Dict[str, float]:
+    out = dict(DEFAULT_LATENCY_MS)
+    for item in filter(None, (v.strip() for v in value.split(","))):
+        kind, _, ms = item.partition("=")
+        out[kind.strip()] = float(ms)
+    return out
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=parse_latency, default=dict(DEFAULT_LATENCY_MS),
+                        help="Per-endpoint latency in ms, e.g. transcription=800,chat=300,responses=1500.")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative latency jitter (0.2 = ±20%%).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500.")
+    parser.add_argument("--payload-scale", type=float, default=1.0, help="Multiplier for generated text length.")
+    parser.add_argument("--seconds-per-segment", type=float, default=4.0, help="Whisper segment length.")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def configure(args: argparse.Namespace) -> None:
+    global SETTINGS
+    SETTINGS = FakeSettings(args.latency, args.jitter, args.error_rate, args.payload_scale,
+                            args.seconds_per_segment, args.seed)
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI API for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+End-to-end `/process` load harness.
+
+    # against a running backend
+    python -m benchmarks.load --base-url http://127.0.0.1:8000 --uploads 20 --concurrency 4
+
+    # self-contained: start the fake OpenAI server and a backend wired to it
+    python -m benchmarks.load --spawn --uploads 20 --concurrency 4 --latency chat=200
+
+Sends N uploads of synthetic WAV audio and reports p50/p95/p99 for every
+`steps[*].duration_ms` plus end-to-end latency and throughput.
+"""
+import argparse
+import concurrent.futures as cf
+import io
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from benchmarks.fake_openai import add_arguments as add_fake_arguments
+
+
+def synthetic_wav(seconds: float, sr: int = 16000, seed: int = 0) -> bytes:
+    """Two alternating 'voices' (different pitch and loudness) so diarization has something to split."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    turn = (t // 4.0).astype(int) % 2
+    pitch = np.where(turn == 0, 140.0, 260.0)
+    amp = np.where(turn == 0, 0.4, 0.2)
+    signal = amp * np.sin(2 * np.pi * pitch * t) + 0.02 * rng.standard_normal(t.size)
+    pcm = (np.clip(signal, -1.0, 1.0) * 32767).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _one_upload(client: httpx.Client, base_url: str, audio: bytes, idx: int) -> Dict:
+    t0 = time.perf_counter()
+    try:
+        r = client.post(f"{base_url}/process", files={"audio": (f"load_{idx}.wav", audio, "audio/wav")})
+    except httpx.HTTPError as err:
+        return {"ok": False, "error": f"{type(err).__name__}: {err}", "wall_ms": (time.perf_counter() - t0) * 1000}
+    wall_ms = (time.perf_counter() - t0) * 1000
+    if r.status_code != 200:
+        return {"ok": False, "error": f"HTTP {r.status_code}: {r.text[:200]}", "wall_ms": wall_ms}
+    steps = r.json().get("steps", {})
+    durations = {name: float(step.get("duration_ms", 0)) for name, step in steps.items() if isinstance(step, dict)}
+    return {"ok": True, "wall_ms": wall_ms, "steps": durations}
+
+
+def run_load(base_url: str, uploads: int, concurrency: int, seconds: float, timeout: float) -> Dict:
+    audios = [synthetic_wav(seconds, seed=i) for i in range(uploads)]
+    started = time.perf_counter()
+    with httpx.Client(timeout=timeout) as client, cf.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: _one_upload(client, base_url, audios[i], i), range(uploads)))
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r["ok"]]
+    per_stage: Dict[str, List[float]] = {}
+    for r in ok:
+        for name, ms in r["steps"].items():
+            per_stage.setdefault(name, []).append(ms)
+    per_stage["end_to_end"] = [r["wall_ms"] for r in ok]
+
+    summary = {
+        name: {
+            "p50_ms": round(percentile(vals, 50), 1),
+            "p95_ms": round(percentile(vals, 95), 1),
+            "p99_ms": round(percentile(vals, 99), 1),
+            "mean_ms": round(sum(vals) / len(vals), 1),
+            "n": len(vals),
+        }
+        for name, vals in per_stage.items() if vals
+    }
+    return {
+        "uploads": uploads,
+        "concurrency": concurrency,
+        "audio_seconds": seconds,
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "errors": sorted({r["error"] for r in results if not r["ok"]})[:10],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_min": round(len(ok) / elapsed * 60.0, 2) if elapsed > 0 else 0.0,
+        "stages": summary,
+    }
+
+
+def print_report(report: Dict) -> None:
+    print(f"uploads={report['uploads']} concurrency={report['concurrency']} "
+          f"ok={report['succeeded']} failed={report['failed']} elapsed={report['elapsed_s']}s "
+          f"throughput={report['throughput_per_min']}/min")
+    print(f"{'stage':<16} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'mean ms':>10} {'n':>5}")
+    for name, s in report["stages"].items():
+        print(f"{name:<16} {s['p50_ms']:10.1f} {s['p95_ms']:10.1f} {s['p99_ms']:10.1f} {s['mean_ms']:10.1f} {s['n']:5d}")
+    for err in report["errors"]:
+        print(f"error: {err}")
+
+
+def _wait_ready(url: str, timeout: float) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=2.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+
+def _fake_server_args(args: argparse.Namespace) -> List[str]:
+    latency = ",".join(f"{k}={v}" for k, v in args.latency.items())
+    return ["--latency", latency, "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+            "--payload-scale", str(args.payload_scale), "--seconds-per-segment", str(args.seconds_per_segment),
+            "--seed", str(args.seed)]
+
+
+def spawn_stack(args: argparse.Namespace, workdir: str) -> List[subprocess.Popen]:
+    """Start the fake OpenAI server and a backend pointed at it, with throwaway results and cache."""
+    fake = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_openai", "--port", str(args.fake_port),
+                             *_fake_server_args(args)])
+    # Every path the backend writes or reads state from, so nothing from the checkout leaks into the run.
+    results = os.path.join(workdir, "results")
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY") or "sk-fake",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.fake_port}/v1",
+        "RESULTS_DIR": results,
+        "CACHE_DB": os.path.join(results, "cache.sqlite"),
+        "CACHE_DIR": os.path.join(results, "cache"),
+        "JOBS_DB": os.path.join(results, "jobs.sqlite"),
+        "ANALYTICS_DB": os.path.join(results, "analytics.sqlite"),
+        "UPLOADS_DIR": os.path.join(results, "uploads"),
+        "OPENAI_FIXTURES_DIR": os.path.join(results, "openai_fixtures"),
+        # No model here, so labeling goes to the (fake) LLM as it would without a trained classifier.
+        "LOCAL_CLASSIFIER": os.path.join(results, "ohcr_classifier.joblib"),
+        "STORE_RESULTS": "true",
+    }
+    backend = subprocess.Popen([sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(args.backend_port),
+                                "--workers", str(args.backend_workers), "--log-level", "warning"], env=env)
+    procs = [fake, backend]
+    try:
+        _wait_ready(f"http://127.0.0.1:{args.fake_port}/docs", 30)
+        _wait_ready(f"http://127.0.0.1:{args.backend_port}/health", 120)
+    except Exception:
+        for p in procs:
+            p.terminate()
+        raise
+    return procs
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load-test /process and report per-stage latency percentiles.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--uploads", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--audio-seconds", type=float, default=60.0)
+    parser.add_argument("--timeout", type=float, default=600.0, help="Per-request timeout in seconds.")
+    parser.add_argument("--out", help="Write the JSON report here.")
+    parser.add_argument("--spawn", action="store_true", help="Start the fake OpenAI server and a backend.")
+    parser.add_argument("--fake-port", type=int, default=9100)
+    parser.add_argument("--backend-port", type=int, default=8765)
+    parser.add_argument("--backend-workers", type=int, default=1)
+    add_fake_arguments(parser)
+    args = parser.parse_args()
+
+    procs: List[subprocess.Popen] = []
+    workdir: Optional[tempfile.TemporaryDirectory] = None
+    base_url = args.base_url
+    try:
+        if args.spawn:
+            workdir = tempfile.TemporaryDirectory(prefix="profess-load-")
+            procs = spawn_stack(args, workdir.name)
+            base_url = f"http://127.0.0.1:{args.backend_port}"
+        report = run_load(base_url, args.uploads, args.concurrency, args.audio_seconds, args.timeout)
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait(timeout=10)
+        if workdir is not None:
+            workdir.cleanup()
+
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
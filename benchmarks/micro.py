@@ -0,0 +1,150 @@
+"""
+Micro-benchmarks for the CPU-bound analysis hot paths.
+
+    python -m benchmarks.micro                          # run and print
+    python -m benchmarks.micro --save                   # refresh benchmarks/baselines/micro.json
+    python -m benchmarks.micro --compare --threshold 1.3
+
+`--compare` exits non-zero when a case is slower than the stored baseline by
+more than `threshold` (ratio of medians), so it can gate CI.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+# The LLM/cache layers are never exercised here; keep them offline and stateless.
+os.environ.setdefault("USE_LLM", "false")
+os.environ.setdefault("STORE_RESULTS", "false")
+os.environ.setdefault("CACHE_DB", "")
+
+from backend import discourse_coach, metrics_engine, tiered_prompts
+from backend.diarize_simple import map_roles_by_talk_time, merge_contiguous_segments
+from benchmarks.synthetic import make_coach_report, make_labeled, make_segments
+
+DEFAULT_SIZES = [100, 1000, 5000, 20000]
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "micro.json")
+# Differences below this are timer noise, not regressions.
+NOISE_FLOOR_S = 0.002
+
+
+def _label_transcript_case(n: int) -> Callable[[], object]:
+    segments = make_segments(n)
+    report = make_coach_report(n)
+
+    def run():
+        # Canned coach report: times the local transcript formatting and move mapping only.
+        original = discourse_coach._run_coach
+        discourse_coach._run_coach = lambda transcript: (report, {"source": "llm"})
+        try:
+            return discourse_coach.label_transcript(segments)
+        finally:
+            discourse_coach._run_coach = original
+
+    return run
+
+
+def _cases(n: int) -> Dict[str, Callable[[], object]]:
+    labeled = make_labeled(n)
+    segments = make_segments(n)
+    report = make_coach_report(n)
+    return {
+        "compute_all": lambda: metrics_engine.compute_all(labeled, coach_report=report),
+        "analyze_discourse_acts": lambda: metrics_engine.analyze_discourse_acts(labeled),
+        "level_timeline": lambda: metrics_engine.level_timeline(labeled),
+        "merge_contiguous_segments": lambda: merge_contiguous_segments(segments),
+        "map_roles_by_talk_time": lambda: map_roles_by_talk_time(segments),
+        "discourse_coach._format_transcript": lambda: discourse_coach._format_transcript(labeled),
+        "label_transcript": _label_transcript_case(n),
+        "tiered_prompts._format_transcript": lambda: tiered_prompts._format_transcript(labeled),
+    }
+
+
+def _time(fn: Callable[[], object], min_runs: int, budget_s: float) -> Tuple[float, float, int]:
+    samples: List[float] = []
+    deadline = time.perf_counter() + budget_s
+    while len(samples) < min_runs or time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+        # One run is enough for cases that already blow the budget.
+        if samples[-1] > budget_s:
+            break
+    return min(samples), statistics.median(samples), len(samples)
+
+
+def run(sizes: List[int], only: List[str], min_runs: int, budget_s: float) -> Dict[str, Dict]:
+    results: Dict[str, Dict] = {}
+    for n in sizes:
+        for name, fn in _cases(n).items():
+            if only and not any(pat in name for pat in only):
+                continue
+            best, median, runs = _time(fn, min_runs, budget_s)
+            key = f"{name}[{n}]"
+            results[key] = {"min_s": round(best, 6), "median_s": round(median, 6), "runs": runs}
+            print(f"{key:<48} median {median * 1000:10.2f} ms   min {best * 1000:10.2f} ms   runs {runs}", flush=True)
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    regressions = []
+    print(f"\n{'case':<48} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            print(f"{key:<48} {'-':>12} {cur['median_s'] * 1000:12.2f} {'new':>7}")
+            continue
+        ratio = cur["median_s"] / max(base["median_s"], 1e-9)
+        slower = ratio > threshold and cur["median_s"] - base["median_s"] > NOISE_FLOOR_S
+        flag = "  REGRESSION" if slower else ""
+        print(f"{key:<48} {base['median_s'] * 1000:12.2f} {cur['median_s'] * 1000:12.2f} {ratio:7.2f}{flag}")
+        if slower:
+            regressions.append(key)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=lambda v: [int(x) for x in v.split(",")], default=DEFAULT_SIZES,
+                        help="Comma-separated utterance counts (default: 100,1000,5000,20000).")
+    parser.add_argument("--only", action="append", default=[], help="Run cases whose name contains this.")
+    parser.add_argument("--min-runs", type=int, default=3)
+    parser.add_argument("--budget", type=float, default=0.5, help="Seconds to spend per case (soft).")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="Write results to the baseline file.")
+    parser.add_argument("--compare", action="store_true", help="Compare against the baseline file.")
+    parser.add_argument("--threshold", type=float, default=1.3)
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.only, args.min_runs, args.budget)
+
+    if args.save:
+        payload = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "results": results,
+        }
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, sort_keys=True)
+        print(f"\nSaved baseline to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold}x: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
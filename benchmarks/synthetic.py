@@ -0,0 +1,96 @@
+"""Deterministic synthetic transcripts shaped like real pipeline output."""
+import random
+from typing import Dict, List
+
+_WORDS = (
+    "regression variable dependent metric scale observe data notice explain because "
+    "hypothesis maybe what why does this hold true agree conclude sample mean error "
+    "trend graph value predict model assume compare difference evidence question"
+).split()
+_OHCR = ["O", "H", "C", "R", "None", "None", "None"]
+_ACTS = ["question", "statement", "statement", "regulatory"]
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(6, 40))]
+    text = " ".join(words).capitalize()
+    return text + ("?" if rng.random() < 0.25 else ".")
+
+
+def make_segments(n: int, seed: int = 0) -> List[Dict]:
+    """Whisper-style segments with alternating teacher/student runs, as diarization leaves them."""
+    rng = random.Random(seed)
+    segments: List[Dict] = []
+    t = 0.0
+    speaker = "SPEAKER_0"
+    for _ in range(n):
+        if rng.random() < 0.35:
+            speaker = "SPEAKER_1" if speaker == "SPEAKER_0" else "SPEAKER_0"
+        t += rng.choice([0.0, 0.1, 0.2, 0.5, 1.5])
+        dur = rng.uniform(1.0, 6.0) if speaker == "SPEAKER_0" else rng.uniform(0.5, 3.0)
+        segments.append({
+            "start": round(t, 3),
+            "end": round(t + dur, 3),
+            "text": _sentence(rng),
+            "speaker": speaker,
+            "role": "teacher" if speaker == "SPEAKER_0" else "student",
+        })
+        t += dur
+    return segments
+
+
+def make_labeled(n: int, seed: int = 0) -> List[Dict]:
+    """Segments carrying the fields `label_transcript` adds (OHCR, act, IAM level, ...)."""
+    rng = random.Random(seed + 1)
+    labeled = []
+    for idx, seg in enumerate(make_segments(n, seed), start=1):
+        ohcr = rng.choice(_OHCR)
+        labeled.append({
+            "turn": idx,
+            **seg,
+            "ohcr": ohcr,
+            "discourse_act": "question" if seg["text"].endswith("?") else rng.choice(_ACTS),
+            "confidence": 0.9 if ohcr != "None" else 0.6,
+            "coach_notes": "",
+            "coach_move_id": f"move_{idx}",
+            "source": "coach_llm",
+            "iam_level": rng.randint(1, 5),
+            "iam_rationale": "",
+        })
+    return labeled
+
+
+def make_coach_report(n: int, seed: int = 0, move_size: int = 3) -> Dict:
+    """A coach report whose moves cover the transcript in runs of `move_size` turns."""
+    rng = random.Random(seed + 2)
+    moves = []
+    for first in range(1, n + 1, move_size):
+        last = min(n, first + move_size - 1)
+        moves.append({
+            "move_id": f"move_{len(moves) + 1}",
+            "turn_range": f"{first}-{last}",
+            "speakers": ["Teacher"],
+            "utterance_summary": "",
+            "discourse_act": rng.choice(["question", "statement", "regulatory"]),
+            "ohcr": rng.choice(["O", "H", "C", "R", "none"]),
+            "coach_notes": "",
+            "iam_level": rng.randint(1, 5),
+            "iam_rationale": "",
+        })
+    return {
+        "transcript_meta": {"num_turns": n, "has_observe": True, "has_knowledge_question": False},
+        "moves": moves,
+        "global_feedback": {
+            "diagnosis": "",
+            "improvements": [],
+            "next_time_observe_script": "",
+            "rubric_flags": {
+                "observe_is_factual": True,
+                "observe_sets_problem": True,
+                "kq_is_conceptual_not_recall": False,
+                "sequencing_supports_inquiry": True,
+            },
+        },
+        "topics": ["regression"],
+    }
+
@@ -18,6 +18,7 @@ export default function App(){
   const [step, setStep] = React.useState("idle");
   const [error, setError] = React.useState("");
   const [resp, setResp] = React.useState(null);
+  const [analyzedFile, setAnalyzedFile] = React.useState(null);
 
   async function onAnalyze(){
     if (!file) return;
@@ -29,6 +30,7 @@ export default function App(){
       setStep("processing");
       const j = await processAudio(file);
       setResp(j);
+      setAnalyzedFile(file);
       setStep("done");
     } catch (e) {
       setError(String(e.message || e));
@@ -38,7 +40,10 @@ export default function App(){
     }
   }
 
+  // Server peaks only describe the file that was processed, not one picked afterwards.
+  const sessionId = resp && analyzedFile === file ? resp.session_id : null;
   const timeline = resp?.timeline ?? [];
+  const timelines = resp?.timelines ?? {};
   const m = resp?.metrics ?? {};
   const ohcrCounts = m?.ohcr_counts ?? {};
   const steps = resp?.steps ?? {};
@@ -52,7 +57,7 @@ export default function App(){
       <Header />
 
       <main className="max-w-6xl mx-auto px-4 md:px-8 py-8 grid gap-6">
-        <Uploader file={file} setFile={setFile} onAnalyze={onAnalyze} busy={busy} step={step} error={error} />
+        <Uploader file={file} sessionId={sessionId} setFile={setFile} onAnalyze={onAnalyze} busy={busy} step={step} error={error} />
 
         {(step !== "idle" || busy || resp) && (
           <ProcessingSteps steps={steps} stepState={step} busy={busy} />
@@ -105,7 +110,7 @@ export default function App(){
               <OHCRDonut counts={ohcrCounts} />
             </section>
 
-            <TimelineChart data={timeline} />
+            <TimelineChart data={timeline} timelines={timelines} sessionId={resp?.session_id} />
             <CoachReport report={coachReport} />
             <TierReports tiers={tierResults} transcript={tierAnalysis?.transcript} />
             <JsonPanel data={resp} />
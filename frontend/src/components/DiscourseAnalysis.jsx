@@ -11,7 +11,14 @@ const SummaryCard = ({ title, value, hint }) => (
 
 const renderSequence = (seq = []) => seq.join(" → ");
 
-export default function DiscourseAnalysis({ analysis }) {
+const segmentUtterances = (seg, utterances) => {
+  const [first, end] = seg.utterance_range ?? [0, 0];
+  return utterances.slice(first, Math.min(end, first + 5));
+};
+
+// Episodes and segments refer to the labelled utterances by [first, end) index range;
+// pass the session's utterance list to show their text.
+export default function DiscourseAnalysis({ analysis, utterances = [] }) {
   if (!analysis) {
     return null;
   }
@@ -88,12 +95,12 @@ export default function DiscourseAnalysis({ analysis }) {
                   <span>{seg.utterance_count ?? 0} utterances</span>
                 </div>
                 <ol className="mt-2 grid gap-1">
-                  {(seg.utterances ?? []).slice(0, 5).map((u) => (
-                    <li key={`${u.index}-${u.start}`} className="text-xs">
+                  {segmentUtterances(seg, utterances).map((u, i) => (
+                    <li key={`${(seg.utterance_range?.[0] ?? 0) + i}-${u.start}`} className="text-xs">
                       <span className="font-medium">{u.speaker || u.role}</span>: {u.text}
                     </li>
                   ))}
-                  {(seg.utterances ?? []).length > 5 && (
+                  {(seg.utterance_count ?? 0) > 5 && (
                     <li className="text-xs text-stone-400">…</li>
                   )}
                 </ol>
@@ -10,6 +10,13 @@ const STEP_ORDER = [
   { key: "tier_prompts", label: "Tiered Analyses" },
 ];
 
+// Why a step was cut back to fit the request's latency budget.
+const DEGRADED_NOTE = {
+  lean_coach: "shortened to fit the time budget",
+  fallback_labels: "out of time; basic labels only",
+  skipped_tiers: "some analyses skipped to fit the time budget",
+};
+
 const STATUS_ICON = {
   done: "✓",
   active: "…",
@@ -57,8 +64,12 @@ export default function ProcessingSteps({ steps = {}, stepState, busy }) {
               <div className="flex-1">
                 <div className="text-sm font-medium">{label}</div>
                 <div className="text-xs text-stone-600">
-                  {status === "done" && duration != null
-                    ? `Completed in ${prettyMs(duration)}`
+                  {status === "done" && detail.status === "skipped"
+                    ? "Skipped to fit the time budget"
+                    : status === "done" && duration != null
+                    ? `Completed in ${prettyMs(duration)}${
+                        DEGRADED_NOTE[detail.degraded] ? ` (${DEGRADED_NOTE[detail.degraded]})` : ""
+                      }`
                     : status === "active"
                     ? "Running…"
                     : status === "error"
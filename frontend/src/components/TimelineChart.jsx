@@ -1,8 +1,34 @@
 import React from "react";
 import { AreaChart, Area, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, ReferenceLine } from "recharts";
 import { warm, ms } from "../lib/utils";
+import { fetchTimeline } from "../lib/api";
 
-export default function TimelineChart({ data }){
+const WINDOWS = [
+  { sec: 5, label: "5s" },
+  { sec: 20, label: "20s" },
+  { sec: 60, label: "1m" },
+  { sec: 300, label: "5m" },
+];
+
+// `timelines` holds the precomputed resolutions keyed by window seconds ("5", "20", ...);
+// switching between them is local, and older sessions without them are fetched per window.
+export default function TimelineChart({ data, timelines = {}, sessionId }){
+  const [windowSec, setWindowSec] = React.useState(20);
+  const [fetched, setFetched] = React.useState({});
+  const key = String(windowSec);
+  const local = windowSec === 20 ? data : timelines[key];
+
+  React.useEffect(() => { setFetched({}); }, [sessionId]);
+  React.useEffect(() => {
+    if (local || fetched[key] || !sessionId) return;
+    let cancelled = false;
+    fetchTimeline(sessionId, { windowSec })
+      .then((r) => { if (!cancelled) setFetched((f) => ({ ...f, [key]: r.timeline })); })
+      .catch(() => {});
+    return () => { cancelled = true; };
+  }, [local, fetched, key, windowSec, sessionId]);
+
+  const points = local ?? fetched[key] ?? data;
   return (
     <section className={`${warm.card} p-5 md:p-6`}>
       <div className="flex items-center justify-between mb-3">
@@ -10,10 +36,19 @@ export default function TimelineChart({ data }){
           <h3 className="font-semibold">Knowledge Construction over Time</h3>
           <p className={`text-sm ${warm.sub}`}>Higher bands (4–5) indicate deeper reasoning/resolve</p>
         </div>
+        <div className="flex gap-1">
+          {WINDOWS.map(({ sec, label }) => (
+            <button
+              key={sec}
+              onClick={() => setWindowSec(sec)}
+              className={`px-2 py-1 rounded-lg text-xs border ${sec === windowSec ? "border-amber-400 bg-amber-50" : "border-stone-200 bg-white/80 hover:bg-white"}`}
+            >{label}</button>
+          ))}
+        </div>
       </div>
       <div className="h-64">
         <ResponsiveContainer width="100%" height="100%">
-          <AreaChart data={data} margin={{ top: 10, right: 10, bottom: 0, left: 0 }}>
+          <AreaChart data={points} margin={{ top: 10, right: 10, bottom: 0, left: 0 }}>
             <defs>
               <linearGradient id="kcs" x1="0" y1="0" x2="0" y2="1">
                 <stop offset="5%" stopColor="#f59e0b" stopOpacity={0.5} />
@@ -2,7 +2,7 @@ import React from "react";
 import { warm } from "../lib/utils";
 import Waveform from "./Waveform";
 
-export default function Uploader({ file, setFile, onAnalyze, busy, step, error }) {
+export default function Uploader({ file, sessionId, setFile, onAnalyze, busy, step, error }) {
   const inputRef = React.useRef(null);
   const [drag, setDrag] = React.useState(false);
 
@@ -42,7 +42,7 @@ export default function Uploader({ file, setFile, onAnalyze, busy, step, error }
             ) : (
               <div className="grid gap-2">
                 <div className="text-sm font-medium">{file.name}</div>
-                <Waveform file={file} />
+                <Waveform file={file} sessionId={sessionId} />
                 <div className="flex gap-2 justify-center mt-2">
                   <button
                     onClick={onAnalyze}
@@ -76,7 +76,7 @@ export default function Uploader({ file, setFile, onAnalyze, busy, step, error }
         <div className="grid content-start gap-3">
           <div className="text-sm font-medium">Preview</div>
           <div className={`${warm.card} p-4`}>
-            {file ? <Waveform file={file} height={96} /> : <div className={`text-sm ${warm.sub}`}>No file selected</div>}
+            {file ? <Waveform file={file} sessionId={sessionId} height={96} /> : <div className={`text-sm ${warm.sub}`}>No file selected</div>}
           </div>
         </div>
       </div>
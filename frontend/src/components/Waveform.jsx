@@ -1,34 +1,73 @@
 import React from "react";
 import WaveSurfer from "wavesurfer.js";
+import { fetchPeaks } from "../lib/api";
 
-export default function Waveform({ file, height = 72 }) {
+// Larger files are not decoded in the browser; their waveform comes from the server after processing.
+const LOCAL_DECODE_MAX_BYTES = 25 * 1024 * 1024;
+
+const STYLE = {
+  waveColor: "#f59e0b",
+  progressColor: "#fb7185",
+  cursorWidth: 1,
+  cursorColor: "#333",
+  barWidth: 2,
+  interact: false,
+  normalize: true,
+};
+
+export default function Waveform({ file, sessionId, height = 72 }) {
   const containerRef = React.useRef(null);
   const wsRef = React.useRef(null);
+  const [note, setNote] = React.useState("");
 
   React.useEffect(() => {
-    if (!file || !containerRef.current) return;
-    if (wsRef.current) { wsRef.current.destroy(); wsRef.current = null; }
-
-    const objectUrl = URL.createObjectURL(file);
-    const ws = WaveSurfer.create({
-      container: containerRef.current,
-      height,
-      waveColor: "#f59e0b",
-      progressColor: "#fb7185",
-      cursorWidth: 1,
-      cursorColor: "#333",
-      barWidth: 2,
-      interact: false,
-      normalize: true,
-    });
-    ws.load(objectUrl);
-    wsRef.current = ws;
+    if (!containerRef.current || (!file && !sessionId)) return;
+    let cancelled = false;
+    let objectUrl = null;
+    const destroy = () => { if (wsRef.current) { wsRef.current.destroy(); wsRef.current = null; } };
+    destroy();
+    setNote("");
+
+    const fromFile = () => {
+      if (!file) return;
+      if (file.size > LOCAL_DECODE_MAX_BYTES) {
+        setNote("Waveform appears after processing.");
+        return;
+      }
+      objectUrl = URL.createObjectURL(file);
+      const ws = WaveSurfer.create({ container: containerRef.current, height, ...STYLE });
+      ws.load(objectUrl);
+      wsRef.current = ws;
+    };
+
+    if (sessionId) {
+      // Server-side peaks: drawn straight away, nothing is decoded in the browser.
+      const pixels = Math.max(200, (containerRef.current.clientWidth || 600) * 2);
+      fetchPeaks(sessionId, { pixels })
+        .then((p) => {
+          if (cancelled) return;
+          const scale = (1 << (p.bits - 1)) - 1;
+          const peaks = Float32Array.from(p.data, (v) => v / scale);
+          wsRef.current = WaveSurfer.create({
+            container: containerRef.current, height, ...STYLE, peaks: [peaks], duration: p.duration,
+          });
+        })
+        .catch(() => { if (!cancelled) fromFile(); });
+    } else {
+      fromFile();
+    }
 
     return () => {
-      if (wsRef.current) { wsRef.current.destroy(); wsRef.current = null; }
-      URL.revokeObjectURL(objectUrl);
+      cancelled = true;
+      destroy();
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
     };
-  }, [file, height]);
+  }, [file, sessionId, height]);
 
-  return <div ref={containerRef} className="w-full" />;
+  return (
+    <div className="w-full">
+      <div ref={containerRef} className="w-full" />
+      {note && <div className="text-xs text-stone-500">{note}</div>}
+    </div>
+  );
 }
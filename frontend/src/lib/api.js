@@ -13,3 +13,38 @@ export async function processAudio(file) {
   if (!r.ok) throw new Error(`${r.status} ${r.statusText}: ${await r.text()}`);
   return await r.json();
 }
+
+// One page of a stored session's utterances overlapping [from, to) seconds.
+// Optional filters: ohcr ("O,H"), role ("student"); paginate with offset/limit and `next_offset`.
+export async function fetchUtterances(sessionId, { from, to, ohcr, role, offset = 0, limit = 200 } = {}) {
+  const q = new URLSearchParams({ offset: String(offset), limit: String(limit) });
+  if (from != null) q.set("from", String(from));
+  if (to != null) q.set("to", String(to));
+  if (ohcr) q.set("ohcr", ohcr);
+  if (role) q.set("role", role);
+  const r = await fetch(`${API_BASE}/sessions/${sessionId}/utterances?${q}`);
+  if (!r.ok) throw new Error(`${r.status} ${r.statusText}: ${await r.text()}`);
+  return await r.json();
+}
+
+// Waveform min/max peaks of a stored session (audiowaveform JSON layout: interleaved min/max in `data`).
+// `pixels` is how many pairs the caller can draw across [from, to) seconds.
+export async function fetchPeaks(sessionId, { pixels = 2000, from, to } = {}) {
+  const q = new URLSearchParams({ pixels: String(pixels) });
+  if (from != null) q.set("from", String(from));
+  if (to != null) q.set("to", String(to));
+  const r = await fetch(`${API_BASE}/sessions/${sessionId}/peaks?${q}`);
+  if (!r.ok) throw new Error(`${r.status} ${r.statusText}: ${await r.text()}`);
+  return await r.json();
+}
+
+// IAM-level timeline of a stored session at any window size; recomputed from stored utterances
+// on the server when the size is not one of the precomputed ones.
+export async function fetchTimeline(sessionId, { windowSec = 20, from, to } = {}) {
+  const q = new URLSearchParams({ window_sec: String(windowSec) });
+  if (from != null) q.set("from", String(from));
+  if (to != null) q.set("to", String(to));
+  const r = await fetch(`${API_BASE}/sessions/${sessionId}/timeline?${q}`);
+  if (!r.ok) throw new Error(`${r.status} ${r.statusText}: ${await r.text()}`);
+  return await r.json();
+}
@@ -0,0 +1,101 @@
+"""
+The /process latency budget is a hard limit: with an LLM slower than the whole
+budget, labeling and the tier prompts must give up in time instead of letting
+the SDK retry each clamped call.
+
+Runs the LLM stages against benchmarks.fake_openai through the real SDK client:
+
+    python -m pytest tests
+"""
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+_PORT = None
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+_PORT = _free_port()
+# The module-level clients read these when backend modules are first imported.
+os.environ.update({
+    "OPENAI_API_KEY": "sk-fake",
+    "OPENAI_BASE_URL": f"http://127.0.0.1:{_PORT}/v1",
+    "OPENAI_MODE": "live",
+    "CACHE_BACKEND": "memory",
+    "USE_LLM": "true",
+})
+
+import uvicorn  # noqa: E402
+
+from benchmarks import fake_openai  # noqa: E402
+from backend import deadline, discourse_coach, pipeline, tiered_prompts  # noqa: E402
+
+LLM_LATENCY_SEC = 10.0
+BUDGET_SEC = 3.0
+SLACK_SEC = 1.0
+
+
+@pytest.fixture(scope="module")
+def fake_server():
+    fake_openai.SETTINGS.latency_ms.update({"chat": LLM_LATENCY_SEC * 1000, "responses": LLM_LATENCY_SEC * 1000})
+    fake_openai.SETTINGS.jitter = 0.0
+    server = uvicorn.Server(uvicorn.Config(fake_openai.app, host="127.0.0.1", port=_PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    yield
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def scaled_thresholds(monkeypatch):
+    # The real thresholds assume minute-scale budgets; scale them to the test's seconds.
+    monkeypatch.setattr(pipeline, "COACH_FULL_MIN_SEC", 2.0 * BUDGET_SEC)
+    monkeypatch.setattr(discourse_coach, "COACH_LEAN_MIN_SEC", 0.5)
+    monkeypatch.setattr(tiered_prompts, "TIER_MIN_SEC", 0.5)
+    monkeypatch.setattr(deadline, "MIN_CALL_SEC", 0.5)
+
+
+def _diarized_steps():
+    segments = [{"start": float(t), "end": float(t + 2), "text": f"What do we notice at {t}?",
+                 "speaker": f"SPEAKER_{t % 2}", "role": "teacher" if t % 2 == 0 else "student"}
+                for t in range(0, 60, 3)]
+    return {
+        "transcription": {"status": "completed", "duration_ms": 0, "text": "", "segment_count": len(segments),
+                          "segments": segments},
+        "waveform": {"status": "failed", "duration_ms": 0, "error": "no audio", "peaks": None},
+        "diarization": {"status": "completed", "duration_ms": 0, "segment_count": len(segments),
+                        "segments": segments},
+    }
+
+
+def test_slow_llm_stays_within_budget(fake_server, scaled_thresholds):
+    t0 = time.monotonic()
+    with deadline.use_deadline(BUDGET_SEC, t0):
+        steps = pipeline.run_pipeline(None, "", steps=_diarized_steps())
+    elapsed = time.monotonic() - t0
+
+    assert elapsed <= BUDGET_SEC + SLACK_SEC, f"took {elapsed:.1f}s for a {BUDGET_SEC}s budget"
+    assert steps["labeling"]["status"] == "degraded"
+    assert steps["labeling"]["degraded"] == "fallback_labels"
+    assert steps["labeling"]["meta"]["reason"] == "deadline"
+    assert steps["tier_prompts"]["status"] == "skipped"
+    assert steps["metrics"]["status"] == "completed"
+
+
+def test_call_timeout_refuses_spent_budget():
+    with deadline.use_deadline(1.0, time.monotonic() - 2.0):
+        with pytest.raises(deadline.DeadlineExceeded):
+            deadline.call_timeout(60)
+    with deadline.use_deadline(None):
+        assert deadline.call_timeout(60) == 60